@@ -6,6 +6,7 @@ export interface ExplanationRequest {
   question: string;
   current_answer: string;
   context?:"",
+  document_id?: string;
 }
 
 export interface ExplanationResponse {
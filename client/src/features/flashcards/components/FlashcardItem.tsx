@@ -7,6 +7,7 @@ import { explanationApi, type ExplanationResponse } from "../api/explanationApi"
 interface FlashcardItemProps {
   question: string;
   answer: string;
+  documentId?: string;
 }
 
 export interface FlashcardItemRef {
@@ -14,7 +15,7 @@ export interface FlashcardItemRef {
 }
 
 export const FlashcardItem = forwardRef<FlashcardItemRef, FlashcardItemProps>(
-  ({ question, answer }, ref) => {
+  ({ question, answer, documentId }, ref) => {
     const [isFlipped, setIsFlipped] = useState(false);
     const [isAnimating, setIsAnimating] = useState(false);
     const [showExplanationModal, setShowExplanationModal] = useState(false);
@@ -81,18 +82,21 @@ export const FlashcardItem = forwardRef<FlashcardItemRef, FlashcardItemProps>(
             response = await explanationApi.getAdditionalExplanation({
               question,
               current_answer: answer,
+              document_id: documentId,
             });
             break;
           case 'simplified':
             response = await explanationApi.getSimplifiedExplanation({
               question,
               current_answer: answer,
+              document_id: documentId,
             });
             break;
           case 'examples':
             response = await explanationApi.getExamples({
               question,
               current_answer: answer,
+              document_id: documentId,
             });
             break;
         }
@@ -11,6 +11,7 @@ const APP_URL = import.meta.env.VITE_API_URL;
 const GenerateFlashcards: React.FC = () => {
   const [file, setFile] = useState<File | null>(null);
   const [flashcards, setFlashcards] = useState<Flashcard[]>([]);
+  const [documentId, setDocumentId] = useState<string | undefined>(undefined);
   const [currentIndex, setCurrentIndex] = useState(0);
   const [loading, setLoading] = useState(false);
   const flashcardRef = useRef<FlashcardItemRef>(null);
@@ -29,6 +30,7 @@ const GenerateFlashcards: React.FC = () => {
     try {
       const response = await axios.post(`${APP_URL}/flashcards/generate-flashcards`, formData);
       setFlashcards(response.data.flashcards);
+      setDocumentId(response.data.document_id);
       setCurrentIndex(0);
     } catch (error) {
       console.error("Error generating flashcards:", error);
@@ -106,6 +108,7 @@ const GenerateFlashcards: React.FC = () => {
                   ref={flashcardRef}
                   question={flashcards[currentIndex].question}
                   answer={flashcards[currentIndex].answer}
+                  documentId={documentId}
                 />
               </div>
 
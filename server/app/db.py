@@ -1,6 +1,6 @@
-from pymongo import MongoClient
 from fastapi import Depends
 import os
+import threading
 
 # Load environment variables from .env file
 from dotenv import load_dotenv
@@ -8,9 +8,46 @@ load_dotenv()
 
 # Get MongoDB URI from environment variables
 MONGODB_URI = os.getenv("MONGODB_URI")
+DATABASE_NAME = "classmate_ai"
 
-client = MongoClient(MONGODB_URI)
-db = client["classmate_ai"]
+# The client is created on first use in each process rather than at import: MongoClient starts
+# monitor threads and opens sockets, which must not be inherited by workers of a pre-fork server
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def get_mongo_client():
+    """The MongoClient for this process, created on first use and again after a fork"""
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                from pymongo import MongoClient
+                _client = MongoClient(MONGODB_URI)
+                _client_pid = os.getpid()
+    return _client
+
+def get_db():
+    return get_mongo_client()[DATABASE_NAME]
+
+def ping_database(timeout: float = None) -> None:
+    """Open a connection now instead of on the first query; raises if MongoDB is unreachable in time"""
+    import pymongo
+    with pymongo.timeout(timeout):
+        get_mongo_client().admin.command("ping")
+
+def close_mongo_client() -> None:
+    global _client
+    # A client inherited from a parent process belongs to the parent
+    if _client is not None and _client_pid == os.getpid():
+        _client.close()
+    _client = None
 
 def get_user_collection():
-    return db["users"]
\ No newline at end of file
+    return get_db()["users"]
+
+def get_cache_collection(name: str):
+    return get_db()[name]
+
+def get_job_collection():
+    return get_db()["flashcard_jobs"]
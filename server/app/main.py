@@ -1,12 +1,61 @@
 # app/main.py
+import os
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 from app.routers import flashcards, explanations
 from app.auth import auth_router
 from app.routers import upload
+from app.db import ping_database, close_mongo_client
+from app.services.parse_pool import warm_up_parse_pool, shutdown_parse_pool
+from app.services.explanation_precompute import cancel_explanation_precompute
+from app.services.gemini_service import llm_router, release_prompt_contexts
+from app.services.job_service import start_job_workers, stop_job_workers
+from app.services.metrics import MetricsMiddleware, render_metrics, slow_traces
 
-app = FastAPI()
+# Model, Cohere and MongoDB clients are created lazily in each worker process. With warm-up on,
+# startup opens them (and starts a parse worker) before the first request instead of during it.
+WARM_UP_ON_STARTUP = os.getenv("WARM_UP_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+WARM_UP_TIMEOUT_SECONDS = float(os.getenv("WARM_UP_TIMEOUT_SECONDS", "10"))
+
+async def warm_up() -> None:
+    """Open every client concurrently; a failure is logged and left to surface on first use"""
+    async def ping_mongo():
+        try:
+            await asyncio.to_thread(ping_database, WARM_UP_TIMEOUT_SECONDS)
+        except Exception as e:
+            print(f"MongoDB warm-up failed: {e!r}")
+
+    async def start_parse_worker():
+        try:
+            await asyncio.wait_for(warm_up_parse_pool(), WARM_UP_TIMEOUT_SECONDS)
+        except Exception as e:
+            print(f"Parse pool warm-up failed: {e!r}")
+
+    await asyncio.gather(llm_router.warm_up(WARM_UP_TIMEOUT_SECONDS), ping_mongo(), start_parse_worker())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs in each worker after any fork, so clients created here are never shared between processes
+    start_job_workers()
+    if WARM_UP_ON_STARTUP:
+        await warm_up()
+    yield
+    # Stop generation jobs and background explanation work, then document parsing workers
+    await stop_job_workers()
+    await cancel_explanation_precompute()
+    await release_prompt_contexts()
+    shutdown_parse_pool()
+    await llm_router.close()
+    close_mongo_client()
+
+app = FastAPI(lifespan=lifespan)
+
+# Request timings, in-flight counts and optional slow-request traces for /metrics
+app.add_middleware(MetricsMiddleware)
 
 # Add CORS middleware
 app.add_middleware(
@@ -24,4 +73,14 @@ app.include_router(upload.router, prefix="/upload", tags=["Upload"])
 
 @app.get("/", tags=["Root"])
 async def root():
-    return {"message": "Welcome to ClassMate AI backend!"}
\ No newline at end of file
+    return {"message": "Welcome to ClassMate AI backend!"}
+
+@app.get("/metrics", tags=["Metrics"], response_class=PlainTextResponse)
+async def metrics():
+    """Stage histograms, counters and gauges in the Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/slow-requests", tags=["Metrics"])
+async def slow_requests():
+    """Trace spans of recent requests slower than TRACE_SLOW_REQUEST_SECONDS"""
+    return list(slow_traces)
@@ -1,74 +1,207 @@
+import os
+from typing import List, Literal
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from app.services.gemini_service import (
     get_additional_explanation,
+    get_batch_explanations,
+    get_cached_explanation,
     get_simplified_explanation,
-    get_examples_and_applications
+    get_examples_and_applications,
+    stream_additional_explanation,
+    stream_simplified_explanation,
+    stream_examples_and_applications
 )
+from app.utils.concurrency_utils import RouteLimiter
+from app.utils.stream_utils import stream_text_response, limited_stream, cached_stream
 
 router = APIRouter()
 
+# Per-route concurrency limits; requests queue for a slot and get a 503 if none frees up in time
+EXPLANATION_ROUTE_CONCURRENCY = int(os.getenv("EXPLANATION_ROUTE_CONCURRENCY", "16"))
+EXPLANATION_QUEUE_TIMEOUT = float(os.getenv("EXPLANATION_QUEUE_TIMEOUT", "10"))
+
+additional_limiter = RouteLimiter("additional explanation", EXPLANATION_ROUTE_CONCURRENCY, EXPLANATION_QUEUE_TIMEOUT)
+simplified_limiter = RouteLimiter("simplified explanation", EXPLANATION_ROUTE_CONCURRENCY, EXPLANATION_QUEUE_TIMEOUT)
+examples_limiter = RouteLimiter("examples", EXPLANATION_ROUTE_CONCURRENCY, EXPLANATION_QUEUE_TIMEOUT)
+batch_limiter = RouteLimiter("batch explanation", EXPLANATION_ROUTE_CONCURRENCY, EXPLANATION_QUEUE_TIMEOUT)
+
+# Largest deck accepted by the batch route
+MAX_BATCH_EXPLANATION_CARDS = int(os.getenv("MAX_BATCH_EXPLANATION_CARDS", "100"))
+
+# document_id is returned with each generated deck; passing it lets the explanation draw on
+# the lecture document, which the server registered once instead of receiving it per request
 class ExplanationRequest(BaseModel):
     question: str
     current_answer: str
     context: str = ""
+    document_id: str = ""
 
 class SimplifiedRequest(BaseModel):
     question: str
     current_answer: str
+    document_id: str = ""
 
 class ExamplesRequest(BaseModel):
     question: str
     current_answer: str
+    document_id: str = ""
+
+class BatchCard(BaseModel):
+    question: str
+    current_answer: str
+
+class BatchExplanationRequest(BaseModel):
+    type: Literal["additional", "simplified", "examples"]
+    cards: List[BatchCard]
+    context: str = ""
+    document_id: str = ""
 
 @router.post("/additional-explanation")
 async def get_more_explanation(request: ExplanationRequest):
     """Get additional detailed explanation for a flashcard"""
+    cached = await get_cached_explanation("additional", request.question, request.current_answer, request.context,
+                                          request.document_id)
+    if cached is not None:
+        return cached
+    
     try:
-        result = get_additional_explanation(
-            question=request.question,
-            current_answer=request.current_answer,
-            context=request.context
-        )
+        async with additional_limiter.slot():
+            result = await get_additional_explanation(
+                question=request.question,
+                current_answer=request.current_answer,
+                context=request.context,
+                document_id=request.document_id
+            )
         
         if not result["success"]:
             raise HTTPException(status_code=500, detail=result.get("error", "Failed to generate explanation"))
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating explanation: {str(e)}")
 
 @router.post("/simplified-explanation")
 async def get_simple_explanation(request: SimplifiedRequest):
     """Get simplified explanation for complex concepts"""
+    cached = await get_cached_explanation("simplified", request.question, request.current_answer,
+                                          document_id=request.document_id)
+    if cached is not None:
+        return cached
+    
     try:
-        result = get_simplified_explanation(
-            question=request.question,
-            current_answer=request.current_answer
-        )
+        async with simplified_limiter.slot():
+            result = await get_simplified_explanation(
+                question=request.question,
+                current_answer=request.current_answer,
+                document_id=request.document_id
+            )
         
         if not result["success"]:
             raise HTTPException(status_code=500, detail=result.get("error", "Failed to generate simplified explanation"))
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating simplified explanation: {str(e)}")
 
 @router.post("/examples")
 async def get_practical_examples(request: ExamplesRequest):
     """Get practical examples and real-world applications"""
+    cached = await get_cached_explanation("examples", request.question, request.current_answer,
+                                          document_id=request.document_id)
+    if cached is not None:
+        return cached
+    
     try:
-        result = get_examples_and_applications(
-            question=request.question,
-            current_answer=request.current_answer
-        )
+        async with examples_limiter.slot():
+            result = await get_examples_and_applications(
+                question=request.question,
+                current_answer=request.current_answer,
+                document_id=request.document_id
+            )
         
         if not result["success"]:
             raise HTTPException(status_code=500, detail=result.get("error", "Failed to generate examples"))
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating examples: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error generating examples: {str(e)}")
+
+@router.post("/batch")
+async def get_batch_explanation(request: BatchExplanationRequest):
+    """Get one type of explanation for every card in a deck, several cards per model call"""
+    if not request.cards:
+        raise HTTPException(status_code=400, detail="No cards provided")
+    if len(request.cards) > MAX_BATCH_EXPLANATION_CARDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_EXPLANATION_CARDS} cards per batch")
+    
+    try:
+        async with batch_limiter.slot():
+            result = await get_batch_explanations(
+                request.type,
+                [{"question": card.question, "current_answer": card.current_answer} for card in request.cards],
+                context=request.context,
+                document_id=request.document_id
+            )
+        
+        return result
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating batch explanations: {str(e)}")
+
+@router.post("/additional-explanation/stream")
+async def stream_more_explanation(request: ExplanationRequest):
+    """Stream additional detailed explanation for a flashcard as plain text"""
+    cached = await get_cached_explanation("additional", request.question, request.current_answer, request.context,
+                                          request.document_id)
+    if cached is not None:
+        return await stream_text_response(cached_stream(cached), "Error generating explanation")
+    
+    chunks = stream_additional_explanation(
+        question=request.question,
+        current_answer=request.current_answer,
+        context=request.context,
+        document_id=request.document_id
+    )
+    return await stream_text_response(limited_stream(additional_limiter, chunks), "Error generating explanation")
+
+@router.post("/simplified-explanation/stream")
+async def stream_simple_explanation(request: SimplifiedRequest):
+    """Stream simplified explanation for complex concepts as plain text"""
+    cached = await get_cached_explanation("simplified", request.question, request.current_answer,
+                                          document_id=request.document_id)
+    if cached is not None:
+        return await stream_text_response(cached_stream(cached), "Error generating simplified explanation")
+    
+    chunks = stream_simplified_explanation(
+        question=request.question,
+        current_answer=request.current_answer,
+        document_id=request.document_id
+    )
+    return await stream_text_response(limited_stream(simplified_limiter, chunks), "Error generating simplified explanation")
+
+@router.post("/examples/stream")
+async def stream_practical_examples(request: ExamplesRequest):
+    """Stream practical examples and real-world applications as plain text"""
+    cached = await get_cached_explanation("examples", request.question, request.current_answer,
+                                          document_id=request.document_id)
+    if cached is not None:
+        return await stream_text_response(cached_stream(cached), "Error generating examples")
+    
+    chunks = stream_examples_and_applications(
+        question=request.question,
+        current_answer=request.current_answer,
+        document_id=request.document_id
+    )
+    return await stream_text_response(limited_stream(examples_limiter, chunks), "Error generating examples")
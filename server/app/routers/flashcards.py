@@ -1,46 +1,182 @@
 # app/routers/flashcards.py
 
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from app.services.gemini_service import generate_flashcards_from_file, get_additional_explanation
+import json
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from app.services.gemini_service import (
+    generate_flashcards_from_file,
+    stream_flashcards_from_file,
+    get_additional_explanation,
+    get_cached_explanation,
+    stream_additional_explanation,
+    llm_router
+)
+from app.services.explanation_precompute import schedule_explanation_precompute
+from app.services.job_service import submit_job, get_job, job_summary, watch_job, JobQueueFullError
+from app.services.parse_pool import ParseQueueFullError
+from app.services.result_cache import flashcard_cache, chunk_cache, explanation_cache
+from app.routers.explanations import additional_limiter
+from app.utils.stream_utils import stream_text_response, limited_stream, cached_stream
+from app.utils.upload_utils import spool_upload
 
 router = APIRouter()
 
 @router.post("/generate-flashcards")
 async def generate_flashcards(file: UploadFile = File(...)):
     try:
-        content = await file.read()
-        
-        # Use async version of generate_flashcards_from_file
-        flashcards = await generate_flashcards_from_file(content, file.filename)
+        upload = await spool_upload(file)
+        stats = {"chunks": 0, "chunk_cache_hits": 0}
+        try:
+            # Use async version of generate_flashcards_from_file
+            flashcards = await generate_flashcards_from_file(upload.path, file.filename, upload.sha256, stats)
+        finally:
+            upload.cleanup()
         
         if not flashcards:
             raise HTTPException(status_code=500, detail="Failed to generate flashcards")
+        
+        # Warm the explanation cache while the student reads the deck
+        schedule_explanation_precompute(flashcards, upload.sha256)
 
         return {
             "count": len(flashcards),
             "flashcards": flashcards,
-            "model_used": "gemini-1.5-flash",
+            "document_id": upload.sha256,
+            "chunks": stats["chunks"],
+            "chunk_cache_hits": stats["chunk_cache_hits"],
+            "model_used": llm_router.model_name,
             "file_type": file.filename.split('.')[-1] if '.' in file.filename else "unknown"
         }
     
     except HTTPException:
         raise
+    except ParseQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         print(f"Error in generate_flashcards: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
+@router.post("/generate-flashcards/stream")
+async def generate_flashcards_stream(
+    file: UploadFile = File(...),
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$")
+):
+    """Stream flashcards as each chunk finishes, as NDJSON lines or Server-Sent Events"""
+    upload = await spool_upload(file)
+    filename = file.filename
+    
+    async def event_stream():
+        flashcards = []
+        try:
+            async for event in stream_flashcards_from_file(upload.path, filename, upload.sha256):
+                if event["type"] == "flashcards":
+                    flashcards.extend(event["flashcards"])
+                yield format_stream_event(event, format)
+            schedule_explanation_precompute(flashcards, upload.sha256)
+        except Exception as e:
+            print(f"Error in generate_flashcards_stream: {str(e)}")
+            yield format_stream_event({"type": "error", "detail": f"Error: {str(e)}"}, format)
+    
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(event_stream(), media_type=media_type, background=BackgroundTask(upload.cleanup))
+
+def format_stream_event(event: dict, format: str) -> str:
+    """Serialize a flashcard stream event for the requested wire format"""
+    data = json.dumps(event)
+    if format == "sse":
+        return f"event: {event['type']}\ndata: {data}\n\n"
+    return data + "\n"
+
+@router.post("/jobs", status_code=202)
+async def create_flashcard_job(file: UploadFile = File(...)):
+    """Queue flashcard generation and return a job id immediately"""
+    upload = await spool_upload(file)
+    try:
+        job = await submit_job(upload, file.filename)
+    except JobQueueFullError as e:
+        upload.cleanup()
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        upload.cleanup()
+        print(f"Error in create_flashcard_job: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    
+    return job_summary(job)
+
+@router.get("/jobs/{job_id}")
+async def get_flashcard_job(job_id: str):
+    """Job status, progress and the flashcards generated so far"""
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    result = job_summary(job)
+    result["flashcards"] = job["flashcards"]
+    return result
+
+@router.get("/jobs/{job_id}/events")
+async def stream_flashcard_job(job_id: str, format: str = Query("ndjson", pattern="^(ndjson|sse)$")):
+    """Subscribe to job updates, as NDJSON lines or Server-Sent Events, until the job finishes"""
+    if await get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def event_stream():
+        async for summary in watch_job(job_id):
+            yield format_stream_event(dict(summary, type="job"), format)
+    
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(event_stream(), media_type=media_type)
+
 @router.post("/explain-more")
 async def get_more_explanation(request: dict):
     """Get additional explanation for a flashcard"""
     question = request.get("question", "")
     answer = request.get("answer", "")
     context = request.get("context", "")
+    document_id = request.get("document_id", "")
     
     if not question or not answer:
         raise HTTPException(status_code=400, detail="Question and answer are required")
     
+    cached = await get_cached_explanation("additional", question, answer, context, document_id)
+    if cached is not None:
+        return cached
+    
     try:
-        explanation = await get_additional_explanation(question, answer, context)
+        explanation = await get_additional_explanation(question, answer, context, document_id=document_id)
         return explanation
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+@router.post("/explain-more/stream")
+async def stream_more_explanation(request: dict):
+    """Stream additional explanation for a flashcard as plain text"""
+    question = request.get("question", "")
+    answer = request.get("answer", "")
+    context = request.get("context", "")
+    document_id = request.get("document_id", "")
+    
+    if not question or not answer:
+        raise HTTPException(status_code=400, detail="Question and answer are required")
+    
+    cached = await get_cached_explanation("additional", question, answer, context, document_id)
+    if cached is not None:
+        return await stream_text_response(cached_stream(cached), "Error")
+    
+    chunks = stream_additional_explanation(question, answer, context, document_id)
+    return await stream_text_response(limited_stream(additional_limiter, chunks), "Error")
+
+@router.get("/cache-stats")
+async def get_cache_stats():
+    """Hit/miss counters for the flashcard and explanation caches"""
+    return {
+        "documents": flashcard_cache.stats(),
+        "chunks": chunk_cache.stats(),
+        "explanations": explanation_cache.stats()
+    }
+
+@router.get("/provider-stats")
+async def get_provider_stats():
+    """Latency, error rate and limiter state of each model provider the router can use"""
+    return llm_router.stats()
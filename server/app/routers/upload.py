@@ -1,10 +1,21 @@
-from fastapi import APIRouter, UploadFile
-from app.services.file_parser import extract_text_from_file
+from fastapi import APIRouter, UploadFile, HTTPException, Query
+from app.services.parse_pool import parse_file_preview, ParseQueueFullError
+from app.utils.upload_utils import spool_upload
 
 router = APIRouter(prefix="/upload", tags=["Upload"])
 
+MAX_PREVIEW_CHARS = 50000
+
 @router.post("/parse")
-async def parse_file(file: UploadFile):
-    content = await file.read()
-    text = extract_text_from_file(file.filename, content)
-    return {"text": text[:2000]}  # Limit return for preview
\ No newline at end of file
+async def parse_file(file: UploadFile, preview_chars: int = Query(2000, ge=1, le=MAX_PREVIEW_CHARS)):
+    upload = await spool_upload(file)
+    try:
+        # Only the pages needed for the preview are parsed
+        text = await parse_file_preview(file.filename, upload.path, preview_chars)
+    except ParseQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    finally:
+        upload.cleanup()
+    return {"text": text}
@@ -2,27 +2,139 @@
 
 import os
 import cohere
-import json
-import re
+import asyncio
 from dotenv import load_dotenv
+from app.services.flashcard_dedup import FlashcardDeduplicator, remove_duplicate_flashcards
+from app.services.llm_providers import CohereProvider
+from app.services.metrics import (
+    stage,
+    JSON_PARSE_FAILURES,
+    INVALID_CARDS,
+    TRUNCATED_RESPONSES,
+    FALLBACK_FLASHCARDS
+)
+from app.services.rate_limiter import AdaptiveLimiter, PRIORITY_INTERACTIVE, PRIORITY_BULK
+from app.services.retry_policy import CHUNK_CALL_TIMEOUT_SECONDS, call_chunk_with_retries
+from app.utils.chunking_utils import chunk_text
+from app.utils.json_utils import parse_json_array
 
 load_dotenv()
-co = cohere.Client(os.getenv("COHERE_API_KEY"))
 
-def generate_flashcards_from_text(text: str) -> list:
-    # Split large text into chunks to generate more flashcards
-    chunk_size = 3000  # Reduced chunk size for better processing
-    text_chunks = split_text_into_chunks(text, chunk_size)
+# All Cohere calls go through the async client, admitted by cohere_limiter; the router uses the same provider
+COHERE_MODEL = os.getenv("COHERE_MODEL", "command-r-plus")
+COHERE_MAX_CONCURRENCY = int(os.getenv("COHERE_MAX_CONCURRENCY", "8"))
+COHERE_MIN_CONCURRENCY = int(os.getenv("COHERE_MIN_CONCURRENCY", "1"))
+COHERE_REQUESTS_PER_MINUTE = int(os.getenv("COHERE_REQUESTS_PER_MINUTE", "0"))  # 0 disables the limit
+COHERE_TOKENS_PER_MINUTE = int(os.getenv("COHERE_TOKENS_PER_MINUTE", "0"))
+
+cohere_limiter = AdaptiveLimiter(
+    "Cohere",
+    max_concurrency=COHERE_MAX_CONCURRENCY,
+    min_concurrency=COHERE_MIN_CONCURRENCY,
+    requests_per_minute=COHERE_REQUESTS_PER_MINUTE,
+    tokens_per_minute=COHERE_TOKENS_PER_MINUTE
+)
+
+def create_cohere_client():
+    """Build the async client; cohere_provider calls this on first use in each process"""
+    return cohere.AsyncClient(os.getenv("COHERE_API_KEY"))
+
+cohere_provider = CohereProvider(create_cohere_client, COHERE_MODEL, cohere_limiter)
+
+# Chunk calls use the shared retry policy in retry_policy
+CHUNK_TOKENS = 750           # Roughly 3000 characters, reduced for better processing
+MAX_FLASHCARDS = 50
+
+FLASHCARD_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"question": {"type": "string"}, "answer": {"type": "string"}},
+        "required": ["question", "answer"]
+    }
+}
+
+async def generate_flashcards_from_text(text: str) -> list:
+    """Generate flashcards with Cohere, running every chunk concurrently"""
+    results = {}
+    with stage("generation"):
+        async for chunk_index, chunk_flashcards, _ in iter_chunk_results(chunk_text(text, CHUNK_TOKENS)):
+            results[chunk_index] = chunk_flashcards
     
-    all_flashcards = []
+    # Remove duplicates in chunk order and limit total flashcards
+    all_flashcards = [card for chunk_index in sorted(results) for card in results[chunk_index]]
+    with stage("dedup"):
+        unique_flashcards = remove_duplicate_flashcards(all_flashcards)
     
-    for i, chunk in enumerate(text_chunks):
-        print(f"Processing chunk {i+1}/{len(text_chunks)}")
-        
+    # Ensure we have at least some flashcards
+    if not unique_flashcards:
+        return create_fallback_flashcards(text[:2000], 5)
+    
+    return unique_flashcards[:MAX_FLASHCARDS]
+
+async def stream_flashcards_from_text(text: str):
+    """Yield flashcard events as each chunk finishes, deduplicating incrementally
+    
+    Events match gemini_service.stream_flashcards_from_file: "progress",
+    "flashcards" and "done".
+    """
+    text_chunks = chunk_text(text, CHUNK_TOKENS)
+    deduplicator = FlashcardDeduplicator()
+    collected = []
+    chunks_done = 0
+    
+    yield {"type": "progress", "chunks_done": 0, "chunks_total": len(text_chunks)}
+    
+    async for chunk_index, chunk_flashcards, _ in iter_chunk_results(text_chunks):
+        chunks_done += 1
+        yield {"type": "progress", "chunks_done": chunks_done, "chunks_total": len(text_chunks)}
+        new_flashcards = [card for card in chunk_flashcards if deduplicator.add(card)]
+        new_flashcards = new_flashcards[:MAX_FLASHCARDS - len(collected)]
+        if new_flashcards:
+            collected.extend(new_flashcards)
+            yield {"type": "flashcards", "chunk": chunk_index, "flashcards": new_flashcards}
+    
+    if not collected:
+        collected = create_fallback_flashcards(text[:2000], 5)
+        yield {"type": "flashcards", "chunk": None, "flashcards": collected}
+    
+    yield {"type": "done", "chunks": len(text_chunks), "count": len(collected)}
+
+async def iter_chunk_results(text_chunks: list):
+    """Yield (chunk_index, flashcards, failed) for each chunk as soon as it is ready
+    
+    Every chunk is submitted at once; cohere_limiter bounds how many calls are in
+    flight across all requests. Failed chunks yield fallback flashcards.
+    """
+    async def run_chunk(chunk_index: int, chunk: str):
         # Calculate number of flashcards based on chunk length
         target_flashcards = max(3, min(8, len(chunk) // 200))  # 3-8 flashcards per chunk
-        
-        prompt = f"""
+        try:
+            return chunk_index, await generate_chunk_with_retries(chunk, chunk_index, target_flashcards), False
+        except Exception as e:
+            print(f"Error processing chunk {chunk_index + 1}: {e}")
+            return chunk_index, create_fallback_flashcards(chunk, target_flashcards), True
+    
+    tasks = [asyncio.create_task(run_chunk(i, chunk)) for i, chunk in enumerate(text_chunks)]
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            yield await next_result
+    finally:
+        # Stop outstanding work if the consumer goes away early
+        for task in tasks:
+            task.cancel()
+
+async def generate_chunk_with_retries(chunk: str, chunk_index: int, target_flashcards: int) -> list:
+    """Generate a chunk's flashcards with jittered retries; raises on failure"""
+    return await call_chunk_with_retries(
+        lambda: generate_chunk_flashcards(chunk, chunk_index, target_flashcards),
+        label=f"Cohere chunk {chunk_index + 1}"
+    )
+
+async def generate_chunk_flashcards(chunk: str, chunk_index: int, target_flashcards: int) -> list:
+    """Generate flashcards for one chunk with Cohere; raises ValueError if the reply has none"""
+    
+    prompt = f"""
 Create {target_flashcards} comprehensive flashcards from the following text. Focus on key concepts, definitions, processes, and important details. Return ONLY a valid JSON array of flashcard objects.
 
 Text:
@@ -51,105 +163,41 @@ Requirements:
 - Return ONLY the JSON array, no other text
 """
 
-        try:
-            response = co.chat(
-                message=prompt,
-                model="command-r-plus",
-                temperature=0.4,  # Slightly higher for variety
-                chat_history=[],
-            )
-            
-            print(f"Cohere response for chunk {i+1}: {response.text[:200]}...")
-            
-            # Clean and extract JSON
-            response_text = response.text.strip()
-            json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
-            
-            if json_match:
-                json_text = json_match.group(0)
-                chunk_flashcards = json.loads(json_text)
-                
-                # Validate flashcards structure
-                valid_flashcards = []
-                for card in chunk_flashcards:
-                    if isinstance(card, dict) and "question" in card and "answer" in card:
-                        if card["question"].strip() and card["answer"].strip():
-                            valid_flashcards.append(card)
-                
-                all_flashcards.extend(valid_flashcards)
-                print(f"Added {len(valid_flashcards)} flashcards from chunk {i+1}")
-            else:
-                print(f"No valid JSON found in chunk {i+1}, creating fallback")
-                all_flashcards.extend(create_fallback_flashcards(chunk, target_flashcards))
-                
-        except json.JSONDecodeError as e:
-            print(f"JSON decode error in chunk {i+1}: {e}")
-            all_flashcards.extend(create_fallback_flashcards(chunk, target_flashcards))
-        except Exception as e:
-            print(f"Error processing chunk {i+1}: {e}")
-            all_flashcards.extend(create_fallback_flashcards(chunk, target_flashcards))
-    
-    # Remove duplicates and limit total flashcards
-    unique_flashcards = remove_duplicate_flashcards(all_flashcards)
-    
-    # Ensure we have at least some flashcards
-    if not unique_flashcards:
-        return create_fallback_flashcards(text[:2000], 5)
-    
-    print(f"Generated {len(unique_flashcards)} total flashcards")
-    return unique_flashcards[:50]  # Limit to 50 flashcards max
-
-def split_text_into_chunks(text: str, chunk_size: int) -> list:
-    """Split text into chunks of approximately chunk_size characters"""
-    if len(text) <= chunk_size:
-        return [text]
-    
-    chunks = []
-    sentences = text.split('. ')
-    current_chunk = ""
-    
-    for sentence in sentences:
-        # If adding this sentence would exceed chunk_size, start a new chunk
-        if len(current_chunk) + len(sentence) + 2 > chunk_size and current_chunk:
-            chunks.append(current_chunk.strip())
-            current_chunk = sentence + ". "
-        else:
-            current_chunk += sentence + ". "
-    
-    # Add the last chunk if it has content
-    if current_chunk.strip():
-        chunks.append(current_chunk.strip())
-    
-    return chunks
-
-def remove_duplicate_flashcards(flashcards: list) -> list:
-    """Remove duplicate flashcards based on similar questions"""
-    seen_questions = set()
-    unique_flashcards = []
+    response_text = await cohere_provider.generate(
+        prompt,
+        priority=PRIORITY_BULK,
+        timeout=CHUNK_CALL_TIMEOUT_SECONDS,
+        temperature=0.4,  # Slightly higher for variety
+        response_schema=FLASHCARD_SCHEMA
+    )
     
-    for card in flashcards:
-        # Normalize question for comparison
-        normalized_question = card["question"].lower().strip()
-        
-        # Check if we've seen a similar question
-        is_duplicate = False
-        for seen_q in seen_questions:
-            # Simple similarity check - you could make this more sophisticated
-            if normalized_question == seen_q or (
-                len(normalized_question) > 20 and 
-                normalized_question[:20] == seen_q[:20]
-            ):
-                is_duplicate = True
-                break
+    with stage("json_parse"):
+        # Complete cards are kept even if the reply was cut off; a reply without an array raises ValueError
+        try:
+            chunk_flashcards, truncated = parse_json_array(response_text or "")
+        except ValueError:
+            JSON_PARSE_FAILURES.inc(kind="cohere_chunk")
+            raise
+        if truncated:
+            TRUNCATED_RESPONSES.inc()
         
-        if not is_duplicate:
-            seen_questions.add(normalized_question)
-            unique_flashcards.append(card)
+        # Validate flashcards structure
+        valid_flashcards = []
+        for card in chunk_flashcards:
+            if isinstance(card, dict) and "question" in card and "answer" in card:
+                if str(card["question"]).strip() and str(card["answer"]).strip():
+                    valid_flashcards.append(card)
+                    continue
+            INVALID_CARDS.inc()
     
-    return unique_flashcards
+    if not valid_flashcards:
+        JSON_PARSE_FAILURES.inc(kind="cohere_chunk")
+        raise ValueError(f"No valid flashcards in chunk {chunk_index + 1}")
+    return valid_flashcards
 
 def create_fallback_flashcards(text: str, target_count: int = 3) -> list:
     """Create basic flashcards as fallback"""
+    FALLBACK_FLASHCARDS.inc()
     sentences = [s.strip() for s in text.split('. ') if len(s.strip()) > 20]
     flashcards = []
     
@@ -180,9 +228,8 @@ def create_fallback_flashcards(text: str, target_count: int = 3) -> list:
     ]
 
 
-# ...existing code...
-
-def get_additional_explanation(question: str, current_answer: str, context: str = "") -> dict:
+async def get_additional_explanation(question: str, current_answer: str, context: str = "",
+                                     priority: int = PRIORITY_INTERACTIVE) -> dict:
     """Get additional explanation for a flashcard from Cohere"""
     
     prompt = f"""
@@ -202,16 +249,11 @@ Format your response as a clear, educational explanation that builds upon the or
 """
 
     try:
-        response = co.chat(
-            message=prompt,
-            model="command-r-plus",
-            temperature=0.3,  # Lower temperature for more consistent explanations
-            chat_history=[],
-        )
+        explanation = await cohere_provider.generate(prompt, priority=priority, temperature=0.3)  # Lower temperature for more consistent explanations
         
         return {
             "success": True,
-            "explanation": response.text.strip(),
+            "explanation": explanation.strip(),
             "original_question": question,
             "original_answer": current_answer
         }
@@ -226,7 +268,7 @@ Format your response as a clear, educational explanation that builds upon the or
             "original_answer": current_answer
         }
 
-def get_simplified_explanation(question: str, current_answer: str) -> dict:
+async def get_simplified_explanation(question: str, current_answer: str, priority: int = PRIORITY_INTERACTIVE) -> dict:
     """Get a simplified explanation for complex concepts"""
     
     prompt = f"""
@@ -245,16 +287,11 @@ Keep your explanation clear, concise, and easy to understand.
 """
 
     try:
-        response = co.chat(
-            message=prompt,
-            model="command-r-plus",
-            temperature=0.3,
-            chat_history=[],
-        )
+        explanation = await cohere_provider.generate(prompt, priority=priority, temperature=0.3)
         
         return {
             "success": True,
-            "explanation": response.text.strip(),
+            "explanation": explanation.strip(),
             "type": "simplified",
             "original_question": question,
             "original_answer": current_answer
@@ -270,7 +307,7 @@ Keep your explanation clear, concise, and easy to understand.
             "original_answer": current_answer
         }
 
-def get_examples_and_applications(question: str, current_answer: str) -> dict:
+async def get_examples_and_applications(question: str, current_answer: str, priority: int = PRIORITY_INTERACTIVE) -> dict:
     """Get practical examples and real-world applications"""
     
     prompt = f"""
@@ -289,16 +326,11 @@ Focus on making the concept relevant and relatable.
 """
 
     try:
-        response = co.chat(
-            message=prompt,
-            model="command-r-plus",
-            temperature=0.4,  # Slightly higher for creative examples
-            chat_history=[],
-        )
+        explanation = await cohere_provider.generate(prompt, priority=priority, temperature=0.4)  # Slightly higher for creative examples
         
         return {
             "success": True,
-            "explanation": response.text.strip(),
+            "explanation": explanation.strip(),
             "type": "examples",
             "original_question": question,
             "original_answer": current_answer
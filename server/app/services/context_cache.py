@@ -0,0 +1,91 @@
+# app/services/context_cache.py
+
+import os
+import re
+import time
+import asyncio
+from dotenv import load_dotenv
+from app.services.result_cache import MemoryCache
+from app.utils.chunking_utils import estimate_tokens, chunk_text
+
+load_dotenv()
+
+# Long prompt prefixes (a lecture document, a static instruction block) are registered once and referenced by key
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "3600"))
+CONTEXT_CACHE_MAX_DOCUMENTS = int(os.getenv("CONTEXT_CACHE_MAX_DOCUMENTS", "64"))
+# Providers without a cached copy get the text inline; longer texts are cut to the passages most relevant to the call
+CONTEXT_INLINE_MAX_TOKENS = int(os.getenv("CONTEXT_INLINE_MAX_TOKENS", "8000"))
+CONTEXT_PASSAGE_TOKENS = 400
+
+WORD_PATTERN = re.compile(r"\w{4,}")
+
+def passage_words(text: str) -> set:
+    return set(WORD_PATTERN.findall(text.lower()))
+
+class PromptContext:
+    """Instructions and text shared by many model calls
+
+    A provider with server-side context caching uploads them once and keeps its
+    handle in handles (None once creation has failed); calls routed to any
+    other provider send them inline with inline_prompt.
+    """
+
+    def __init__(self, key: str, instructions: str, text: str = "", tokens: int = None,
+                 ttl_seconds: int = CONTEXT_CACHE_TTL_SECONDS):
+        self.key = key
+        self.instructions = instructions
+        self.text = text
+        self.tokens = tokens if tokens is not None else estimate_tokens(instructions + text)
+        self.expires_at = time.monotonic() + ttl_seconds
+        self.handles = {}
+        self.lock = asyncio.Lock()
+        self._passages = None
+
+    def remaining_seconds(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def inline_prompt(self, prompt: str, max_tokens: int = CONTEXT_INLINE_MAX_TOKENS) -> str:
+        """prompt preceded by the instructions and text, for a provider without a cached copy"""
+        if not self.text:
+            return self.instructions + prompt
+        return f"{self.instructions}\n{self.excerpt(prompt, max_tokens)}\n{prompt}"
+
+    def excerpt(self, query: str, max_tokens: int = CONTEXT_INLINE_MAX_TOKENS) -> str:
+        """The whole text if it fits in max_tokens, else the passages sharing the most words with query, in order"""
+        if estimate_tokens(self.text) <= max_tokens:
+            return self.text
+        if self._passages is None:
+            self._passages = [(passage, passage_words(passage))
+                              for passage in chunk_text(self.text, CONTEXT_PASSAGE_TOKENS)]
+
+        query_words = passage_words(query)
+        ranked = sorted(range(len(self._passages)), key=lambda i: -len(query_words & self._passages[i][1]))
+        chosen = []
+        budget = max_tokens
+        for i in ranked:
+            tokens = estimate_tokens(self._passages[i][0])
+            if tokens <= budget:
+                chosen.append(i)
+                budget -= tokens
+        return "\n...\n".join(self._passages[i][0] for i in sorted(chosen))
+
+class ContextStore(MemoryCache):
+    """In-process LRU of registered contexts; provider handles cannot be shared between workers"""
+
+    def contexts(self) -> list:
+        with self._lock:
+            return [context for context, _ in self._entries.values()]
+
+prompt_contexts = ContextStore(CONTEXT_CACHE_MAX_DOCUMENTS, CONTEXT_CACHE_TTL_SECONDS, name="prompt_context")
+
+def register_context(key: str, instructions: str, text: str = "", tokens: int = None) -> PromptContext:
+    """Store a context under key, keeping an existing one (and its provider handles) if already registered"""
+    context = prompt_contexts.get_nowait(key)
+    if context is None or context.instructions != instructions or context.text != text:
+        context = PromptContext(key, instructions, text, tokens)
+        prompt_contexts.set_nowait(key, context)
+    return context
+
+def get_context(key: str):
+    """Return the context registered under key, or None if it was never registered or has expired"""
+    return prompt_contexts.get_nowait(key) if key else None
@@ -0,0 +1,73 @@
+# app/services/explanation_precompute.py
+
+import os
+import asyncio
+from dotenv import load_dotenv
+from app.services.gemini_service import (
+    EXPLANATION_TYPES,
+    EXPLANATION_BATCH_SIZE,
+    get_cached_explanation,
+    explain_card_batch
+)
+from app.services.rate_limiter import PRIORITY_BACKGROUND
+from app.services.metrics import detach_trace
+
+load_dotenv()
+
+# Optional background stage that fills the explanation cache for freshly generated decks
+PRECOMPUTE_EXPLANATIONS = os.getenv("PRECOMPUTE_EXPLANATIONS", "false").lower() in ("1", "true", "yes")
+
+_precompute_tasks = set()
+
+def schedule_explanation_precompute(flashcards: list, document_id: str = "") -> None:
+    """Start precomputing every explanation type for a deck, if enabled"""
+    if not PRECOMPUTE_EXPLANATIONS or not flashcards:
+        return
+    
+    task = asyncio.create_task(precompute_explanations(flashcards, document_id))
+    # Keep a reference so the task is not garbage collected mid-run
+    _precompute_tasks.add(task)
+    task.add_done_callback(_precompute_tasks.discard)
+
+async def precompute_explanations(flashcards: list, document_id: str = "") -> int:
+    """Explain each card once per type, one batch at a time; returns the number of cards explained
+    
+    Batches run at background priority, so the Gemini limiter admits them only
+    after every waiting interactive and chunk-generation call. With a document_id
+    they reference the deck's registered document like interactive requests do.
+    """
+    # Runs long after the request that scheduled it
+    detach_trace()
+    cards = [
+        {"question": card["question"], "current_answer": card["answer"]}
+        for card in flashcards
+        if card.get("question") and card.get("answer")
+    ]
+    explained = 0
+    
+    try:
+        for explanation_type in EXPLANATION_TYPES:
+            cached = await asyncio.gather(*[
+                get_cached_explanation(explanation_type, card["question"], card["current_answer"], document_id=document_id)
+                for card in cards
+            ])
+            pending = [card for card, result in zip(cards, cached) if result is None]
+            for i in range(0, len(pending), EXPLANATION_BATCH_SIZE):
+                batch = pending[i:i + EXPLANATION_BATCH_SIZE]
+                results = await explain_card_batch(explanation_type, batch, priority=PRIORITY_BACKGROUND,
+                                                   document_id=document_id)
+                explained += sum(1 for result in results if result["success"])
+        
+        print(f"Precomputed {explained} explanations for {len(cards)} cards")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"Explanation precompute failed: {e}")
+    
+    return explained
+
+async def cancel_explanation_precompute() -> None:
+    """Stop outstanding precompute tasks on shutdown"""
+    for task in list(_precompute_tasks):
+        task.cancel()
+    await asyncio.gather(*_precompute_tasks, return_exceptions=True)
@@ -1,15 +1,45 @@
 # app/services/file_parser.py
 
-from app.utils.pdf_utils import extract_text_from_pdf
-from app.utils.docx_utils import extract_text_from_docx
-from app.utils.pptx_utils import extract_text_from_pptx
+from app.utils.pdf_utils import extract_text_from_pdf, iter_text_from_pdf
+from app.utils.docx_utils import extract_text_from_docx, iter_text_from_docx
+from app.utils.pptx_utils import extract_text_from_pptx, iter_text_from_pptx
+from app.utils.file_utils import read_text
 
-def extract_text_from_file(filename: str, content: bytes) -> str:
+# source is either the raw file bytes or the path of the spooled upload
+
+def extract_text_from_file(filename: str, source) -> str:
+    if filename.endswith(".pdf"):
+        return extract_text_from_pdf(source)
+    elif filename.endswith(".docx"):
+        return extract_text_from_docx(source)
+    elif filename.endswith(".pptx"):
+        return extract_text_from_pptx(source)
+    else:
+        return read_text(source)
+
+def extract_preview_from_file(filename: str, source, max_chars: int) -> str:
+    """Extract only as many pages, slides or paragraphs as a max_chars preview needs"""
+    parts = []
+    length = 0
+    segments = iter_text_from_file(filename, source)
+    try:
+        for segment in segments:
+            parts.append(segment)
+            length += len(segment) + 1
+            if length >= max_chars:
+                break
+    finally:
+        # Closing the generator stops the parser before the rest of the document
+        segments.close()
+    return "\n".join(parts)[:max_chars]
+
+def iter_text_from_file(filename: str, source):
+    """Yield text segments (pages, paragraphs or slides) as they are extracted"""
     if filename.endswith(".pdf"):
-        return extract_text_from_pdf(content)
+        yield from iter_text_from_pdf(source)
     elif filename.endswith(".docx"):
-        return extract_text_from_docx(content)
+        yield from iter_text_from_docx(source)
     elif filename.endswith(".pptx"):
-        return extract_text_from_pptx(content)
+        yield from iter_text_from_pptx(source)
     else:
-        return content.decode("utf-8")
+        yield read_text(source)
@@ -0,0 +1,140 @@
+# app/services/flashcard_dedup.py
+
+import os
+import re
+import hashlib
+from functools import lru_cache
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Cards whose question + answer shingles overlap at least this much (Jaccard) are duplicates
+DEDUP_SIMILARITY_THRESHOLD = float(os.getenv("FLASHCARD_DEDUP_THRESHOLD", "0.45"))
+DEDUP_NUM_PERM = 64
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# Too common to say anything about a card on their own; they still count inside bigrams
+STOP_WORDS = frozenset("a an and are as at be by does for from how in is it of on or that the this to what when which who why with".split())
+
+# Shingle hashes are 64-bit; the high part picks the bin and the low part is the value
+BIN_RANGE = 2 ** 64 // DEDUP_NUM_PERM
+
+def card_shingles(card: dict) -> frozenset:
+    """Word unigrams and bigrams of the question and the answer"""
+    shingles = set()
+    for field in ("question", "answer"):
+        words = WORD_PATTERN.findall(str(card.get(field, "")).lower())
+        shingles.update(word for word in words if word not in STOP_WORDS)
+        shingles.update(f"{first} {second}" for first, second in zip(words, words[1:]))
+    return frozenset(shingles)
+
+@lru_cache(maxsize=65536)
+def hash_shingle(shingle: str) -> int:
+    """Stable 64-bit hash; cached because cards from one document share most of their words"""
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+
+def minhash_signature(shingles: frozenset) -> tuple:
+    """One-permutation MinHash: each shingle hash lands in one bin, which keeps its minimum
+
+    This costs one hash per shingle instead of one per shingle per permutation.
+    Empty bins borrow the next filled bin's value, offset by the distance, so
+    short cards still get full signatures.
+    """
+    bins = [None] * DEDUP_NUM_PERM
+    for shingle in shingles:
+        bin_index, value = divmod(hash_shingle(shingle), BIN_RANGE)
+        if bins[bin_index] is None or value < bins[bin_index]:
+            bins[bin_index] = value
+
+    if None in bins:
+        filled = [value is not None for value in bins]
+        borrowed = None
+        distance = 0
+        # Walk backwards twice around the ring so every empty bin finds the next filled one
+        for position in range(2 * DEDUP_NUM_PERM - 1, -1, -1):
+            index = position % DEDUP_NUM_PERM
+            if filled[index]:
+                borrowed = bins[index]
+                distance = 0
+            elif borrowed is not None:
+                distance += 1
+                bins[index] = (borrowed, distance)
+
+    return tuple(bins)
+
+def collision_probability(similarity: float, bands: int, rows: int) -> float:
+    """Chance that two cards with this Jaccard similarity share at least one LSH bucket"""
+    return 1 - (1 - similarity ** rows) ** bands
+
+@lru_cache(maxsize=32)
+def choose_bands(threshold: float, num_perm: int = DEDUP_NUM_PERM) -> tuple:
+    """Pick the (bands, rows) split that minimises false positives below threshold plus false negatives above it"""
+    steps = 50
+    below = [threshold * (i + 0.5) / steps for i in range(steps)]
+    above = [threshold + (1 - threshold) * (i + 0.5) / steps for i in range(steps)]
+
+    def error(option):
+        bands, rows = option
+        false_positives = sum(collision_probability(s, bands, rows) for s in below) * threshold / steps
+        false_negatives = sum(1 - collision_probability(s, bands, rows) for s in above) * (1 - threshold) / steps
+        return false_positives + false_negatives
+
+    options = [(bands, rows) for rows in range(1, num_perm + 1) for bands in range(1, num_perm // rows + 1)]
+    return min(options, key=error)
+
+def jaccard(first: frozenset, second: frozenset) -> float:
+    if not first and not second:
+        return 1.0
+    shared = len(first & second)
+    return shared / (len(first) + len(second) - shared)
+
+class FlashcardDeduplicator:
+    """Incremental near-duplicate detection using MinHash signatures and LSH buckets
+
+    Each card is compared only against earlier cards that share an LSH bucket, and
+    candidates are confirmed with the exact Jaccard similarity of their shingles,
+    so the cost stays close to linear in the number of cards.
+    """
+
+    def __init__(self, threshold: float = DEDUP_SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self.bands, self.rows = choose_bands(threshold)
+        self._buckets = [{} for _ in range(self.bands)]
+        self._shingles = []
+        self._unshingled = set()
+
+    def add(self, card: dict) -> bool:
+        """Record the card and return True if it is not a near-duplicate of an earlier one"""
+        shingles = card_shingles(card)
+        if not shingles:
+            # Nothing to measure similarity on (symbols only, or a lone stop word), so only an
+            # identical card counts as a duplicate
+            text = tuple(" ".join(str(card.get(field, "")).lower().split()) for field in ("question", "answer"))
+            if text in self._unshingled:
+                return False
+            self._unshingled.add(text)
+            return True
+
+        signature = minhash_signature(shingles)
+        band_keys = [signature[band * self.rows:(band + 1) * self.rows] for band in range(self.bands)]
+
+        checked = set()
+        for band, key in enumerate(band_keys):
+            for index in self._buckets[band].get(key, ()):
+                if index in checked:
+                    continue
+                checked.add(index)
+                if jaccard(shingles, self._shingles[index]) >= self.threshold:
+                    return False
+
+        index = len(self._shingles)
+        self._shingles.append(shingles)
+        for band, key in enumerate(band_keys):
+            self._buckets[band].setdefault(key, []).append(index)
+        return True
+
+def remove_duplicate_flashcards(flashcards: list, threshold: float = DEDUP_SIMILARITY_THRESHOLD) -> list:
+    """Keep the first card of every group of near-duplicates, preserving order"""
+    deduplicator = FlashcardDeduplicator(threshold)
+    return [card for card in flashcards if deduplicator.add(card)]
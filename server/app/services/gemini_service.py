@@ -1,23 +1,44 @@
 # app/services/gemini_service.py
 
 import os
-import google.generativeai as genai
 import json
-import re
+import math
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import time
-from app.services.file_parser import extract_text_from_file
+from app.services.parse_pool import aiter_parsed_segments, ParseQueueFullError
+from app.services.flashcard_dedup import FlashcardDeduplicator, remove_duplicate_flashcards, DEDUP_SIMILARITY_THRESHOLD
+from app.services.result_cache import flashcard_cache, chunk_cache, explanation_cache, make_cache_key, make_digest_key
+from app.utils.file_utils import digest_source
+from app.services.rate_limiter import AdaptiveLimiter, PRIORITY_INTERACTIVE, PRIORITY_BULK
+from app.services.llm_providers import GeminiProvider, ProviderRouter
+from app.services.context_cache import prompt_contexts, register_context, get_context
+from app.services.metrics import (
+    stage,
+    annotate,
+    JSON_PARSE_FAILURES,
+    INVALID_CARDS,
+    TRUNCATED_RESPONSES,
+    FALLBACK_FLASHCARDS,
+    CHUNKS_PLANNED,
+    DEADLINE_ABANDONED_CHUNKS
+)
+from app.services.retry_policy import CHUNK_CALL_TIMEOUT_SECONDS, LatencyTracker, call_chunk_with_retries
+from app.utils.chunking_utils import ChunkPacker, estimate_tokens, DEFAULT_CHARS_PER_TOKEN
+from app.utils.json_utils import JSONArrayParser, parse_json_array
 
 load_dotenv()
 
-# Configure Gemini API
-genai.configure(api_key=os.getenv("GEMINI_API"))
-
 # Initialize model with error handling
 def get_gemini_model():
-    """Get the best available Gemini model"""
+    """Get the best available Gemini model
+    
+    gemini_provider calls this on first use in each process instead of at import, so
+    startup skips loading the SDK and pre-fork workers never share its gRPC channels.
+    """
+    import google.generativeai as genai
+    
+    # Configuring also drops any clients the SDK cached in a parent process
+    genai.configure(api_key=os.getenv("GEMINI_API"))
     try:
         return genai.GenerativeModel('gemini-1.5-flash')
     except Exception:
@@ -30,113 +51,493 @@ def get_gemini_model():
                 print(f"Error initializing Gemini model: {e}")
                 raise
 
-model = get_gemini_model()
+# Process-wide admission control shared by every Gemini call (see rate_limiter.AdaptiveLimiter)
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_MIN_CONCURRENCY = int(os.getenv("GEMINI_MIN_CONCURRENCY", "1"))
+GEMINI_REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "0"))  # 0 disables the limit
+GEMINI_TOKENS_PER_MINUTE = int(os.getenv("GEMINI_TOKENS_PER_MINUTE", "0"))
+
+gemini_limiter = AdaptiveLimiter(
+    "Gemini",
+    max_concurrency=GEMINI_MAX_CONCURRENCY,
+    min_concurrency=GEMINI_MIN_CONCURRENCY,
+    requests_per_minute=GEMINI_REQUESTS_PER_MINUTE,
+    tokens_per_minute=GEMINI_TOKENS_PER_MINUTE
+)
+
+gemini_provider = GeminiProvider(get_gemini_model, gemini_limiter)
+
+# Providers the router may send calls to; Cohere joins by default when it has an API key
+LLM_PROVIDERS = [
+    name.strip()
+    for name in os.getenv("LLM_PROVIDERS", "gemini,cohere" if os.getenv("COHERE_API_KEY") else "gemini").split(",")
+    if name.strip()
+]
+
+def create_provider(name: str):
+    """Look up a provider by name; Cohere is only imported when it is enabled"""
+    if name == "gemini":
+        return gemini_provider
+    if name == "cohere":
+        from app.services.cohere_service import cohere_provider
+        return cohere_provider
+    raise ValueError(f"Unknown LLM provider: {name}")
+
+llm_router = ProviderRouter([create_provider(name) for name in LLM_PROVIDERS])
+
+async def generate_content(prompt: str, priority: int = PRIORITY_INTERACTIVE, timeout: float = None,
+                           latency_tracker: LatencyTracker = None, **options) -> str:
+    """Single async entry point for all model calls; returns the response text
+    
+    The router picks the provider with the best recent latency and error rate and
+    fails over to the next one. Options are provider-neutral (see llm_providers.Provider),
+    including cached_context and cached_prompt for prompts that start with a registered
+    context; timeout covers the model call itself, while latency_tracker also counts time spent queued.
+    """
+    return await llm_router.generate(prompt, priority=priority, timeout=timeout,
+                                     latency_tracker=latency_tracker, **options)
+
+def stream_content(prompt: str, priority: int = PRIORITY_INTERACTIVE, **options):
+    """Yield response text as the routed provider generates it"""
+    return llm_router.stream(prompt, priority=priority, **options)
+
+# Generation parameters; these also form part of the flashcard cache key
+CHUNK_INPUT_TOKEN_BUDGET = int(os.getenv("CHUNK_INPUT_TOKEN_BUDGET", "4000"))    # Input tokens packed into each request
+MAX_REQUESTS_PER_DOCUMENT = int(os.getenv("MAX_REQUESTS_PER_DOCUMENT", "12"))  # Long documents get fuller requests
+MAX_CHUNK_INPUT_TOKENS = int(os.getenv("MAX_CHUNK_INPUT_TOKENS", "100000"))    # Budget ceiling, within model input limits
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "0"))              # Context repeated from the previous chunk
+TOKENS_PER_FLASHCARD = 125   # Roughly one flashcard per 500 characters of source text
+SMALL_TEXT_FLASHCARDS = 8    # Minimum target when the whole document fits in one request
+MIN_CHUNK_FLASHCARDS = 4
+MAX_CHUNK_FLASHCARDS = 10
+MAX_FLASHCARDS = 80          # Limit per document for better UX
+PIPELINE_VERSION = 11        # Bump when prompts or post-processing change
+
+# Replies are constrained to these shapes (JSON mode), so no fences or preamble need stripping
+FLASHCARD_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "question": {"type": "string"},
+            "answer": {"type": "string"},
+            "difficulty": {"type": "string"},
+            "category": {"type": "string"}
+        },
+        "required": ["question", "answer", "difficulty", "category"]
+    }
+}
+
+# Chunk calls use the retry policy in retry_policy, plus optional hedging at the observed p95
+CHUNK_HEDGING = os.getenv("CHUNK_HEDGING", "false").lower() in ("1", "true", "yes")
+# Chunk generation for one document stops here and returns the cards that are ready (0 disables)
+DOCUMENT_DEADLINE_SECONDS = float(os.getenv("DOCUMENT_DEADLINE_SECONDS", "180"))
 
-async def generate_flashcards_from_file(file_content: bytes, filename: str) -> list:
-    """Generate flashcards from file using your file parser to extract text"""
+chunk_latency = LatencyTracker()
+
+# Each document calibrates the characters-per-token ratio with one count_tokens call
+TOKEN_SAMPLE_CHARS = 8000
+
+def get_generation_params() -> dict:
+    """Parameters that determine the generated flashcards for a given input"""
+    return {
+        "input_token_budget": CHUNK_INPUT_TOKEN_BUDGET,
+        "max_requests": MAX_REQUESTS_PER_DOCUMENT,
+        "max_input_tokens": MAX_CHUNK_INPUT_TOKENS,
+        "overlap_tokens": CHUNK_OVERLAP_TOKENS,
+        "tokens_per_flashcard": TOKENS_PER_FLASHCARD,
+        "small_text_flashcards": SMALL_TEXT_FLASHCARDS,
+        "chunk_flashcards": [MIN_CHUNK_FLASHCARDS, MAX_CHUNK_FLASHCARDS],
+        "max_flashcards": MAX_FLASHCARDS,
+        "dedup_threshold": DEDUP_SIMILARITY_THRESHOLD,
+        "model": llm_router.model_name,
+        "pipeline_version": PIPELINE_VERSION
+    }
+
+async def generate_flashcards_from_file(file_content, filename: str, content_digest: str = None,
+                                        stats: dict = None) -> list:
+    """Generate flashcards from file using your file parser to extract text
+    
+    file_content is the raw bytes or the path of the spooled upload; pass the
+    upload's SHA-256 as content_digest to avoid hashing the file again. stats,
+    if given, receives the chunk counts described in iter_chunk_results.
+    """
+    
+    # Identical uploads skip parsing and every model call
+    document_id = content_digest or digest_source(file_content)
+    cache_key = make_digest_key(document_id, **get_generation_params())
+    cached_flashcards = await flashcard_cache.get(cache_key)
+    if cached_flashcards is not None:
+        return cached_flashcards
     
     try:
-        # Use your file parser to extract text
-        extracted_text = extract_text_from_file(filename, file_content)
+        # Pages are parsed in parallel in the worker pool and packed into requests as they arrive
+        plan = ChunkPlan()
+        segments = aiter_parsed_segments(filename, file_content, on_segment_count=plan.expect_segments)
+        flashcards, complete = await _generate_flashcards_from_plan(plan, segments, stats)
         
-        if not extracted_text or not extracted_text.strip():
+        if not plan.chunks:
             print(f"No text extracted from file: {filename}")
             return create_fallback_flashcards("No content extracted", 3)
         
-        print(f"Extracted {len(extracted_text)} characters from {filename}")
+        register_document_context(document_id, plan)
         
-        # For small files, process directly without chunking
-        if len(extracted_text) < 4000:
-            return await process_single_chunk_async(extracted_text, 0, 8)
+        # Only cache results that did not fall back for any chunk
+        if complete:
+            await flashcard_cache.set(cache_key, flashcards)
         
-        # For larger files, use async processing
-        return await generate_flashcards_from_text(extracted_text)
+        return flashcards
         
+    except ParseQueueFullError:
+        raise
     except Exception as e:
         print(f"Error processing file {filename}: {e}")
         return create_fallback_flashcards("Error processing file", 5)
 
-async def generate_flashcards_from_text(text: str) -> list:
-    """Generate flashcards from text using optimized Gemini processing"""
+async def stream_flashcards_from_file(file_content, filename: str, content_digest: str = None):
+    """Yield flashcard events as each chunk's reply streams in, deduplicating incrementally
+    
+    Events are dicts with a "type" of "start", "progress", "flashcards" or "done";
+    the done event carries the document_id explanation requests can reference.
+    """
     
-    start_time = time.time()
+    document_id = content_digest or digest_source(file_content)
+    cache_key = make_digest_key(document_id, **get_generation_params())
+    cached_flashcards = await flashcard_cache.get(cache_key)
+    if cached_flashcards is not None:
+        yield {"type": "start", "cached": True}
+        yield {"type": "flashcards", "chunk": None, "flashcards": cached_flashcards}
+        yield {"type": "done", "chunks": 0, "chunk_cache_hits": 0, "count": len(cached_flashcards),
+               "document_id": document_id}
+        return
     
-    # Optimize chunk size and limit chunks for speed
-    chunk_size = 5000  # Optimal size for Gemini
-    max_chunks = 6     # Limit total chunks for speed
+    yield {"type": "start", "cached": False}
     
-    text_chunks = split_text_into_chunks(text, chunk_size)
+    plan = ChunkPlan()
+    segments = aiter_parsed_segments(filename, file_content, on_segment_count=plan.expect_segments)
+    deduplicator = FlashcardDeduplicator()
+    collected = []
+    failed_chunks = 0
+    chunks_done = 0
+    chunk_stats = {}
     
-    # Limit number of chunks to process
-    if len(text_chunks) > max_chunks:
-        print(f"Limiting processing to first {max_chunks} chunks for speed")
-        text_chunks = text_chunks[:max_chunks]
+    # Cards are emitted while each reply streams; the chunk's final result, which repeats them, only
+    # advances progress. chunks_total is an estimate until the whole document has been parsed.
+    async for chunk_index, chunk_flashcards, failed in iter_chunk_results(plan.items(segments), stats=chunk_stats,
+                                                                          partial=True):
+        if failed is not None:
+            failed_chunks += failed
+            chunks_done += 1
+            yield {"type": "progress", "chunks_done": chunks_done, "chunks_total": plan.chunks_total}
+        with stage("dedup"):
+            new_flashcards = [card for card in chunk_flashcards if deduplicator.add(card)]
+        new_flashcards = new_flashcards[:MAX_FLASHCARDS - len(collected)]
+        if new_flashcards:
+            collected.extend(new_flashcards)
+            yield {"type": "flashcards", "chunk": chunk_index, "flashcards": new_flashcards}
     
-    print(f"Processing {len(text_chunks)} chunks with Gemini...")
+    if not plan.chunks:
+        print(f"No text extracted from file: {filename}")
+        flashcards = create_fallback_flashcards("No content extracted", 3)
+        yield {"type": "flashcards", "chunk": None, "flashcards": flashcards}
+        yield {"type": "done", "chunks": 0, "chunk_cache_hits": 0, "count": len(flashcards),
+               "document_id": document_id}
+        return
+    
+    register_document_context(document_id, plan)
+    if not collected:
+        collected = create_fallback_flashcards(plan.chunks[0][:3000], 8)
+        yield {"type": "flashcards", "chunk": None, "flashcards": collected}
+    elif failed_chunks == 0:
+        await flashcard_cache.set(cache_key, collected)
+    
+    yield {"type": "done", "chunks": len(plan.chunks), "chunk_cache_hits": chunk_stats["chunk_cache_hits"],
+           "count": len(collected), "document_id": document_id}
+
+async def generate_flashcards_from_text(text: str) -> list:
+    """Generate flashcards from text using optimized Gemini processing"""
+    plan = ChunkPlan()
+    flashcards, _ = await _generate_flashcards_from_plan(plan, aiter_items([text]))
+    if not plan.chunks:
+        return create_fallback_flashcards("No content extracted", 3)
+    return flashcards
+
+async def _generate_flashcards_from_plan(plan, segments, stats: dict = None) -> tuple:
+    """Run every request concurrently as the plan fills it, returning (flashcards, complete)"""
     
     # Process chunks concurrently
-    all_flashcards = await process_chunks_concurrently(text_chunks)
+    with stage("generation"):
+        all_flashcards, failed_chunks = await _collect_chunk_results(plan.items(segments), stats)
+    if not plan.chunks:
+        return [], False
     
     # Remove duplicates and limit total flashcards
-    unique_flashcards = remove_duplicate_flashcards(all_flashcards)
+    with stage("dedup"):
+        unique_flashcards = remove_duplicate_flashcards(all_flashcards)
     
     # Ensure we have at least some flashcards
     if not unique_flashcards:
-        return create_fallback_flashcards(text[:3000], 8)
-    
-    end_time = time.time()
-    print(f"Generated {len(unique_flashcards)} flashcards in {end_time - start_time:.2f} seconds")
-    
-    return unique_flashcards[:80]  # Limit to 35 for better UX
-
-async def process_chunks_concurrently(text_chunks: list) -> list:
-    """Process multiple chunks concurrently for speed"""
-    
-    # Use ThreadPoolExecutor for concurrent API calls
-    loop = asyncio.get_event_loop()
-    
-    with ThreadPoolExecutor(max_workers=3) as executor:  # Reduced workers for API limits
-        # Create tasks for each chunk
-        tasks = []
-        for i, chunk in enumerate(text_chunks):
-            target_flashcards = max(4, min(8, len(chunk) // 500))  # 4-7 per chunk
-            task = loop.run_in_executor(
-                executor, 
-                process_single_chunk, 
-                chunk, 
-                i, 
-                target_flashcards
-            )
-            tasks.append(task)
-        
-        # Wait for all tasks to complete
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return create_fallback_flashcards(plan.chunks[0][:3000], 8), False
+    
+    return unique_flashcards[:MAX_FLASHCARDS], failed_chunks == 0
+
+async def aiter_items(items):
+    """Adapt a plain iterable to the async segment/chunk pipeline"""
+    for item in items:
+        yield item
+
+async def estimate_chars_per_token(sample: str) -> float:
+    """Calibrate the characters-per-token ratio for a document with the model's token counter"""
+    # Only Gemini counts tokens for free; without it in the router the default ratio is used
+    if not sample.strip() or gemini_provider not in llm_router.providers:
+        return DEFAULT_CHARS_PER_TOKEN
+    try:
+        with stage("token_count"):
+            result = await asyncio.wait_for(gemini_provider.model.count_tokens_async(sample), timeout=5)
+        if result.total_tokens:
+            return len(sample) / result.total_tokens
+    except Exception as e:
+        print(f"Token counting failed, using default estimate: {e}")
+    return DEFAULT_CHARS_PER_TOKEN
+
+class ChunkPlan:
+    """Packs one document's segments into token-budgeted requests while it is still being parsed
+    
+    Every segment is packed; none are skipped. Requests hold CHUNK_INPUT_TOKEN_BUDGET
+    input tokens, raised to about total_tokens / max_requests (at most max_input_tokens)
+    when a document would otherwise need more than max_requests of them. The total is
+    estimated from the first TOKEN_SAMPLE_CHARS characters and the expected segment
+    count (the page count for PDFs), so the first requests go out while later pages
+    are still being parsed. chunks, text and total_tokens cover the whole document
+    once items() has finished.
+    """
+    
+    def __init__(self, token_budget: int = CHUNK_INPUT_TOKEN_BUDGET, max_requests: int = MAX_REQUESTS_PER_DOCUMENT,
+                 overlap_tokens: int = CHUNK_OVERLAP_TOKENS, max_input_tokens: int = MAX_CHUNK_INPUT_TOKENS):
+        self.token_budget = token_budget
+        self.max_requests = max_requests
+        self.overlap_tokens = overlap_tokens
+        self.max_input_tokens = max_input_tokens
+        self.expected_segments = None
+        self.segments = []
+        self.chunks = []
+        self.extracted_chars = 0
+        self.chars_per_token = DEFAULT_CHARS_PER_TOKEN
+        self.request_tokens = None
+        self.estimated_requests = None
+        self.max_chunk_flashcards = MAX_CHUNK_FLASHCARDS
+        self.finished = False
+        self._packer = None
+    
+    def expect_segments(self, count: int) -> None:
+        """Record how many segments the parser will yield; see aiter_parsed_segments"""
+        self.expected_segments = count
+    
+    @property
+    def text(self) -> str:
+        return "\n\n".join(segment for segment in self.segments if segment.strip())
+    
+    @property
+    def total_tokens(self) -> int:
+        return int(self.extracted_chars / self.chars_per_token)
+    
+    @property
+    def chunks_total(self) -> int:
+        """Requests in the plan; an estimate until every segment has been packed"""
+        if self.finished or self.estimated_requests is None:
+            return len(self.chunks)
+        return max(len(self.chunks), self.estimated_requests)
+    
+    async def items(self, segments):
+        """Yield (chunk_index, chunk, target) for each request as soon as it is full"""
+        sample = []
+        sample_chars = 0
+        async for segment in segments:
+            self.segments.append(segment)
+            self.extracted_chars += len(segment)
+            if self._packer is not None:
+                for item in self._pack([segment]):
+                    yield item
+                continue
+            
+            sample.append(segment)
+            sample_chars += len(segment)
+            # Sizing requests needs the document's expected length and enough text to calibrate on
+            if self.expected_segments is None:
+                continue
+            if sample_chars < TOKEN_SAMPLE_CHARS and len(sample) < self.expected_segments:
+                continue
+            await self._start(sample, sample_chars * max(self.expected_segments, len(sample)) / len(sample))
+            for item in self._pack(sample):
+                yield item
         
-        # Collect valid flashcards from all results
-        all_flashcards = []
-        for i, result in enumerate(results):
-            if isinstance(result, list):
-                all_flashcards.extend(result)
-                print(f"Chunk {i+1}: Added {len(result)} flashcards")
-            elif isinstance(result, Exception):
-                print(f"Error in chunk {i+1}: {result}")
-                # Add fallback for failed chunks
-                all_flashcards.extend(create_fallback_flashcards(
-                    text_chunks[i] if i < len(text_chunks) else "error", 3
-                ))
+        if self._packer is None:
+            # Documents of unknown length are sized once they are complete
+            await self._start(sample, self.extracted_chars)
+            for item in self._pack(sample):
+                yield item
+        for item in self._pack([], final=True):
+            yield item
+    
+    async def _start(self, sample: list, estimated_chars: float) -> None:
+        """Calibrate the token ratio on the sample and fix the request budget for the document"""
+        self.chars_per_token = await estimate_chars_per_token("\n".join(sample)[:TOKEN_SAMPLE_CHARS])
+        estimated_tokens = estimated_chars / self.chars_per_token
+        self.request_tokens = min(self.max_input_tokens,
+                                  max(self.token_budget, math.ceil(estimated_tokens / self.max_requests)))
+        self.estimated_requests = max(1, math.ceil(estimated_tokens / self.request_tokens))
+        # Early chunks must not use up MAX_FLASHCARDS before the end of the document is reached
+        self.max_chunk_flashcards = max(MIN_CHUNK_FLASHCARDS,
+                                        min(MAX_CHUNK_FLASHCARDS, MAX_FLASHCARDS // self.estimated_requests))
+        self._packer = ChunkPacker(self.request_tokens, self.chars_per_token, self.overlap_tokens)
+    
+    def _pack(self, segments: list, final: bool = False) -> list:
+        with stage("chunking"):
+            chunks = [chunk for segment in segments for chunk in self._packer.add(segment)]
+            if final:
+                chunks += self._packer.finish()
+                self.finished = True
         
-        return all_flashcards
+        only_chunk = final and not self.chunks and len(chunks) == 1
+        items = []
+        for chunk in chunks:
+            target = get_chunk_target(chunk, self.chars_per_token, self.max_chunk_flashcards)
+            if only_chunk:
+                target = max(target, SMALL_TEXT_FLASHCARDS)
+            items.append((len(self.chunks), chunk, target))
+            self.chunks.append(chunk)
+        CHUNKS_PLANNED.inc(len(items))
+        return items
+
+def get_chunk_target(chunk: str, chars_per_token: float = DEFAULT_CHARS_PER_TOKEN,
+                     max_flashcards: int = MAX_CHUNK_FLASHCARDS) -> int:
+    """Number of flashcards to request for a chunk"""
+    tokens = estimate_tokens(chunk, chars_per_token)
+    return max(MIN_CHUNK_FLASHCARDS, min(max_flashcards, tokens // TOKENS_PER_FLASHCARD))
+
+def normalize_chunk_text(chunk: str) -> str:
+    """Collapse whitespace so re-extracted but unchanged chunks hash identically"""
+    return " ".join(chunk.split())
 
-async def process_single_chunk_async(chunk: str, chunk_index: int, target_flashcards: int) -> list:
-    """Async wrapper for single chunk processing"""
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, process_single_chunk, chunk, chunk_index, target_flashcards)
+def get_chunk_cache_key(chunk: str, target_flashcards: int) -> str:
+    """Chunk-level cache key: normalized text hash plus the per-chunk target"""
+    return make_cache_key(
+        normalize_chunk_text(chunk).encode("utf-8"),
+        target_flashcards=target_flashcards,
+        model=llm_router.model_name,
+        pipeline_version=PIPELINE_VERSION
+    )
 
-def process_single_chunk(chunk: str, chunk_index: int, target_flashcards: int) -> list:
-    """Process a single chunk using Gemini API"""
+async def iter_chunk_results(chunks, deadline_seconds: float = DOCUMENT_DEADLINE_SECONDS, stats: dict = None,
+                             partial: bool = False):
+    """Yield (chunk_index, flashcards, failed) for each chunk as soon as it is ready
+    
+    chunks is an async iterable of (chunk_index, chunk, target); each chunk is sent
+    to the model as soon as it arrives. Chunks already generated for an earlier upload
+    are served from the chunk cache, so only new or edited chunks hit the API.
+    Failed chunks yield fallback flashcards with failed=True. Chunks still running
+    after deadline_seconds are abandoned and yield no flashcards with failed=True.
+    
+    If given, stats is filled with this call's "chunks" and "chunk_cache_hits"; the
+    counts are also attached to the request's trace.
+    
+    With partial, replies are streamed and cards are also yielded as they are parsed,
+    with failed=None; the chunk's final result still follows and repeats them.
+    """
+    
+    stats = stats if stats is not None else {}
+    stats.update(chunks=0, chunk_cache_hits=0)
+    results = asyncio.Queue()
+    tasks = []
+    pending = set()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + deadline_seconds if deadline_seconds else None
     
-    prompt = f"""
-Analyze this text and create {target_flashcards} high-quality study flashcards. 
+    async def run_chunk(chunk_index: int, chunk: str, target: int, cache_key: str):
+        on_flashcards = (lambda cards: results.put_nowait((chunk_index, cards, None))) if partial else None
+        try:
+            chunk_flashcards = await generate_chunk_with_retries(chunk, chunk_index, target, on_flashcards)
+        except Exception as e:
+            print(f"Error in chunk {chunk_index + 1}: {e}")
+            # Add fallback for failed chunks
+            pending.discard(chunk_index)
+            results.put_nowait((chunk_index, create_fallback_flashcards(chunk, target), True))
+            return
+        await chunk_cache.set(cache_key, chunk_flashcards)
+        pending.discard(chunk_index)
+        results.put_nowait((chunk_index, chunk_flashcards, False))
+    
+    async def dispatch():
+        try:
+            async for chunk_index, chunk, target in chunks:
+                cache_key = get_chunk_cache_key(chunk, target)
+                cached_flashcards = await chunk_cache.get(cache_key)
+                stats["chunks"] += 1
+                if cached_flashcards is not None:
+                    stats["chunk_cache_hits"] += 1
+                    results.put_nowait((chunk_index, cached_flashcards, False))
+                else:
+                    # Concurrency across all requests is bounded by each provider's limiter
+                    pending.add(chunk_index)
+                    tasks.append(asyncio.create_task(run_chunk(chunk_index, chunk, target, cache_key)))
+            
+            await asyncio.gather(*tasks)
+        finally:
+            annotate(**stats)
+            results.put_nowait(None)
+    
+    producer = asyncio.create_task(dispatch())
+    try:
+        while True:
+            timeout = max(0, deadline - loop.time()) if deadline is not None else None
+            try:
+                result = await asyncio.wait_for(results.get(), timeout)
+            except asyncio.TimeoutError:
+                print(f"Document deadline of {deadline_seconds:g}s reached with {len(pending)} chunks unfinished")
+                DEADLINE_ABANDONED_CHUNKS.inc(len(pending))
+                for chunk_index in sorted(pending):
+                    yield chunk_index, [], True
+                return
+            if result is None:
+                break
+            yield result
+        # Surface parsing errors from the producer
+        await producer
+    finally:
+        # Stop outstanding work if the consumer goes away early
+        producer.cancel()
+        for task in tasks:
+            task.cancel()
+
+async def _collect_chunk_results(chunks, stats: dict = None) -> tuple:
+    """Run planned chunks concurrently, returning (flashcards in chunk order, failed chunk count)"""
+    results = {}
+    failed_chunks = 0
+    async for chunk_index, chunk_flashcards, failed in iter_chunk_results(chunks, stats=stats):
+        results[chunk_index] = chunk_flashcards
+        failed_chunks += failed
+    
+    all_flashcards = [card for chunk_index in sorted(results) for card in results[chunk_index]]
+    return all_flashcards, failed_chunks
+
+async def generate_chunk_with_retries(chunk: str, chunk_index: int, target_flashcards: int,
+                                     on_flashcards=None) -> list:
+    """Generate a chunk's flashcards with retries and, if enabled, a hedged request at p95; raises on failure
+    
+    Streamed chunks (with on_flashcards) are not hedged, since both replies would emit cards.
+    """
+    hedge = CHUNK_HEDGING and on_flashcards is None
+    return await call_chunk_with_retries(
+        lambda: generate_chunk_flashcards(chunk, chunk_index, target_flashcards, on_flashcards),
+        label=f"Chunk {chunk_index + 1}",
+        hedge_after=chunk_latency.percentile(0.95) if hedge else None,
+        # Hedges only use spare capacity; a queued duplicate would not finish sooner
+        can_hedge=lambda: not llm_router.busy()
+    )
+
+# Identical for every chunk of every document, so it is sent first as a stable prefix
+FLASHCARD_INSTRUCTIONS = """
+You create high-quality study flashcards from lecture text.
 
 Focus on:
 - Key concepts and definitions
@@ -144,9 +545,6 @@ Focus on:
 - Processes and procedures
 - Critical thinking questions
 
-Text to analyze:
-{chunk}
-
 Create diverse question types:
 - "What is..." for definitions
 - "How does..." for processes
@@ -156,99 +554,143 @@ Create diverse question types:
 
 Return ONLY a valid JSON array in this exact format:
 [
-  {{"question": "What is the definition of [concept]?", "answer": "Complete definition with key details", "difficulty": "easy", "category": "definition"}},
-  {{"question": "How does [process] work?", "answer": "Step-by-step explanation", "difficulty": "medium", "category": "process"}},
-  {{"question": "Why is [concept] important?", "answer": "Explanation of significance", "difficulty": "medium", "category": "analysis"}}
+  {"question": "What is the definition of [concept]?", "answer": "Complete definition with key details", "difficulty": "easy", "category": "definition"},
+  {"question": "How does [process] work?", "answer": "Step-by-step explanation", "difficulty": "medium", "category": "process"},
+  {"question": "Why is [concept] important?", "answer": "Explanation of significance", "difficulty": "medium", "category": "analysis"}
 ]
 
 Requirements:
-- Create exactly {target_flashcards} flashcards
 - Use clear, specific questions
 - Provide complete, accurate answers
 - Include difficulty and category
 - Return ONLY JSON, no other text
 """
 
-    try:
-        # Optimized generation config for Gemini
-        generation_config = genai.types.GenerationConfig(
-            temperature=0.2,  # Lower for consistency
-            top_p=0.8,
-            top_k=40,
-            max_output_tokens=2000,
-        )
-        
-        # Safety settings to ensure content generation
-        safety_settings = [
-            {
-                "category": "HARM_CATEGORY_HARASSMENT",
-                "threshold": "BLOCK_NONE"
-            },
-            {
-                "category": "HARM_CATEGORY_HATE_SPEECH",
-                "threshold": "BLOCK_NONE"
-            },
-            {
-                "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                "threshold": "BLOCK_NONE"
-            },
-            {
-                "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                "threshold": "BLOCK_NONE"
-            }
-        ]
-        
-        response = model.generate_content(
-            prompt,
-            generation_config=generation_config,
-            safety_settings=safety_settings
-        )
-        
-        if response.text:
-            print(f"Gemini response for chunk {chunk_index + 1}: {len(response.text)} chars")
-            
-            # Clean and extract JSON
-            response_text = response.text.strip()
-            
-            # Remove markdown code blocks
-            response_text = re.sub(r'```json\s*', '', response_text)
-            response_text = re.sub(r'```\s*', '', response_text)
-            response_text = re.sub(r'^json\s*', '', response_text, flags=re.MULTILINE)
-            
-            # Extract JSON array
-            json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
-            
-            if json_match:
-                json_text = json_match.group(0)
-                try:
-                    chunk_flashcards = json.loads(json_text)
-                    valid_flashcards = validate_flashcards_fast(chunk_flashcards)
-                    print(f"Chunk {chunk_index + 1}: Generated {len(valid_flashcards)} valid flashcards")
-                    return valid_flashcards
-                except json.JSONDecodeError as e:
-                    print(f"JSON decode error in chunk {chunk_index + 1}: {e}")
-                    print(f"Raw JSON: {json_text[:200]}...")
-            else:
-                print(f"No JSON array found in chunk {chunk_index + 1}")
-                print(f"Response preview: {response_text[:200]}...")
-        
-        # Fast fallback
-        print(f"Using fallback for chunk {chunk_index + 1}")
-        return create_fallback_flashcards(chunk, target_flashcards)
+def build_chunk_request(chunk: str, target_flashcards: int) -> str:
+    """The per-chunk part of a flashcard prompt, sent after FLASHCARD_INSTRUCTIONS"""
+    return f"""
+Create exactly {target_flashcards} flashcards from this text:
+
+{chunk}
+"""
+
+async def generate_chunk_flashcards(chunk: str, chunk_index: int, target_flashcards: int,
+                                    on_flashcards=None) -> list:
+    """Generate flashcards for a single chunk through the provider router; raises on failure
+    
+    With on_flashcards, the reply is streamed and on_flashcards receives each batch of
+    validated cards as soon as its JSON object is complete.
+    """
+    
+    chunk_request = build_chunk_request(chunk, target_flashcards)
+
+    # Safety settings to ensure content generation (Gemini only)
+    safety_settings = [
+        {
+            "category": "HARM_CATEGORY_HARASSMENT",
+            "threshold": "BLOCK_NONE"
+        },
+        {
+            "category": "HARM_CATEGORY_HATE_SPEECH",
+            "threshold": "BLOCK_NONE"
+        },
+        {
+            "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+            "threshold": "BLOCK_NONE"
+        },
+        {
+            "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+            "threshold": "BLOCK_NONE"
+        }
+    ]
+    
+    reply = ChunkReplyParser(chunk_index, on_flashcards) if on_flashcards is not None else None
+    
+    # Providers that cached the instructions only receive the chunk
+    text = await generate_content(
+        FLASHCARD_INSTRUCTIONS + chunk_request,
+        priority=PRIORITY_BULK,
+        timeout=CHUNK_CALL_TIMEOUT_SECONDS,
+        latency_tracker=chunk_latency,
+        temperature=0.2,  # Lower for consistency
+        top_p=0.8,
+        top_k=40,
+        max_output_tokens=2000,
+        response_schema=FLASHCARD_SCHEMA,
+        safety_settings=safety_settings,
+        cached_context=register_context("flashcard-instructions", FLASHCARD_INSTRUCTIONS),
+        cached_prompt=chunk_request,
+        on_text=reply.feed if reply is not None else None
+    )
+    
+    if reply is not None:
+        return reply.close()
+    return parse_chunk_response(text, chunk_index)
+
+class ChunkReplyParser:
+    """Parse a streamed chunk reply as it arrives, passing validated cards to on_flashcards"""
+    
+    def __init__(self, chunk_index: int, on_flashcards):
+        self.chunk_index = chunk_index
+        self.on_flashcards = on_flashcards
+        self.parser = JSONArrayParser()
+        self.items = 0
+        self.flashcards = []
+    
+    def feed(self, text: str) -> None:
+        with stage("json_parse"):
+            self._emit(self.parser.feed(text))
+    
+    def close(self) -> list:
+        """All validated cards of the reply; raises ValueError like parse_chunk_response"""
+        with stage("json_parse"):
+            self._emit(self.parser.close())
+        if not self.parser.started or not self.items:
+            JSON_PARSE_FAILURES.inc(kind="chunk")
+            raise ValueError(f"Empty or unparseable JSON array in chunk {self.chunk_index + 1}")
+        if self.parser.truncated:
+            TRUNCATED_RESPONSES.inc()
+        return self.flashcards
+    
+    def _emit(self, items: list) -> None:
+        self.items += len(items)
+        flashcards = validate_flashcards_fast(items)
+        if flashcards:
+            self.flashcards.extend(flashcards)
+            self.on_flashcards(flashcards)
+
+def parse_chunk_response(text: str, chunk_index: int) -> list:
+    """Extract validated flashcards from a model response; raises ValueError if none can be parsed"""
+    if not text:
+        JSON_PARSE_FAILURES.inc(kind="chunk")
+        raise ValueError(f"Empty response for chunk {chunk_index + 1}")
+    
+    with stage("json_parse"):
+        try:
+            chunk_flashcards = extract_json_array(text)
+        except ValueError as e:
+            JSON_PARSE_FAILURES.inc(kind="chunk")
+            raise ValueError(f"{e} in chunk {chunk_index + 1}") from e
         
-    except Exception as e:
-        print(f"Error in chunk {chunk_index + 1}: {e}")
-        return create_fallback_flashcards(chunk, target_flashcards)
+        return validate_flashcards_fast(chunk_flashcards)
+
+def extract_json_array(text: str) -> list:
+    """Items of the JSON array in a model response, salvaging complete items from a truncated reply; raises ValueError"""
+    items, truncated = parse_json_array(text)
+    if truncated:
+        TRUNCATED_RESPONSES.inc()
+    if not items:
+        raise ValueError("Empty or unparseable JSON array")
+    return items
 
 def validate_flashcards_fast(flashcards: list) -> list:
     """Fast validation of flashcards structure"""
     valid_flashcards = []
     
     if not isinstance(flashcards, list):
-        print(f"Expected list, got {type(flashcards)}")
         return []
     
-    for i, card in enumerate(flashcards):
+    for card in flashcards:
         if isinstance(card, dict):
             question = card.get("question", "").strip()
             answer = card.get("answer", "").strip()
@@ -260,91 +702,14 @@ def validate_flashcards_fast(flashcards: list) -> list:
                     "difficulty": card.get("difficulty", "medium"),
                     "category": card.get("category", "concept")
                 })
-            else:
-                print(f"Skipping invalid card {i}: missing or short question/answer")
-        else:
-            print(f"Skipping non-dict card {i}: {type(card)}")
+                continue
+        INVALID_CARDS.inc()
     
     return valid_flashcards
 
-def split_text_into_chunks(text: str, chunk_size: int) -> list:
-    """Optimized text chunking for better context preservation"""
-    if len(text) <= chunk_size:
-        return [text]
-    
-    # First try splitting on double newlines (paragraphs)
-    paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
-    
-    if not paragraphs:
-        # Fallback to sentence splitting
-        return split_by_sentences(text, chunk_size)
-    
-    chunks = []
-    current_chunk = ""
-    
-    for para in paragraphs:
-        # If adding this paragraph would exceed chunk_size
-        if len(current_chunk) + len(para) + 2 > chunk_size and current_chunk:
-            chunks.append(current_chunk.strip())
-            current_chunk = para + "\n\n"
-        else:
-            current_chunk += para + "\n\n"
-    
-    # Add the last chunk
-    if current_chunk.strip():
-        chunks.append(current_chunk.strip())
-    
-    # If any chunk is still too long, split it further
-    final_chunks = []
-    for chunk in chunks:
-        if len(chunk) > chunk_size * 1.3:  # 30% tolerance
-            final_chunks.extend(split_by_sentences(chunk, chunk_size))
-        else:
-            final_chunks.append(chunk)
-    
-    return final_chunks
-
-def split_by_sentences(text: str, chunk_size: int) -> list:
-    """Fallback sentence-based splitting"""
-    sentences = [s.strip() + '.' for s in text.split('.') if s.strip()]
-    chunks = []
-    current_chunk = ""
-    
-    for sentence in sentences:
-        if len(current_chunk) + len(sentence) + 1 > chunk_size and current_chunk:
-            chunks.append(current_chunk.strip())
-            current_chunk = sentence + " "
-        else:
-            current_chunk += sentence + " "
-    
-    if current_chunk.strip():
-        chunks.append(current_chunk.strip())
-    
-    return chunks if chunks else [text[:chunk_size]]
-
-def remove_duplicate_flashcards(flashcards: list) -> list:
-    """Remove duplicate flashcards with improved similarity detection"""
-    seen_questions = set()
-    unique_flashcards = []
-    
-    for card in flashcards:
-        question = card["question"].lower().strip()
-        
-        # Create a normalized version for comparison
-        normalized = re.sub(r'[^\w\s]', '', question)
-        words = normalized.split()
-        
-        # Create a signature using first few words
-        signature = ' '.join(words[:5]) if len(words) >= 5 else normalized
-        
-        if signature not in seen_questions:
-            seen_questions.add(signature)
-            unique_flashcards.append(card)
-    
-    return unique_flashcards
-
 def create_fallback_flashcards(text: str, target_count: int = 3) -> list:
     """Create basic flashcards as fallback when AI processing fails"""
+    FALLBACK_FLASHCARDS.inc()
     sentences = [s.strip() for s in text.split('.') if len(s.strip()) > 20][:target_count * 2]
     
     flashcards = []
@@ -382,10 +747,39 @@ def create_fallback_flashcards(text: str, target_count: int = 3) -> list:
         "category": "concept"
     }]
 
-async def get_additional_explanation(question: str, current_answer: str, context: str = "") -> dict:
-    """Get additional explanation for a flashcard using Gemini"""
+# The text each deck was generated from is registered once, so explanation calls can reference it by
+# document id; providers with context caching upload it once, the others receive it inline
+DOCUMENT_INSTRUCTIONS = """
+You are an expert tutor. A student is studying flashcards generated from the lecture document below.
+Ground every explanation in this document: use its terminology, notation and examples where they apply,
+and point out when a card goes beyond what the document covers.
+"""
+DOCUMENT_CONTEXT_NOTE = "The lecture document provided above"
+
+def register_document_context(document_id: str, plan) -> None:
+    """Keep the extracted text of a document for later explanation calls"""
+    register_context(f"document:{document_id}", DOCUMENT_INSTRUCTIONS, plan.text, plan.total_tokens)
+
+def document_context_options(document_id: str, cached_prompt: str) -> dict:
+    """generate_content options that send cached_prompt after the document
     
-    prompt = f"""
+    Providers holding the document in a context cache send only cached_prompt; the
+    others send the document, or its passages most relevant to the card, inline.
+    Unknown or expired documents get the self-contained prompt.
+    """
+    context = get_context(f"document:{document_id}") if document_id else None
+    if context is None:
+        return {}
+    return {"cached_context": context, "cached_prompt": cached_prompt}
+
+async def release_prompt_contexts() -> None:
+    """Delete provider-side context caches on shutdown rather than leaving them to expire"""
+    for context in prompt_contexts.contexts():
+        await llm_router.release_context(context)
+
+def build_additional_explanation_prompt(question: str, current_answer: str, context: str = "") -> str:
+    """Prompt for a detailed tutor-style explanation of a flashcard"""
+    return f"""
 As an expert tutor, provide a comprehensive explanation for this study concept:
 
 Question: {question}
@@ -402,26 +796,93 @@ Provide a detailed explanation that includes:
 Make it educational and easy to understand.
 """
 
+def build_simplified_explanation_prompt(question: str, current_answer: str) -> str:
+    """Prompt for a simpler restatement of a flashcard answer"""
+    return f"""
+Simplify this explanation for better understanding:
+
+Question: {question}
+Current Answer: {current_answer}
+
+Provide:
+1. Simplified explanation using everyday language
+2. Break down complex terms
+3. Simple analogies or examples
+4. Focus on the most important points
+
+Keep it clear and concise.
+"""
+
+def build_examples_prompt(question: str, current_answer: str) -> str:
+    """Prompt for real-world examples and applications of a flashcard concept"""
+    return f"""
+Provide practical examples and real-world applications:
+
+Question: {question}
+Current Answer: {current_answer}
+
+Include:
+1. 3-4 concrete real-world examples
+2. Practical applications in different fields
+3. How this connects to everyday life
+4. Current trends or developments
+
+Make it relevant and engaging.
+"""
+
+EXPLANATION_PIPELINE_VERSION = 4  # Bump when explanation prompts change
+
+def get_explanation_cache_key(explanation_type: str, question: str, current_answer: str, context: str = "",
+                              document_id: str = "") -> str:
+    """Cache key for one explanation of one card, grounded in document_id if given"""
+    card = json.dumps([question, current_answer, context, document_id]).encode("utf-8")
+    return make_cache_key(
+        card,
+        explanation_type=explanation_type,
+        model=llm_router.model_name,
+        pipeline_version=EXPLANATION_PIPELINE_VERSION
+    )
+
+async def get_cached_explanation(explanation_type: str, question: str, current_answer: str, context: str = "",
+                                 document_id: str = ""):
+    """Return a stored explanation result, or None if it has not been generated yet"""
+    key = get_explanation_cache_key(explanation_type, question, current_answer, context, document_id)
+    result = await explanation_cache.get(key)
+    return dict(result, cached=True) if result is not None else None
+
+async def store_explanation(explanation_type: str, question: str, current_answer: str, context: str, result: dict,
+                            document_id: str = "") -> None:
+    """Remember a successful explanation so later clicks are cache lookups"""
+    if result.get("success"):
+        # Store a copy; callers go on to annotate the result they return
+        key = get_explanation_cache_key(explanation_type, question, current_answer, context, document_id)
+        await explanation_cache.set(key, dict(result))
+
+ADDITIONAL_EXPLANATION_OPTIONS = {
+    "temperature": 0.3,
+    "max_output_tokens": 1000
+}
+
+async def get_additional_explanation(question: str, current_answer: str, context: str = "",
+                                     priority: int = PRIORITY_INTERACTIVE, document_id: str = "") -> dict:
+    """Get additional explanation for a flashcard"""
+    
+    prompt = build_additional_explanation_prompt(question, current_answer, context)
+    document_options = document_context_options(
+        document_id, build_additional_explanation_prompt(question, current_answer, context or DOCUMENT_CONTEXT_NOTE)
+    )
+
     try:
-        loop = asyncio.get_event_loop()
-        
-        def _generate():
-            return model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.3,
-                    max_output_tokens=1000
-                )
-            )
-        
-        response = await loop.run_in_executor(None, _generate)
+        text = await generate_content(prompt, priority=priority, **ADDITIONAL_EXPLANATION_OPTIONS, **document_options)
         
-        return {
+        result = {
             "success": True,
-            "explanation": response.text.strip() if response.text else "No explanation generated",
+            "explanation": text.strip() if text else "No explanation generated",
             "original_question": question,
             "original_answer": current_answer
         }
+        await store_explanation("additional", question, current_answer, context, result, document_id)
+        return result
         
     except Exception as e:
         print(f"Error getting additional explanation: {e}")
@@ -433,34 +894,24 @@ Make it educational and easy to understand.
             "original_answer": current_answer
         }
 
-def get_simplified_explanation(question: str, current_answer: str) -> dict:
-    """Get a simplified explanation using Gemini"""
+async def get_simplified_explanation(question: str, current_answer: str, priority: int = PRIORITY_INTERACTIVE,
+                                     document_id: str = "") -> dict:
+    """Get a simplified explanation"""
     
-    prompt = f"""
-Simplify this explanation for better understanding:
-
-Question: {question}
-Current Answer: {current_answer}
-
-Provide:
-1. Simplified explanation using everyday language
-2. Break down complex terms
-3. Simple analogies or examples
-4. Focus on the most important points
-
-Keep it clear and concise.
-"""
+    prompt = build_simplified_explanation_prompt(question, current_answer)
 
     try:
-        response = model.generate_content(prompt)
+        text = await generate_content(prompt, priority=priority, **document_context_options(document_id, prompt))
         
-        return {
+        result = {
             "success": True,
-            "explanation": response.text.strip() if response.text else "No simplified explanation generated",
+            "explanation": text.strip() if text else "No simplified explanation generated",
             "type": "simplified",
             "original_question": question,
             "original_answer": current_answer
         }
+        await store_explanation("simplified", question, current_answer, "", result, document_id)
+        return result
         
     except Exception as e:
         print(f"Error getting simplified explanation: {e}")
@@ -472,34 +923,24 @@ Keep it clear and concise.
             "original_answer": current_answer
         }
 
-def get_examples_and_applications(question: str, current_answer: str) -> dict:
-    """Get practical examples and applications using Gemini"""
+async def get_examples_and_applications(question: str, current_answer: str, priority: int = PRIORITY_INTERACTIVE,
+                                        document_id: str = "") -> dict:
+    """Get practical examples and applications"""
     
-    prompt = f"""
-Provide practical examples and real-world applications:
-
-Question: {question}
-Current Answer: {current_answer}
-
-Include:
-1. 3-4 concrete real-world examples
-2. Practical applications in different fields
-3. How this connects to everyday life
-4. Current trends or developments
-
-Make it relevant and engaging.
-"""
+    prompt = build_examples_prompt(question, current_answer)
 
     try:
-        response = model.generate_content(prompt)
+        text = await generate_content(prompt, priority=priority, **document_context_options(document_id, prompt))
         
-        return {
+        result = {
             "success": True,
-            "explanation": response.text.strip() if response.text else "No examples generated",
+            "explanation": text.strip() if text else "No examples generated",
             "type": "examples",
             "original_question": question,
             "original_answer": current_answer
         }
+        await store_explanation("examples", question, current_answer, "", result, document_id)
+        return result
         
     except Exception as e:
         print(f"Error getting examples: {e}")
@@ -509,4 +950,202 @@ Make it relevant and engaging.
             "explanation": "Sorry, I couldn't generate examples at this time.",
             "original_question": question,
             "original_answer": current_answer
-        }
\ No newline at end of file
+        }
+
+def stream_additional_explanation(question: str, current_answer: str, context: str = "", document_id: str = ""):
+    """Stream an additional explanation as text fragments while the model generates it"""
+    prompt = build_additional_explanation_prompt(question, current_answer, context)
+    document_options = document_context_options(
+        document_id, build_additional_explanation_prompt(question, current_answer, context or DOCUMENT_CONTEXT_NOTE)
+    )
+    chunks = stream_content(prompt, **ADDITIONAL_EXPLANATION_OPTIONS, **document_options)
+    return stream_and_store("additional", question, current_answer, context, document_id, chunks)
+
+def stream_simplified_explanation(question: str, current_answer: str, document_id: str = ""):
+    """Stream a simplified explanation as text fragments"""
+    prompt = build_simplified_explanation_prompt(question, current_answer)
+    chunks = stream_content(prompt, **document_context_options(document_id, prompt))
+    return stream_and_store("simplified", question, current_answer, "", document_id, chunks)
+
+def stream_examples_and_applications(question: str, current_answer: str, document_id: str = ""):
+    """Stream practical examples and applications as text fragments"""
+    prompt = build_examples_prompt(question, current_answer)
+    chunks = stream_content(prompt, **document_context_options(document_id, prompt))
+    return stream_and_store("examples", question, current_answer, "", document_id, chunks)
+
+async def stream_and_store(explanation_type: str, question: str, current_answer: str, context: str,
+                           document_id: str, chunks):
+    """Pass streamed fragments through, then store the finished explanation like the non-streaming calls"""
+    fragments = []
+    async for text in chunks:
+        fragments.append(text)
+        yield text
+    
+    explanation = "".join(fragments).strip()
+    if explanation:
+        result = {
+            "success": True,
+            "explanation": explanation,
+            "original_question": question,
+            "original_answer": current_answer
+        }
+        if explanation_type != "additional":
+            result["type"] = explanation_type
+        await store_explanation(explanation_type, question, current_answer, context, result, document_id)
+
+# Batch explanations: several cards share one prompt, and the packed prompts run concurrently
+EXPLANATION_BATCH_SIZE = int(os.getenv("EXPLANATION_BATCH_SIZE", "5"))  # Cards per prompt
+
+EXPLANATION_BATCH_GUIDANCE = {
+    "additional": "a comprehensive explanation: core concept breakdown, a real-world example or analogy, key points to remember, common misconceptions and how it connects to broader topics",
+    "simplified": "a simplified explanation in everyday language: break down complex terms, use a simple analogy and focus on the most important points",
+    "examples": "practical examples: 3-4 concrete real-world examples, applications in different fields and how it connects to everyday life"
+}
+EXPLANATION_TYPES = tuple(EXPLANATION_BATCH_GUIDANCE)
+
+BATCH_EXPLANATION_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "card": {"type": "integer"},
+            "explanation": {"type": "string"}
+        },
+        "required": ["card", "explanation"]
+    }
+}
+
+def explanation_context(explanation_type: str, context: str) -> str:
+    """Only additional explanations use the request context, in the prompt and in the cache key"""
+    return context if explanation_type == "additional" else ""
+
+def build_batch_explanation_prompt(explanation_type: str, cards: list, context: str = "") -> str:
+    """Prompt asking for one explanation per numbered card, returned as a JSON array"""
+    numbered_cards = "\n\n".join(
+        f"Card {i + 1}\nQuestion: {card['question']}\nCurrent Answer: {card['current_answer']}"
+        for i, card in enumerate(cards)
+    )
+    context_line = ""
+    if explanation_type == "additional":
+        context_line = f"\nAdditional Context: {context if context else 'None provided'}\n"
+    return f"""
+As an expert tutor, write {EXPLANATION_BATCH_GUIDANCE[explanation_type]} for each of these study flashcards.
+{context_line}
+{numbered_cards}
+
+Return ONLY a valid JSON array with one object per card, in this exact format:
+[
+  {{"card": 1, "explanation": "Explanation for card 1"}},
+  {{"card": 2, "explanation": "Explanation for card 2"}}
+]
+
+Requirements:
+- Explain every card, {len(cards)} objects in total
+- Each explanation stands on its own and is easy to understand
+- Return ONLY JSON, no other text
+"""
+
+async def get_single_explanation(explanation_type: str, question: str, current_answer: str, context: str = "",
+                                 priority: int = PRIORITY_INTERACTIVE, document_id: str = "") -> dict:
+    """Get one explanation of the given type through its dedicated prompt"""
+    if explanation_type == "additional":
+        return await get_additional_explanation(question, current_answer, context, priority, document_id)
+    if explanation_type == "simplified":
+        return await get_simplified_explanation(question, current_answer, priority, document_id)
+    if explanation_type == "examples":
+        return await get_examples_and_applications(question, current_answer, priority, document_id)
+    raise ValueError(f"Unknown explanation type: {explanation_type}")
+
+async def get_batch_explanations(explanation_type: str, cards: list, context: str = "", document_id: str = "") -> dict:
+    """Explain a whole deck with one model call per EXPLANATION_BATCH_SIZE cards
+    
+    cards is a list of {"question", "current_answer"} dicts; results come back in the same order.
+    """
+    if explanation_type not in EXPLANATION_BATCH_GUIDANCE:
+        raise ValueError(f"Unknown explanation type: {explanation_type}")
+    context = explanation_context(explanation_type, context)
+    
+    # Only cards without a stored explanation go to the model
+    results = await asyncio.gather(*[
+        get_cached_explanation(explanation_type, card["question"], card["current_answer"], context, document_id)
+        for card in cards
+    ])
+    uncached = [i for i, result in enumerate(results) if result is None]
+    batches = [uncached[i:i + EXPLANATION_BATCH_SIZE] for i in range(0, len(uncached), EXPLANATION_BATCH_SIZE)]
+    
+    # Each batch is routed and admitted by its provider's limiter like any other interactive call
+    batch_results = await asyncio.gather(*[
+        explain_card_batch(explanation_type, [cards[i] for i in batch], context, document_id=document_id)
+        for batch in batches
+    ])
+    for batch, batch_result in zip(batches, batch_results):
+        for i, result in zip(batch, batch_result):
+            results[i] = result
+    
+    for index, result in enumerate(results):
+        result["index"] = index
+    
+    return {
+        "success": all(result["success"] for result in results),
+        "type": explanation_type,
+        "count": len(results),
+        "results": results
+    }
+
+async def explain_card_batch(explanation_type: str, cards: list, context: str = "",
+                             priority: int = PRIORITY_INTERACTIVE, document_id: str = "") -> list:
+    """Explain several cards in one prompt; cards missing from the reply fall back to single calls"""
+    context = explanation_context(explanation_type, context)
+    explanations = {}
+    
+    try:
+        text = await generate_content(
+            build_batch_explanation_prompt(explanation_type, cards, context),
+            priority=priority,
+            temperature=0.3,
+            max_output_tokens=min(8192, 800 * len(cards)),
+            response_schema=BATCH_EXPLANATION_SCHEMA,
+            **document_context_options(
+                document_id, build_batch_explanation_prompt(explanation_type, cards, context or DOCUMENT_CONTEXT_NOTE)
+            )
+        )
+        try:
+            items = extract_json_array(text or "")
+        except ValueError:
+            JSON_PARSE_FAILURES.inc(kind="batch_explanation")
+            raise
+        for item in items:
+            if isinstance(item, dict) and str(item.get("explanation", "")).strip():
+                explanations[item.get("card")] = str(item["explanation"]).strip()
+    except Exception as e:
+        print(f"Batch {explanation_type} explanation failed for {len(cards)} cards: {e}")
+    
+    results = [None] * len(cards)
+    missing = []
+    for i, card in enumerate(cards):
+        explanation = explanations.get(i + 1)
+        if explanation:
+            results[i] = {
+                "success": True,
+                "explanation": explanation,
+                "type": explanation_type,
+                "original_question": card["question"],
+                "original_answer": card["current_answer"]
+            }
+            await store_explanation(explanation_type, card["question"], card["current_answer"], context, results[i],
+                                    document_id)
+        else:
+            missing.append(i)
+    
+    if missing:
+        print(f"Falling back to single {explanation_type} explanations for {len(missing)} of {len(cards)} cards")
+        fallbacks = await asyncio.gather(*[
+            get_single_explanation(explanation_type, cards[i]["question"], cards[i]["current_answer"], context, priority,
+                                   document_id)
+            for i in missing
+        ])
+        for i, result in zip(missing, fallbacks):
+            result["type"] = explanation_type
+            results[i] = result
+    
+    return results
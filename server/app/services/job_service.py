@@ -0,0 +1,321 @@
+# app/services/job_service.py
+
+import os
+import uuid
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from app.db import get_job_collection
+from app.services.gemini_service import stream_flashcards_from_file
+from app.services.explanation_precompute import schedule_explanation_precompute
+
+load_dotenv()
+
+# Generation jobs are queued here and run by worker tasks, independent of the request that submitted them
+JOB_STORE_BACKEND = os.getenv("JOB_STORE_BACKEND", "mongo")  # "mongo" or "memory"
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", str(7 * 24 * 3600)))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1"))
+# The process holding a queued or running job renews its lease; a job whose lease lapses was lost with its process
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "5"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "30"))
+JOB_WATCH_MAX_SECONDS = float(os.getenv("JOB_WATCH_MAX_SECONDS", "3600"))
+
+TERMINAL_STATUSES = ("done", "failed")
+ACTIVE_STATUSES = ("queued", "running")
+LOST_JOB_ERROR = "The server processing this job stopped"
+
+class JobQueueFullError(Exception):
+    """Raised when the generation job queue has no room for another job"""
+
+class MemoryJobStore:
+    """Job state in process memory, for development and tests"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    async def create(self, job: dict) -> None:
+        with self._lock:
+            self._jobs[job["_id"]] = dict(job, flashcards=list(job["flashcards"]))
+
+    async def update(self, job_id: str, fields: dict, new_flashcards: list = None) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            if new_flashcards:
+                job["flashcards"].extend(new_flashcards)
+
+    async def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job, flashcards=list(job["flashcards"])) if job else None
+
+    async def renew_leases(self, job_ids: list, now: datetime) -> None:
+        with self._lock:
+            for job_id in job_ids:
+                if job_id in self._jobs:
+                    self._jobs[job_id]["heartbeat_at"] = now
+
+    async def fail_stale(self, cutoff: datetime, error: str, job_id: str = None) -> int:
+        with self._lock:
+            if job_id is None:
+                jobs = list(self._jobs.values())
+            else:
+                jobs = [self._jobs[job_id]] if job_id in self._jobs else []
+            stale = [job for job in jobs if job["status"] in ACTIVE_STATUSES and lease_time(job) < cutoff]
+            for job in stale:
+                job.update(status="failed", error=error, updated_at=datetime.utcnow())
+            return len(stale)
+
+class MongoJobStore:
+    """Job state in MongoDB, so any API process can report on any job; expires via a TTL index"""
+
+    def __init__(self, ttl_seconds: int = JOB_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._index_ready = False
+
+    def _collection(self):
+        collection = get_job_collection()
+        if not self._index_ready:
+            collection.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+            self._index_ready = True
+        return collection
+
+    # pymongo blocks, so every call runs in a thread instead of on the event loop
+    async def create(self, job: dict) -> None:
+        await asyncio.to_thread(lambda: self._collection().insert_one(job))
+
+    async def update(self, job_id: str, fields: dict, new_flashcards: list = None) -> None:
+        changes = {"$set": fields}
+        if new_flashcards:
+            changes["$push"] = {"flashcards": {"$each": new_flashcards}}
+        await asyncio.to_thread(lambda: self._collection().update_one({"_id": job_id}, changes))
+
+    async def get(self, job_id: str):
+        return await asyncio.to_thread(lambda: self._collection().find_one({"_id": job_id}))
+
+    async def renew_leases(self, job_ids: list, now: datetime) -> None:
+        await asyncio.to_thread(
+            lambda: self._collection().update_many({"_id": {"$in": job_ids}}, {"$set": {"heartbeat_at": now}})
+        )
+
+    async def fail_stale(self, cutoff: datetime, error: str, job_id: str = None) -> int:
+        query = {
+            "status": {"$in": list(ACTIVE_STATUSES)},
+            # Jobs recorded before leases existed fall back to updated_at, as in lease_time
+            "$or": [
+                {"heartbeat_at": {"$lt": cutoff}},
+                {"heartbeat_at": {"$exists": False}, "updated_at": {"$lt": cutoff}}
+            ]
+        }
+        if job_id:
+            query["_id"] = job_id
+        changes = {"$set": {"status": "failed", "error": error, "updated_at": datetime.utcnow()}}
+        result = await asyncio.to_thread(lambda: self._collection().update_many(query, changes))
+        return result.modified_count
+
+def create_job_store(backend: str = JOB_STORE_BACKEND):
+    """Create the job store for the configured backend"""
+    if backend == "mongo":
+        return MongoJobStore()
+    if backend == "memory":
+        return MemoryJobStore()
+    raise ValueError(f"Unknown job store backend: {backend}")
+
+job_store = create_job_store()
+
+_job_queue = None
+_workers = []
+_held_jobs = set()      # Queued or running in this process; their leases are renewed by job_heartbeat
+
+def lease_time(job: dict) -> datetime:
+    """When the job's lease was last renewed"""
+    return job.get("heartbeat_at") or job["updated_at"]
+
+def lease_cutoff() -> datetime:
+    """Active jobs whose lease is older than this belonged to a process that is gone"""
+    return datetime.utcnow() - timedelta(seconds=JOB_LEASE_SECONDS)
+
+def get_job_queue() -> asyncio.Queue:
+    """Create the job queue on first use, inside the running event loop"""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = asyncio.Queue(maxsize=JOB_QUEUE_SIZE)
+    return _job_queue
+
+async def submit_job(upload, filename: str) -> dict:
+    """Record a queued job for a spooled upload and hand it to the workers; the worker removes the file"""
+    queue = get_job_queue()
+    if queue.full():
+        raise JobQueueFullError("Too many flashcard jobs are queued, please retry shortly")
+
+    now = datetime.utcnow()
+    job = {
+        "_id": uuid.uuid4().hex,
+        "status": "queued",
+        "filename": filename,
+        "chunks_done": 0,
+        "chunks_total": None,
+        "count": 0,
+        "chunk_cache_hits": 0,
+        "cached": False,
+        "document_id": upload.sha256,
+        "flashcards": [],
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+        "heartbeat_at": now
+    }
+    await job_store.create(job)
+    queue.put_nowait((job["_id"], upload, filename))
+    _held_jobs.add(job["_id"])
+    return job
+
+async def get_job(job_id: str):
+    """The job, first marking it failed if its lease has lapsed"""
+    job = await job_store.get(job_id)
+    if job is not None and job["status"] in ACTIVE_STATUSES and lease_time(job) < lease_cutoff():
+        if await job_store.fail_stale(lease_cutoff(), LOST_JOB_ERROR, job_id):
+            print(f"Flashcard job {job_id} lost its lease; marked failed")
+        job = await job_store.get(job_id)
+    return job
+
+async def run_job(job_id: str, upload, filename: str) -> None:
+    """Generate a deck for one job, persisting progress and partial results as chunks finish"""
+    flashcards = []
+    try:
+        await job_store.update(job_id, {"status": "running", "updated_at": datetime.utcnow()})
+
+        async for event in stream_flashcards_from_file(upload.path, filename, upload.sha256):
+            fields = {"updated_at": datetime.utcnow()}
+            new_flashcards = None
+
+            if event["type"] == "start":
+                fields["cached"] = event["cached"]
+            elif event["type"] == "progress":
+                fields["chunks_done"] = event["chunks_done"]
+                fields["chunks_total"] = event["chunks_total"]
+            elif event["type"] == "flashcards":
+                new_flashcards = event["flashcards"]
+                flashcards.extend(new_flashcards)
+                fields["count"] = len(flashcards)
+            elif event["type"] == "done":
+                fields["status"] = "done"
+                fields["count"] = event["count"]
+                fields["chunk_cache_hits"] = event["chunk_cache_hits"]
+
+            await job_store.update(job_id, fields, new_flashcards)
+
+        schedule_explanation_precompute(flashcards, upload.sha256)
+
+    except asyncio.CancelledError:
+        await job_store.update(job_id, {"status": "failed", "error": "Server shut down", "updated_at": datetime.utcnow()})
+        raise
+    except Exception as e:
+        print(f"Error in flashcard job {job_id}: {e}")
+        await job_store.update(job_id, {"status": "failed", "error": str(e), "updated_at": datetime.utcnow()})
+    finally:
+        _held_jobs.discard(job_id)
+        upload.cleanup()
+
+async def job_heartbeat() -> None:
+    """Fail jobs abandoned by a stopped process, then keep renewing the leases of this process's jobs"""
+    try:
+        failed = await job_store.fail_stale(lease_cutoff(), LOST_JOB_ERROR)
+        if failed:
+            print(f"Marked {failed} flashcard jobs from a stopped process as failed")
+    except Exception as e:
+        print(f"Failed to check for abandoned flashcard jobs: {e}")
+    
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+        if not _held_jobs:
+            continue
+        try:
+            await job_store.renew_leases(list(_held_jobs), datetime.utcnow())
+        except Exception as e:
+            print(f"Failed to renew flashcard job leases: {e}")
+
+async def job_worker(worker_index: int) -> None:
+    queue = get_job_queue()
+    while True:
+        job_id, upload, filename = await queue.get()
+        try:
+            print(f"Job worker {worker_index} running job {job_id} ({filename})")
+            await run_job(job_id, upload, filename)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # run_job records its own failures; this only guards the worker loop
+            print(f"Job worker {worker_index} failed to record job {job_id}: {e}")
+        finally:
+            queue.task_done()
+
+def start_job_workers() -> None:
+    """Start the generation worker tasks and the lease heartbeat; called from the app lifespan"""
+    for worker_index in range(JOB_WORKERS):
+        _workers.append(asyncio.create_task(job_worker(worker_index)))
+    _workers.append(asyncio.create_task(job_heartbeat()))
+
+async def stop_job_workers() -> None:
+    """Cancel the workers; jobs still running or queued are marked failed"""
+    for worker in _workers:
+        worker.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+    queue = get_job_queue()
+    while not queue.empty():
+        job_id, upload, _ = queue.get_nowait()
+        _held_jobs.discard(job_id)
+        upload.cleanup()
+        await job_store.update(job_id, {"status": "failed", "error": "Server shut down", "updated_at": datetime.utcnow()})
+
+def job_summary(job: dict) -> dict:
+    """Public view of a job document"""
+    return {
+        "job_id": job["_id"],
+        "status": job["status"],
+        "filename": job["filename"],
+        "chunks_done": job["chunks_done"],
+        "chunks_total": job["chunks_total"],
+        "count": job["count"],
+        "chunk_cache_hits": job.get("chunk_cache_hits", 0),
+        "cached": job["cached"],
+        "document_id": job.get("document_id"),
+        "error": job["error"],
+        "created_at": job["created_at"].isoformat(),
+        "updated_at": job["updated_at"].isoformat()
+    }
+
+async def watch_job(job_id: str):
+    """Yield a job summary whenever the job changes, until it finishes or JOB_WATCH_MAX_SECONDS pass
+
+    Polls the store, so it follows jobs run by any process sharing the database.
+    A job whose process stopped is reported as failed once its lease lapses.
+    New flashcards since the previous update are included under "flashcards".
+    """
+    loop = asyncio.get_running_loop()
+    give_up_at = loop.time() + JOB_WATCH_MAX_SECONDS
+    last_updated = None
+    sent_flashcards = 0
+    while True:
+        job = await get_job(job_id)
+        if job is None:
+            return
+
+        if job["updated_at"] != last_updated:
+            last_updated = job["updated_at"]
+            summary = job_summary(job)
+            summary["flashcards"] = job["flashcards"][sent_flashcards:]
+            sent_flashcards = len(job["flashcards"])
+            yield summary
+
+        if job["status"] in TERMINAL_STATUSES or loop.time() >= give_up_at:
+            return
+        await asyncio.sleep(JOB_POLL_INTERVAL_SECONDS)
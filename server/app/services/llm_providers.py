@@ -0,0 +1,469 @@
+# app/services/llm_providers.py
+
+import os
+import time
+import random
+import asyncio
+from datetime import timedelta
+from dotenv import load_dotenv
+from app.services.rate_limiter import PRIORITY_INTERACTIVE
+from app.services.metrics import (
+    stage,
+    MODEL_CALLS,
+    MODEL_CALLS_IN_FLIGHT,
+    MODEL_CALLS_WAITING,
+    MODEL_CONCURRENCY_LIMIT,
+    FAILOVERS,
+    CONTEXT_CACHE,
+    CACHED_INPUT_TOKENS
+)
+from app.utils.chunking_utils import estimate_tokens
+
+load_dotenv()
+
+# Routing: each call goes to the provider with the lowest expected completion time
+ROUTER_DEFAULT_LATENCY_SECONDS = 5.0     # Assumed until any provider has served calls
+ROUTER_LATENCY_SMOOTHING = 0.2           # Weight of the newest sample in the moving averages
+ROUTER_ERROR_PENALTY = 4.0               # A 25% error rate doubles a provider's expected time
+ROUTER_EXPLORE_PROBABILITY = float(os.getenv("ROUTER_EXPLORE_PROBABILITY", "0.05"))
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("PROVIDER_COOLDOWN_SECONDS", "30"))
+
+# Gemini context caching: contexts below the model's minimum cache size are always sent inline
+GEMINI_CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE", "true").lower() in ("1", "true", "yes")
+GEMINI_CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", "32768"))
+CONTEXT_CACHE_MIN_REMAINING_SECONDS = 60  # Too close to expiry to be worth uploading
+
+class Provider:
+    """A text generation backend behind its own limiter, with latency and error statistics
+
+    Subclasses implement _generate and _stream. Options are provider-neutral:
+    temperature, max_output_tokens, top_p, top_k and response_schema (a JSON
+    schema the reply must follow); Gemini also honours safety_settings.
+    Options a provider does not support are ignored.
+
+    A call may pass a context_cache.PromptContext as cached_context together with
+    cached_prompt, the part of the prompt that follows it. A provider holding the
+    context in a server-side cache sends only cached_prompt; the others send the
+    context inline before cached_prompt.
+    """
+
+    name = "provider"
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.latency = None
+        self.error_rate = 0.0
+        self.calls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        MODEL_CALLS_IN_FLIGHT.track(lambda: limiter.in_flight, provider=self.name)
+        MODEL_CALLS_WAITING.track(lambda: limiter.waiting, provider=self.name)
+        MODEL_CONCURRENCY_LIMIT.track(lambda: limiter.concurrency, provider=self.name)
+
+    @property
+    def model_name(self) -> str:
+        raise NotImplementedError
+
+    def available(self) -> bool:
+        """False while the circuit is open after repeated failures"""
+        return time.monotonic() >= self.open_until
+
+    def expected_seconds(self, default_latency: float = ROUTER_DEFAULT_LATENCY_SECONDS) -> float:
+        """Smoothed latency, inflated by the error rate and by the queue in front of the limiter"""
+        latency = self.latency if self.latency is not None else default_latency
+        load = (self.limiter.in_flight + self.limiter.waiting + 1) / self.limiter.concurrency
+        return latency * (1 + ROUTER_ERROR_PENALTY * self.error_rate) * max(1.0, load)
+
+    def record(self, seconds: float, failed: bool) -> None:
+        self.calls += 1
+        MODEL_CALLS.inc(provider=self.name, outcome="error" if failed else "ok")
+        self.error_rate += ROUTER_LATENCY_SMOOTHING * ((1.0 if failed else 0.0) - self.error_rate)
+        if failed:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD:
+                self.open_until = time.monotonic() + CIRCUIT_COOLDOWN_SECONDS
+                print(f"{self.name} failed {self.consecutive_failures} times in a row; "
+                      f"routing around it for {CIRCUIT_COOLDOWN_SECONDS:g}s")
+            return
+        self.consecutive_failures = 0
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency += ROUTER_LATENCY_SMOOTHING * (seconds - self.latency)
+
+    async def generate(self, prompt: str, priority: int = PRIORITY_INTERACTIVE, timeout: float = None,
+                       latency_tracker=None, cached_context=None, cached_prompt: str = None, on_text=None,
+                       **options) -> str:
+        """Generate text under this provider's limiter; timeout covers the call, not the queue
+        
+        latency_tracker records the time from the call to the reply, including the queue,
+        since that is what a caller waiting on the reply (or a hedge timer) sees. With
+        on_text, the reply is streamed and on_text receives each fragment as it arrives.
+        """
+        prompt, cached = await self.resolve_context(prompt, cached_context, cached_prompt)
+        tokens = estimate_tokens(prompt)
+        queued_at = time.monotonic()
+        async with self.limiter.slot(priority, tokens) as slot:
+            start_time = time.monotonic()
+            try:
+                with stage("model_call"):
+                    if on_text is None:
+                        call = self._generate(prompt, cached, **options)
+                    else:
+                        call = self._collect_stream(prompt, cached, on_text, **options)
+                    text, used_tokens = await asyncio.wait_for(call, timeout)
+            except Exception:
+                self.record(time.monotonic() - start_time, failed=True)
+                raise
+            elapsed = time.monotonic() - start_time
+            self.record(elapsed, failed=False)
+            if latency_tracker is not None:
+                latency_tracker.record(time.monotonic() - queued_at)
+            slot.record_tokens(used_tokens or tokens)
+            return text
+
+    async def stream(self, prompt: str, priority: int = PRIORITY_INTERACTIVE, cached_context=None,
+                     cached_prompt: str = None, **options):
+        """Yield text fragments as they are generated, holding a limiter slot until the end"""
+        prompt, cached = await self.resolve_context(prompt, cached_context, cached_prompt)
+        async with self.limiter.slot(priority, estimate_tokens(prompt)):
+            start_time = time.monotonic()
+            try:
+                async for text in self._stream(prompt, cached, **options):
+                    yield text
+            except Exception:
+                self.record(time.monotonic() - start_time, failed=True)
+                raise
+            self.record(time.monotonic() - start_time, failed=False)
+
+    async def _collect_stream(self, prompt: str, cached, on_text, **options) -> tuple:
+        """Return (text, 0) for a streamed reply, passing each fragment to on_text"""
+        fragments = []
+        async for text in self._stream(prompt, cached, **options):
+            on_text(text)
+            fragments.append(text)
+        return "".join(fragments), 0
+
+    async def resolve_context(self, prompt: str, cached_context, cached_prompt: str) -> tuple:
+        """Return (prompt to send, cache handle or None) for a call that may reference a registered context"""
+        if cached_context is None or not cached_prompt:
+            return prompt, None
+        cached = await self.cache_context(cached_context)
+        if cached is not None:
+            return cached_prompt, cached
+        return cached_context.inline_prompt(cached_prompt), None
+
+    async def cache_context(self, context):
+        """Return a handle for context in this provider's server-side cache, or None to send it inline"""
+        return None
+
+    async def release_context(self, context) -> None:
+        """Delete this provider's server-side copy of context, if it made one"""
+
+    async def warm_up(self) -> None:
+        """Create the client and open a connection without generating anything"""
+
+    async def close(self) -> None:
+        """Release the client's connections on shutdown"""
+
+    async def _generate(self, prompt: str, cached=None, **options) -> tuple:
+        """Return (text, tokens used or 0); cached is the handle from cache_context, if any"""
+        raise NotImplementedError
+
+    async def _stream(self, prompt: str, cached=None, **options):
+        raise NotImplementedError
+        yield
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model_name,
+            "available": self.available(),
+            "latency_seconds": round(self.latency, 3) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "calls": self.calls,
+            "failures": self.failures,
+            "limiter": self.limiter.stats()
+        }
+
+class GeminiProvider(Provider):
+    """google.generativeai GenerativeModel, created by model_factory on first use in each process"""
+
+    name = "gemini"
+
+    def __init__(self, model_factory, limiter):
+        super().__init__(limiter)
+        self.model_factory = model_factory
+        self._model = None
+        self._model_pid = None
+
+    @property
+    def model(self):
+        # A model created before a fork holds the parent's gRPC channels
+        if self._model is None or self._model_pid != os.getpid():
+            self._model = self.model_factory()
+            self._model_pid = os.getpid()
+        return self._model
+
+    @model.setter
+    def model(self, model) -> None:
+        self._model = model
+        self._model_pid = os.getpid()
+
+    @property
+    def model_name(self) -> str:
+        return self.model.model_name
+
+    async def warm_up(self) -> None:
+        # Token counting is free and opens the same channel generation uses
+        await self.model.count_tokens_async("warm-up")
+
+    def _request_options(self, options: dict) -> dict:
+        import google.generativeai as genai
+
+        config = {key: options[key] for key in ("temperature", "max_output_tokens", "top_p", "top_k")
+                  if options.get(key) is not None}
+        if options.get("response_schema"):
+            config["response_mime_type"] = "application/json"
+            config["response_schema"] = options["response_schema"]
+        kwargs = {}
+        if config:
+            kwargs["generation_config"] = genai.types.GenerationConfig(**config)
+        if options.get("safety_settings"):
+            kwargs["safety_settings"] = options["safety_settings"]
+        return kwargs
+
+    async def cache_context(self, context):
+        if not GEMINI_CONTEXT_CACHE or context.tokens < GEMINI_CONTEXT_CACHE_MIN_TOKENS:
+            return None
+        if context.remaining_seconds() < CONTEXT_CACHE_MIN_REMAINING_SECONDS:
+            return None
+        # Concurrent calls for a new context wait for one upload instead of each making their own
+        async with context.lock:
+            if self.name in context.handles:
+                handle = context.handles[self.name]
+                if handle is not None:
+                    CONTEXT_CACHE.inc(provider=self.name, result="reused")
+                return handle
+            try:
+                with stage("context_cache"):
+                    handle = await self._create_cache(context)
+                CONTEXT_CACHE.inc(provider=self.name, result="created")
+            except Exception as e:
+                handle = None
+                CONTEXT_CACHE.inc(provider=self.name, result="failed")
+                print(f"Gemini context cache unavailable for {context.key[:12]}, sending it inline: {e}")
+            context.handles[self.name] = handle
+            return handle
+
+    async def _create_cache(self, context) -> dict:
+        """Upload the context with cachedContents.create; it expires together with the registered context"""
+        import google.generativeai as genai
+
+        cached_content = await asyncio.to_thread(
+            genai.caching.CachedContent.create,
+            model=self.model.model_name,
+            display_name=f"classmate-{context.key[:16]}",
+            system_instruction=context.instructions,
+            contents=[context.text] if context.text else None,
+            ttl=timedelta(seconds=int(context.remaining_seconds()))
+        )
+        return {"cached_content": cached_content, "model": genai.GenerativeModel.from_cached_content(cached_content)}
+
+    async def release_context(self, context) -> None:
+        handle = context.handles.pop(self.name, None)
+        if handle is None:
+            return
+        try:
+            await asyncio.to_thread(handle["cached_content"].delete)
+        except Exception as e:
+            print(f"Failed to delete Gemini context cache for {context.key[:12]}: {e}")
+
+    async def _generate(self, prompt: str, cached=None, **options) -> tuple:
+        model = cached["model"] if cached else self.model
+        response = await model.generate_content_async(prompt, **self._request_options(options))
+        usage = getattr(response, "usage_metadata", None)
+        cached_tokens = getattr(usage, "cached_content_token_count", 0)
+        if cached_tokens:
+            CACHED_INPUT_TOKENS.inc(cached_tokens, provider=self.name)
+        return response.text, getattr(usage, "total_token_count", 0)
+
+    async def _stream(self, prompt: str, cached=None, **options):
+        model = cached["model"] if cached else self.model
+        response = await model.generate_content_async(prompt, stream=True, **self._request_options(options))
+        async for chunk in response:
+            # Chunks without text parts (e.g. a trailing finish marker) raise on .text
+            try:
+                text = chunk.text
+            except ValueError:
+                continue
+            if text:
+                yield text
+
+class CohereProvider(Provider):
+    """cohere.AsyncClient chat endpoint; client_factory creates the client on first use in each process"""
+
+    name = "cohere"
+
+    def __init__(self, client_factory, model: str, limiter):
+        super().__init__(limiter)
+        self.client_factory = client_factory
+        self.model = model
+        self._client = None
+        self._client_pid = None
+
+    @property
+    def client(self):
+        # The client's connection pool must not be shared with a forked worker
+        if self._client is None or self._client_pid != os.getpid():
+            self._client = self.client_factory()
+            self._client_pid = os.getpid()
+        return self._client
+
+    @client.setter
+    def client(self, client) -> None:
+        self._client = client
+        self._client_pid = os.getpid()
+
+    @property
+    def model_name(self) -> str:
+        return self.model
+
+    async def warm_up(self) -> None:
+        # Listing one model is free and opens the connection pool chat calls use
+        await self.client.models.list(page_size=1)
+
+    async def close(self) -> None:
+        if self._client is not None and self._client_pid == os.getpid():
+            await self._client._client_wrapper.httpx_client.httpx_client.aclose()
+        self._client = None
+
+    def _request_options(self, options: dict) -> dict:
+        mapping = {"temperature": "temperature", "max_output_tokens": "max_tokens", "top_p": "p", "top_k": "k"}
+        kwargs = {mapping[key]: options[key] for key in mapping if options.get(key) is not None}
+        schema = options.get("response_schema")
+        if schema:
+            # Cohere's JSON mode needs an object at the top level, so arrays are wrapped
+            if schema.get("type") == "array":
+                schema = {"type": "object", "properties": {"items": schema}, "required": ["items"]}
+            kwargs["response_format"] = {"type": "json_object", "schema": schema}
+        return kwargs
+
+    async def _generate(self, prompt: str, cached=None, **options) -> tuple:
+        response = await self.client.chat(message=prompt, model=self.model, **self._request_options(options))
+        units = getattr(getattr(response, "meta", None), "billed_units", None)
+        used_tokens = (getattr(units, "input_tokens", 0) or 0) + (getattr(units, "output_tokens", 0) or 0)
+        return response.text, int(used_tokens)
+
+    async def _stream(self, prompt: str, cached=None, **options):
+        async for event in self.client.chat_stream(message=prompt, model=self.model, **self._request_options(options)):
+            if event.event_type == "text-generation" and event.text:
+                yield event.text
+
+class NoProviderAvailableError(Exception):
+    """Raised when every provider failed a call"""
+
+class ProviderRouter:
+    """Sends each call to the provider expected to finish it first, failing over on errors
+
+    Because queue length counts towards the expected time, a document's chunks
+    spill over to the next provider once the fastest one's limiter is full.
+    """
+
+    def __init__(self, providers: list):
+        self.providers = providers
+
+    @property
+    def model_name(self) -> str:
+        return "+".join(provider.model_name for provider in self.providers)
+
+    def busy(self) -> bool:
+        """True when every available provider would queue a new call"""
+        return all(provider.limiter.busy() for provider in self.providers if provider.available())
+
+    def ranked(self) -> list:
+        """Providers in the order to try them: closed circuits last, best expected time first"""
+        # Unmeasured providers are assumed as fast as the best measured one, so they get tried
+        # as soon as it is saturated
+        measured = [provider.latency for provider in self.providers if provider.latency is not None]
+        default_latency = min(measured) if measured else ROUTER_DEFAULT_LATENCY_SECONDS
+        ranked = sorted(
+            self.providers,
+            key=lambda provider: (not provider.available(), provider.expected_seconds(default_latency))
+        )
+        # Occasionally lead with the runner-up so stale statistics get refreshed
+        if len(ranked) > 1 and ranked[1].available() and random.random() < ROUTER_EXPLORE_PROBABILITY:
+            ranked[0], ranked[1] = ranked[1], ranked[0]
+        return ranked
+
+    async def generate(self, prompt: str, on_text=None, **kwargs) -> str:
+        """Generate with the best provider; with on_text, fails over only if no text was passed on yet"""
+        error = None
+        started = False
+
+        def forward(text):
+            nonlocal started
+            started = True
+            on_text(text)
+
+        for provider in self.ranked():
+            try:
+                return await provider.generate(prompt, on_text=forward if on_text is not None else None, **kwargs)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if started:
+                    raise
+                error = e
+                if len(self.providers) > 1:
+                    FAILOVERS.inc(provider=provider.name)
+                    print(f"{provider.name} call failed ({e}); failing over")
+        raise error or NoProviderAvailableError("No generation provider configured")
+
+    async def stream(self, prompt: str, **kwargs):
+        """Stream from the best provider; fails over only if nothing was sent yet"""
+        error = None
+        for provider in self.ranked():
+            started = False
+            try:
+                async for text in provider.stream(prompt, **kwargs):
+                    started = True
+                    yield text
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if started:
+                    raise
+                error = e
+                if len(self.providers) > 1:
+                    FAILOVERS.inc(provider=provider.name)
+                    print(f"{provider.name} stream failed ({e}); failing over")
+        raise error or NoProviderAvailableError("No generation provider configured")
+
+    async def warm_up(self, timeout: float) -> None:
+        """Warm every provider concurrently; failures are reported, not raised, so startup continues"""
+        results = await asyncio.gather(
+            *[asyncio.wait_for(provider.warm_up(), timeout) for provider in self.providers],
+            return_exceptions=True
+        )
+        for provider, result in zip(self.providers, results):
+            if isinstance(result, BaseException):
+                print(f"{provider.name} warm-up failed: {result!r}")
+
+    async def close(self) -> None:
+        for provider in self.providers:
+            try:
+                await provider.close()
+            except Exception as e:
+                print(f"Failed to close {provider.name} client: {e}")
+
+    async def release_context(self, context) -> None:
+        """Drop every provider's server-side copy of context"""
+        for provider in self.providers:
+            await provider.release_context(context)
+
+    def stats(self) -> dict:
+        return {provider.name: provider.stats() for provider in self.providers}
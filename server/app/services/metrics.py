@@ -0,0 +1,236 @@
+# app/services/metrics.py
+
+import os
+import time
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Requests slower than this keep their trace spans for /metrics/slow-requests (0 disables tracing)
+TRACE_SLOW_REQUEST_SECONDS = float(os.getenv("TRACE_SLOW_REQUEST_SECONDS", "0"))
+SLOW_TRACE_HISTORY = int(os.getenv("SLOW_TRACE_HISTORY", "50"))
+
+METRIC_PREFIX = "classmate_"
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_registry = []
+
+def format_labels(label_names: tuple, label_values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric:
+    """A named family of values keyed by label values, rendered in the Prometheus text format"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labels: tuple = ()):
+        self.name = METRIC_PREFIX + name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self) -> list:
+        """(suffix, labels, value) lines for the exposition"""
+        return [("", format_labels(self.label_names, key), value) for key, value in sorted(self._values.items())]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{self.name}{suffix}{labels} {value:g}" for suffix, labels, value in self.samples()]
+        return "\n".join(lines)
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    """A value that goes up and down; track() reads it from a callable at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, labels: tuple = ()):
+        super().__init__(name, description, labels)
+        self._readers = {}
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def track(self, reader, **labels) -> None:
+        self._readers[self._key(labels)] = reader
+
+    def samples(self) -> list:
+        for key, reader in self._readers.items():
+            self._values[key] = reader()
+        return super().samples()
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        series = self._values.get(key)
+        if series is None:
+            series = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series["buckets"][i] += 1
+        series["sum"] += value
+        series["count"] += 1
+
+    def samples(self) -> list:
+        samples = []
+        for key, series in sorted(self._values.items()):
+            for bound, count in zip(self.buckets, series["buckets"]):
+                samples.append(("_bucket", format_labels(self.label_names, key, f'le="{bound:g}"'), count))
+            samples.append(("_bucket", format_labels(self.label_names, key, 'le="+Inf"'), series["count"]))
+            samples.append(("_sum", format_labels(self.label_names, key), series["sum"]))
+            samples.append(("_count", format_labels(self.label_names, key), series["count"]))
+        return samples
+
+def render_metrics() -> str:
+    """Every registered metric in the Prometheus text exposition format"""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+# Pipeline stages, so a slow request can be attributed to parsing, chunking, queueing, the model or post-processing
+STAGE_SECONDS = Histogram("stage_seconds", "Time spent in each pipeline stage", ("stage",))
+HTTP_REQUEST_SECONDS = Histogram("http_request_seconds", "HTTP request duration including streamed bodies",
+                                 ("method", "route", "status"))
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being handled")
+
+MODEL_CALLS = Counter("model_calls_total", "Model calls by provider and outcome", ("provider", "outcome"))
+MODEL_CALLS_IN_FLIGHT = Gauge("model_calls_in_flight", "Model calls holding a limiter slot", ("provider",))
+MODEL_CALLS_WAITING = Gauge("model_calls_waiting", "Model calls queued for a limiter slot", ("provider",))
+MODEL_CONCURRENCY_LIMIT = Gauge("model_concurrency_limit", "Current adaptive concurrency limit", ("provider",))
+FAILOVERS = Counter("provider_failovers_total", "Calls moved to another provider after a failure", ("provider",))
+RETRIES = Counter("retries_total", "Attempts repeated after a retryable failure")
+HEDGED_REQUESTS = Counter("hedged_requests_total", "Duplicate requests sent for slow chunks")
+CONTEXT_CACHE = Counter("context_cache_total", "Provider-side context caches created, reused or unavailable",
+                        ("provider", "result"))
+CACHED_INPUT_TOKENS = Counter("cached_input_tokens_total", "Prompt tokens served from a provider-side context cache",
+                              ("provider",))
+
+JSON_PARSE_FAILURES = Counter("json_parse_failures_total", "Model replies without a usable JSON array", ("kind",))
+INVALID_CARDS = Counter("invalid_cards_total", "Cards dropped by validation")
+TRUNCATED_RESPONSES = Counter("truncated_responses_total", "Replies cut off inside the JSON array; complete items were kept")
+FALLBACK_FLASHCARDS = Counter("fallback_flashcard_sets_total", "Times template flashcards replaced model output")
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Result cache lookups", ("cache", "result"))
+CHUNKS_PLANNED = Counter("chunks_planned_total", "Chunk requests planned for flashcard generation")
+DEADLINE_ABANDONED_CHUNKS = Counter("deadline_abandoned_chunks_total", "Chunks still running at the document deadline")
+PARSE_FILES_IN_PROGRESS = Gauge("parse_files_in_progress", "Uploads being parsed by the worker pool")
+
+class Trace:
+    """Spans recorded while handling one request"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.spans = []
+        self.attributes = {}
+
+    def add_span(self, name: str, start: float, duration: float) -> None:
+        self.spans.append({"name": name, "offset_ms": round((start - self.start) * 1000, 1),
+                           "duration_ms": round(duration * 1000, 1)})
+
+    def to_dict(self, duration: float, status: int) -> dict:
+        return {"request": self.name, "status": status, "duration_ms": round(duration * 1000, 1),
+                "attributes": self.attributes, "spans": sorted(self.spans, key=lambda span: span["offset_ms"])}
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+slow_traces = deque(maxlen=SLOW_TRACE_HISTORY)
+
+@contextmanager
+def stage(name: str):
+    """Time a pipeline stage into STAGE_SECONDS and, when tracing, a span on the current request"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_SECONDS.observe(duration, stage=name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(name, start, duration)
+
+def annotate(**attributes) -> None:
+    """Attach values such as cache hit counts to the current request's trace, when tracing"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attributes.update(attributes)
+
+def detach_trace() -> None:
+    """Stop attributing spans to the current request, for work that outlives it"""
+    _current_trace.set(None)
+
+def route_template(scope) -> str:
+    """The matched route's path template, including its router prefix, so ids stay out of the labels"""
+    route = scope.get("route")
+    if route is None or not hasattr(route, "path_regex"):
+        return "unmatched"
+    # Included routers only record the route's own path; recover the prefix from the request path
+    path = scope["path"]
+    for i, char in enumerate(path):
+        if char == "/" and route.path_regex.match(path[i:]):
+            return path[:i] + route.path
+    return route.path
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request, including streamed response bodies
+
+    With TRACE_SLOW_REQUEST_SECONDS set, stages run on behalf of a request are
+    recorded as spans and kept for requests slower than the threshold.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        trace = Trace(f"{scope['method']} {scope['path']}") if TRACE_SLOW_REQUEST_SECONDS else None
+        token = _current_trace.set(trace)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - start
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            _current_trace.reset(token)
+            HTTP_REQUEST_SECONDS.observe(duration, method=scope["method"], route=route_template(scope), status=status)
+            if trace is not None and duration >= TRACE_SLOW_REQUEST_SECONDS:
+                slow_traces.append(trace.to_dict(duration, status))
+                print(f"Slow request {trace.name} took {duration:.2f}s "
+                      f"({len(trace.spans)} spans, see /metrics/slow-requests)")
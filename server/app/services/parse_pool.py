@@ -0,0 +1,209 @@
+# app/services/parse_pool.py
+
+import os
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+from app.services.metrics import stage, PARSE_FILES_IN_PROGRESS
+
+load_dotenv()
+
+# Parsing is CPU-bound, so it runs in worker processes instead of on the event loop
+PARSE_POOL_WORKERS = int(os.getenv("PARSE_POOL_WORKERS", str(os.cpu_count() or 2)))
+PARSE_QUEUE_SIZE = int(os.getenv("PARSE_QUEUE_SIZE", str(PARSE_POOL_WORKERS * 4)))
+PARSE_TIMEOUT_SECONDS = float(os.getenv("PARSE_TIMEOUT_SECONDS", "120"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+
+# Workers start from a forkserver with the parsers preloaded rather than as forks of the API
+# process, so they never inherit its model, Cohere or MongoDB connections
+PARSE_POOL_START_METHOD = os.getenv(
+    "PARSE_POOL_START_METHOD",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+PARSER_MODULES = ["app.services.file_parser"]
+
+class ParseQueueFullError(Exception):
+    """Raised when too many files are already queued for parsing"""
+
+_executor = None
+_files_in_progress = 0
+_slot_lock = threading.Lock()
+_open_parses = {}       # executor -> files that submitted work to it and are still reading results
+_retired = set()        # executors replaced after a timeout, terminated once no open file uses them
+PARSE_FILES_IN_PROGRESS.track(lambda: _files_in_progress)
+
+def get_parse_executor() -> ProcessPoolExecutor:
+    """Create the shared worker pool on first use, and again if a worker died and broke it"""
+    global _executor
+    # _broken is private to ProcessPoolExecutor; without it a broken pool is only replaced on a timeout
+    if _executor is None or getattr(_executor, "_broken", False):
+        context = multiprocessing.get_context(PARSE_POOL_START_METHOD)
+        if PARSE_POOL_START_METHOD == "forkserver":
+            context.set_forkserver_preload(PARSER_MODULES)
+        _executor = ProcessPoolExecutor(max_workers=PARSE_POOL_WORKERS, mp_context=context)
+    return _executor
+
+async def warm_up_parse_pool() -> None:
+    """Start a worker now, so the first upload does not wait for the pool to come up"""
+    await asyncio.get_running_loop().run_in_executor(get_parse_executor(), load_parsers)
+
+def retire_parse_pool(executor: ProcessPoolExecutor) -> None:
+    """Send new files to a fresh pool; the old one is terminated once no open file reads from it"""
+    global _executor
+    if _executor is executor:
+        _executor = None
+    _retired.add(executor)
+    if executor not in _open_parses:
+        _terminate_pool(executor)
+
+def _terminate_pool(executor: ProcessPoolExecutor) -> None:
+    # Running tasks cannot be cancelled, so a worker stuck on a timed-out file is stopped outright;
+    # its futures then fail, which releases the queue slots they hold
+    _retired.discard(executor)
+    for process in list((getattr(executor, "_processes", None) or {}).values()):
+        process.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def shutdown_parse_pool() -> None:
+    global _executor
+    for executor in list(_retired):
+        _terminate_pool(executor)
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+class FileParse:
+    """The pool tasks submitted for one file, which together hold one of PARSE_QUEUE_SIZE slots
+
+    The slot is released by done-callbacks once every task has left the pool, not
+    when the caller stops waiting, so a file that timed out keeps counting against
+    the queue until its worker is free. A timeout also retires the pool, since its
+    worker may never finish (see retire_parse_pool).
+    """
+
+    def __init__(self, filename: str):
+        global _files_in_progress
+        self.filename = filename
+        self.executor = get_parse_executor()
+        self.deadline = asyncio.get_running_loop().time() + PARSE_TIMEOUT_SECONDS
+        self.futures = []
+        self.waiters = []
+        self.closed = False
+        self.released = False
+        # The slot is taken last, so a failure above cannot leak it
+        with _slot_lock:
+            if _files_in_progress >= PARSE_QUEUE_SIZE:
+                raise ParseQueueFullError("Too many files are being processed, please retry shortly")
+            _files_in_progress += 1
+        _open_parses[self.executor] = _open_parses.get(self.executor, 0) + 1
+
+    def submit(self, fn, *args) -> asyncio.Future:
+        future = self.executor.submit(fn, *args)
+        self.futures.append(future)
+        future.add_done_callback(self._task_done)
+        waiter = asyncio.wrap_future(future)
+        self.waiters.append(waiter)
+        return waiter
+
+    async def result(self, waiter: asyncio.Future):
+        """Wait for a submitted task within the file's PARSE_TIMEOUT_SECONDS"""
+        remaining = self.deadline - asyncio.get_running_loop().time()
+        try:
+            return await asyncio.wait_for(waiter, timeout=max(remaining, 0))
+        except asyncio.TimeoutError:
+            print(f"Parsing {self.filename} timed out; replacing the parse pool")
+            retire_parse_pool(self.executor)
+            raise TimeoutError(f"Parsing {self.filename} took longer than {PARSE_TIMEOUT_SECONDS:.0f} seconds")
+
+    def close(self) -> None:
+        """Cancel tasks that have not started; the slot is released once the rest have finished"""
+        if self.closed:
+            return
+        self.closed = True
+        for future, waiter in zip(self.futures, self.waiters):
+            future.cancel()
+            waiter.cancel()
+        _open_parses[self.executor] -= 1
+        if not _open_parses[self.executor]:
+            del _open_parses[self.executor]
+            if self.executor in _retired:
+                _terminate_pool(self.executor)
+        self._task_done()
+
+    def _task_done(self, _future=None) -> None:
+        # Called on the pool's management thread for tasks that finish after close()
+        global _files_in_progress
+        with _slot_lock:
+            if self.closed and not self.released and all(future.done() for future in self.futures):
+                self.released = True
+                _files_in_progress -= 1
+
+# Worker entry points import the parsers themselves; the API process never loads them
+def load_parsers() -> None:
+    """Worker entry point: import the parser modules (already done if the forkserver preloaded them)"""
+    for module in PARSER_MODULES:
+        __import__(module)
+
+def count_pages(source) -> int:
+    """Worker entry point: number of pages in a PDF"""
+    from app.utils.pdf_utils import count_pdf_pages
+    return count_pdf_pages(source)
+
+def extract_segments(filename: str, source) -> list:
+    """Worker entry point: extract every segment of a file"""
+    from app.services.file_parser import iter_text_from_file
+    return list(iter_text_from_file(filename, source))
+
+def extract_pdf_page_range(source, start_page: int, end_page: int) -> list:
+    """Worker entry point: extract the pages [start_page, end_page) of a PDF"""
+    from app.utils.pdf_utils import iter_text_from_pdf
+    return list(iter_text_from_pdf(source, start_page, end_page))
+
+def extract_preview(filename: str, source, max_chars: int) -> str:
+    """Worker entry point: the first max_chars characters of a file"""
+    from app.services.file_parser import extract_preview_from_file
+    return extract_preview_from_file(filename, source, max_chars)
+
+async def aiter_parsed_segments(filename: str, source, on_segment_count=None):
+    """Parse a file in the worker pool, yielding its segments in document order
+    
+    Large PDFs are split into page ranges that are parsed in parallel; each range is
+    yielded as soon as it and every range before it are done. Leaving the iteration
+    early cancels ranges that have not started yet. Passing the path of the spooled
+    upload as source, rather than its bytes, keeps the file out of every worker's memory.
+    on_segment_count, if given, is called with the number of segments to expect as soon
+    as it is known; for PDFs that is the page count, before any page has been parsed.
+    """
+    parse = FileParse(filename)
+    try:
+        with stage("parse"):
+            if filename.endswith(".pdf"):
+                page_count = await parse.result(parse.submit(count_pages, source))
+                if on_segment_count is not None:
+                    on_segment_count(page_count)
+                waiters = [
+                    parse.submit(extract_pdf_page_range, source, start_page,
+                                 min(start_page + PDF_PAGES_PER_TASK, page_count))
+                    for start_page in range(0, page_count, PDF_PAGES_PER_TASK)
+                ]
+                for waiter in waiters:
+                    for segment in await parse.result(waiter):
+                        yield segment
+            else:
+                segments = await parse.result(parse.submit(extract_segments, filename, source))
+                if on_segment_count is not None:
+                    on_segment_count(len(segments))
+                for segment in segments:
+                    yield segment
+    finally:
+        parse.close()
+
+async def parse_file_preview(filename: str, source, max_chars: int) -> str:
+    """Extract the first max_chars characters in the worker pool, parsing no further than needed"""
+    parse = FileParse(filename)
+    try:
+        return await parse.result(parse.submit(extract_preview, filename, source, max_chars))
+    finally:
+        parse.close()
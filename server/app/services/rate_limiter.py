@@ -0,0 +1,190 @@
+# app/services/rate_limiter.py
+
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from app.services.metrics import stage
+
+# Priority classes; lower values are admitted first
+PRIORITY_INTERACTIVE = 0   # A user is waiting on this call (explanations)
+PRIORITY_BULK = 1          # Document chunk generation
+PRIORITY_BACKGROUND = 2    # Speculative work such as explanation precompute
+
+# Concurrent overload errors usually come from the same burst, so back off once per cooldown
+BACKOFF_COOLDOWN_SECONDS = 2.0
+BACKOFF_FACTOR = 0.5
+
+class TokenBucket:
+    """Refills continuously at per_minute / 60 per second, holding at most one minute's worth
+
+    A limit of 0 disables the bucket. The level may go negative when a caller
+    reports more usage than it reserved; later callers then wait off the debt.
+    """
+
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self.level = float(per_minute)
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.per_minute, self.level + (now - self._updated) * self.per_minute / 60)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount can be taken; requests larger than the bucket only need it full"""
+        if not self.per_minute:
+            return 0.0
+        self._refill()
+        needed = min(amount, self.per_minute)
+        if self.level >= needed:
+            return 0.0
+        return (needed - self.level) * 60 / self.per_minute
+
+    def take(self, amount: float) -> None:
+        if self.per_minute:
+            self._refill()
+            self.level -= amount
+
+def is_overload_error(error: BaseException) -> bool:
+    """Rate-limit (429) and timeout errors, from any client library, mean the upstream is saturated"""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return True
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    try:
+        return int(code) in (429, 504)
+    except (TypeError, ValueError):
+        return False
+
+class Slot:
+    """An admitted call; report actual token usage with record_tokens"""
+
+    def __init__(self, limiter, reserved_tokens: float):
+        self._limiter = limiter
+        self.reserved_tokens = reserved_tokens
+
+    def record_tokens(self, used_tokens: float) -> None:
+        self._limiter.tokens.take(used_tokens - self.reserved_tokens)
+        self.reserved_tokens = used_tokens
+
+class AdaptiveLimiter:
+    """Process-wide admission control for model calls
+
+    Calls are admitted in priority order once a concurrency slot, a request from
+    the requests-per-minute bucket and their estimated tokens from the
+    tokens-per-minute bucket are all available. The concurrency limit follows
+    AIMD: it halves on 429s and timeouts and grows by about one slot per window
+    of successful calls, between min_concurrency and max_concurrency.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, min_concurrency: int = 1,
+                 requests_per_minute: int = 0, tokens_per_minute: int = 0):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = max(1, min(min_concurrency, max_concurrency))
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.overloads = 0
+        self._last_backoff = 0.0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._wakeup = None
+
+    @property
+    def concurrency(self) -> int:
+        return max(self.min_concurrency, int(self.limit))
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, future, _ in self._waiters if not future.done())
+
+    def busy(self) -> bool:
+        """True when a new call would have to queue"""
+        return self.in_flight >= self.concurrency or self.waiting > 0
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_INTERACTIVE, tokens: float = 0):
+        """Hold an admission for the duration of one call"""
+        await self._acquire(priority, tokens)
+        try:
+            yield Slot(self, tokens)
+        except BaseException as e:
+            self._release(overloaded=is_overload_error(e), succeeded=False)
+            raise
+        else:
+            self._release(overloaded=False, succeeded=True)
+
+    async def _acquire(self, priority: int, tokens: float) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future, tokens))
+        self._dispatch()
+        try:
+            with stage("model_queue"):
+                await future
+        except asyncio.CancelledError:
+            # Admitted just as the waiter was cancelled: hand the slot back
+            if future.done() and not future.cancelled():
+                self._release(overloaded=False, succeeded=False)
+            self._dispatch()
+            raise
+
+    def _dispatch(self) -> None:
+        """Admit waiters from the head of the priority queue while capacity allows"""
+        while self._waiters:
+            _, _, future, tokens = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.in_flight >= self.concurrency:
+                return
+
+            delay = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+            if delay > 0:
+                self._schedule_wakeup(delay)
+                return
+
+            heapq.heappop(self._waiters)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _schedule_wakeup(self, delay: float) -> None:
+        loop = asyncio.get_running_loop()
+        wake_at = loop.time() + delay
+        if self._wakeup is not None:
+            if self._wakeup.when() <= wake_at:
+                return
+            self._wakeup.cancel()
+
+        def wake():
+            self._wakeup = None
+            self._dispatch()
+
+        self._wakeup = loop.call_at(wake_at, wake)
+
+    def _release(self, overloaded: bool, succeeded: bool) -> None:
+        self.in_flight -= 1
+        if overloaded:
+            self.overloads += 1
+            now = time.monotonic()
+            if now - self._last_backoff >= BACKOFF_COOLDOWN_SECONDS:
+                self._last_backoff = now
+                self.limit = max(self.min_concurrency, self.limit * BACKOFF_FACTOR)
+                print(f"{self.name} limiter backing off to {self.concurrency} concurrent calls")
+        elif succeeded:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+        self._dispatch()
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "overloads": self.overloads
+        }
@@ -0,0 +1,203 @@
+# app/services/result_cache.py
+
+import os
+import json
+import hashlib
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from dotenv import load_dotenv
+from app.db import get_cache_collection
+from app.services.metrics import CACHE_LOOKUPS
+
+load_dotenv()
+
+# Cache configuration
+CACHE_BACKEND = os.getenv("FLASHCARD_CACHE_BACKEND", "memory")  # "memory" or "mongo"
+CACHE_MAX_ENTRIES = int(os.getenv("FLASHCARD_CACHE_MAX_ENTRIES", "256"))
+CHUNK_CACHE_MAX_ENTRIES = int(os.getenv("FLASHCARD_CHUNK_CACHE_MAX_ENTRIES", "2048"))
+EXPLANATION_CACHE_MAX_ENTRIES = int(os.getenv("EXPLANATION_CACHE_MAX_ENTRIES", "4096"))
+CACHE_TTL_SECONDS = int(os.getenv("FLASHCARD_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+CACHE_TIMEOUT_SECONDS = float(os.getenv("FLASHCARD_CACHE_TIMEOUT_SECONDS", "2"))  # Mongo backend: slower counts as a miss
+
+def make_cache_key(content: bytes, **params) -> str:
+    """Build a content-addressed key from the raw bytes and the generation parameters"""
+    return make_digest_key(hashlib.sha256(content).hexdigest(), **params)
+
+def make_digest_key(digest: str, **params) -> str:
+    """Build a cache key from an already computed SHA-256 content digest"""
+    params_json = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(f"{digest}:{params_json}".encode("utf-8")).hexdigest()
+
+class BaseCache:
+    """Common hit/miss bookkeeping shared by all cache backends
+
+    get and set are coroutines so backends that do I/O never block the event loop.
+    """
+
+    backend = "base"
+
+    def __init__(self, name: str = "cache"):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+
+    async def get(self, key: str):
+        return self._record_lookup(await self._get(key))
+
+    async def set(self, key: str, value) -> None:
+        await self._set(key, value)
+        self.sets += 1
+
+    def _record_lookup(self, value):
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        CACHE_LOOKUPS.inc(cache=self.name, result="miss" if value is None else "hit")
+        return value
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "hits": self.hits,
+            "misses": self.misses,
+            "sets": self.sets,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+    async def _get(self, key: str):
+        raise NotImplementedError
+
+    async def _set(self, key: str, value) -> None:
+        raise NotImplementedError
+
+class MemoryCache(BaseCache):
+    """In-process LRU cache bounded by entry count, with optional expiry
+
+    Lookups never block, so get_nowait and set_nowait serve synchronous callers too.
+    """
+
+    backend = "memory"
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl_seconds: int = CACHE_TTL_SECONDS,
+                 name: str = "cache"):
+        super().__init__(name)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_nowait(self, key: str):
+        return self._record_lookup(self._lookup(key))
+
+    def set_nowait(self, key: str, value) -> None:
+        self._store(key, value)
+        self.sets += 1
+
+    async def _get(self, key: str):
+        return self._lookup(key)
+
+    async def _set(self, key: str, value) -> None:
+        self._store(key, value)
+
+    def _lookup(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def _store(self, key: str, value) -> None:
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["entries"] = len(self._entries)
+        stats["max_entries"] = self.max_entries
+        return stats
+
+class MongoCache(BaseCache):
+    """MongoDB-backed cache; expiry is handled by a TTL index on created_at"""
+
+    backend = "mongo"
+
+    def __init__(self, collection_name: str = "flashcard_cache", ttl_seconds: int = CACHE_TTL_SECONDS,
+                 timeout_seconds: float = CACHE_TIMEOUT_SECONDS):
+        super().__init__(collection_name)
+        self.collection_name = collection_name
+        self.ttl_seconds = ttl_seconds
+        self.timeout_seconds = timeout_seconds
+        self._index_ready = False
+
+    def _collection(self):
+        collection = get_cache_collection(self.collection_name)
+        if not self._index_ready:
+            collection.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+            self._index_ready = True
+        return collection
+
+    def _find(self, key: str):
+        import pymongo
+        # Bounds server selection too, so an unreachable server costs one short wait per lookup
+        with pymongo.timeout(self.timeout_seconds):
+            return self._collection().find_one({"_id": key})
+
+    def _replace(self, key: str, value) -> None:
+        import pymongo
+        with pymongo.timeout(self.timeout_seconds):
+            self._collection().replace_one(
+                {"_id": key},
+                {"_id": key, "value": value, "created_at": datetime.utcnow()},
+                upsert=True
+            )
+
+    # pymongo blocks, so every call runs in a thread instead of on the event loop
+    async def _get(self, key: str):
+        # A cache outage must never fail generation, so errors count as misses
+        try:
+            document = await asyncio.to_thread(self._find, key)
+        except Exception as e:
+            print(f"Cache lookup failed ({self.collection_name}): {e}")
+            return None
+        return document["value"] if document else None
+
+    async def _set(self, key: str, value) -> None:
+        try:
+            await asyncio.to_thread(self._replace, key, value)
+        except Exception as e:
+            print(f"Cache write failed ({self.collection_name}): {e}")
+
+def create_cache(collection_name: str, max_entries: int = CACHE_MAX_ENTRIES,
+                 backend: str = CACHE_BACKEND) -> BaseCache:
+    """Create a cache for the configured backend"""
+    if backend == "mongo":
+        return MongoCache(collection_name)
+    if backend == "memory":
+        return MemoryCache(max_entries, name=collection_name)
+    raise ValueError(f"Unknown cache backend: {backend}")
+
+# Whole-document flashcard results
+flashcard_cache = create_cache("flashcard_cache")
+
+# Per-chunk flashcard results, so edited documents only regenerate changed chunks
+chunk_cache = create_cache("flashcard_chunk_cache", CHUNK_CACHE_MAX_ENTRIES)
+
+# Explanations keyed by card, type and context; filled on demand and by background precompute
+explanation_cache = create_cache("explanation_cache", EXPLANATION_CACHE_MAX_ENTRIES)
@@ -0,0 +1,112 @@
+# app/services/retry_policy.py
+
+import os
+import random
+import asyncio
+from collections import deque
+from dotenv import load_dotenv
+from app.services.rate_limiter import is_overload_error
+from app.services.metrics import RETRIES, HEDGED_REQUESTS
+
+load_dotenv()
+
+# Flashcard chunk calls from every provider get a deadline per attempt and jittered retries
+CHUNK_CALL_TIMEOUT_SECONDS = float(os.getenv("CHUNK_CALL_TIMEOUT_SECONDS", "60"))
+CHUNK_MAX_ATTEMPTS = int(os.getenv("CHUNK_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY_SECONDS = float(os.getenv("RETRY_BASE_DELAY_SECONDS", "0.5"))
+RETRY_MAX_DELAY_SECONDS = float(os.getenv("RETRY_MAX_DELAY_SECONDS", "8"))
+
+class LatencyTracker:
+    """Rolling window of call latencies, for choosing when to hedge"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, fraction: float):
+        """Latency at the given fraction (0.95 for p95), or None until enough calls were seen"""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def is_retryable_error(error: BaseException) -> bool:
+    """Rate limits, timeouts, server errors and dropped connections are worth another attempt"""
+    if is_overload_error(error) or isinstance(error, ConnectionError):
+        return True
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    try:
+        return int(code) in (500, 502, 503)
+    except (TypeError, ValueError):
+        return False
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Full-jitter exponential backoff, so retrying callers do not stampede together"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+async def call_with_retries(call, attempts: int, base_delay: float, max_delay: float,
+                            retryable=is_retryable_error, label: str = "Call"):
+    """Await call() up to attempts times, sleeping a jittered backoff between retryable failures"""
+    for attempt in range(attempts):
+        try:
+            return await call()
+        except Exception as e:
+            if attempt + 1 >= attempts or not retryable(e):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            RETRIES.inc()
+            print(f"{label} failed ({e}); retry {attempt + 2}/{attempts} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+async def hedged_call(call, hedge_after, can_hedge=None, label: str = "Call"):
+    """Await call(), sending a duplicate if it is still running after hedge_after seconds
+
+    The first successful result wins and the other request is cancelled. A failure
+    only counts once both requests have failed. hedge_after of None disables
+    hedging; can_hedge, if given, is checked before the duplicate is sent. The
+    timer starts when call() does, so hedge_after must include any queueing
+    inside call(), or queued requests are hedged too early.
+    """
+    if hedge_after is None:
+        return await call()
+
+    tasks = {asyncio.create_task(call())}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        if not done and (can_hedge is None or can_hedge()):
+            print(f"{label} exceeded {hedge_after:.1f}s, sending a hedged request")
+            HEDGED_REQUESTS.inc()
+            tasks.add(asyncio.create_task(call()))
+
+        error = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def is_retryable_chunk_error(error: BaseException) -> bool:
+    """Unparseable replies are retried along with transient API errors"""
+    return isinstance(error, ValueError) or is_retryable_error(error)
+
+async def call_chunk_with_retries(call, label: str, hedge_after=None, can_hedge=None):
+    """Await a chunk generation call with the shared chunk retry settings; raises on failure
+
+    hedge_after and can_hedge are passed to hedged_call for each attempt.
+    """
+    return await call_with_retries(
+        lambda: hedged_call(call, hedge_after, can_hedge, label),
+        CHUNK_MAX_ATTEMPTS,
+        RETRY_BASE_DELAY_SECONDS,
+        RETRY_MAX_DELAY_SECONDS,
+        retryable=is_retryable_chunk_error,
+        label=label
+    )
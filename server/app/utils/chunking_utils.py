@@ -0,0 +1,153 @@
+import re
+
+# Without a tokenizer at hand, English prose averages about four characters per token
+DEFAULT_CHARS_PER_TOKEN = 4.0
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+WHITESPACE = re.compile(r"\s+")
+
+def estimate_tokens(text: str, chars_per_token: float = DEFAULT_CHARS_PER_TOKEN) -> int:
+    """Approximate token count of text for a given characters-per-token ratio"""
+    return int(len(text) / chars_per_token)
+
+def chunk_segments(segments, max_tokens: int, chars_per_token: float = DEFAULT_CHARS_PER_TOKEN,
+                   overlap_tokens: int = 0) -> list:
+    """Pack parser segments (pages, slides, paragraphs) into chunks of at most max_tokens
+
+    Segments are kept whole whenever they fit, so chunk boundaries fall on the
+    boundaries the parsers reported. Oversized segments are split on paragraphs,
+    then sentences, then whitespace. With overlap_tokens, each chunk starts with
+    the end of the previous one, cut at a sentence or word boundary. Runs in time
+    linear in the input.
+    """
+    packer = ChunkPacker(max_tokens, chars_per_token, overlap_tokens)
+    chunks = []
+    for segment in segments:
+        chunks.extend(packer.add(segment))
+    return chunks + packer.finish()
+
+class ChunkPacker:
+    """Incremental chunk_segments, for segments that are still being parsed
+
+    add() takes one segment and returns the chunks it completed; finish()
+    returns the last, partly filled chunk.
+    """
+
+    def __init__(self, max_tokens: int, chars_per_token: float = DEFAULT_CHARS_PER_TOKEN, overlap_tokens: int = 0):
+        self.max_chars = max(1, int(max_tokens * chars_per_token))
+        # Overlap may not crowd out new text, or a chunk could be nothing but overlap
+        self.overlap_chars = min(int(overlap_tokens * chars_per_token), self.max_chars // 2)
+        self._parts = []    # (separator, text) units of the chunk being built
+        self._length = 0
+        self._has_new_text = False
+
+    def add(self, segment: str) -> list:
+        chunks = []
+        for separator, unit in iter_units([segment], self.max_chars):
+            if self._parts and self._length + len(separator) + len(unit) > self.max_chars:
+                if self._has_new_text:
+                    chunks.append(join_units(self._parts))
+                # The overlap shrinks to whatever room the next unit leaves
+                room = self.max_chars - len(separator) - len(unit)
+                self._parts = tail_units(self._parts, min(self.overlap_chars, room))
+                self._length = sum(len(sep) + len(text) for sep, text in self._parts)
+                self._has_new_text = False
+
+            self._parts.append((separator, unit))
+            self._length += len(separator) + len(unit)
+            self._has_new_text = True
+        return chunks
+
+    def finish(self) -> list:
+        if not self._has_new_text:
+            return []
+        self._has_new_text = False
+        return [join_units(self._parts)]
+
+def chunk_text(text: str, max_tokens: int, chars_per_token: float = DEFAULT_CHARS_PER_TOKEN,
+               overlap_tokens: int = 0) -> list:
+    """Chunk a single block of text; see chunk_segments"""
+    return chunk_segments([text], max_tokens, chars_per_token, overlap_tokens)
+
+def iter_units(segments, max_chars: int):
+    """Yield (separator, text) units no longer than max_chars, splitting only what does not fit"""
+    for segment in segments:
+        segment = segment.strip()
+        if not segment:
+            continue
+        if len(segment) <= max_chars:
+            yield "\n\n", segment
+            continue
+
+        for paragraph in PARAGRAPH_BREAK.split(segment):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if len(paragraph) <= max_chars:
+                yield "\n\n", paragraph
+                continue
+
+            separator = "\n\n"
+            for sentence in SENTENCE_BREAK.split(paragraph):
+                if not sentence:
+                    continue
+                if len(sentence) <= max_chars:
+                    yield separator, sentence
+                else:
+                    for piece in split_on_whitespace(sentence, max_chars):
+                        yield separator, piece
+                        separator = " "
+                separator = " "
+
+def split_on_whitespace(text: str, max_chars: int):
+    """Cut text into pieces of at most max_chars, preferring the last space in each window"""
+    start = 0
+    while start < len(text):
+        end = start + max_chars
+        if end < len(text):
+            # Only look back half a window so each character is scanned a bounded number of times
+            space = text.rfind(" ", start + max_chars // 2, end)
+            if space > start:
+                end = space
+        piece = text[start:end].strip()
+        if piece:
+            yield piece
+        start = end
+
+def join_units(parts: list) -> str:
+    """Join (separator, text) units, dropping the separator before the first one"""
+    return parts[0][1] + "".join(separator + text for separator, text in parts[1:])
+
+def tail_units(parts: list, overlap_chars: int) -> list:
+    """Trailing text of a chunk within overlap_chars, carried into the next chunk
+
+    Whole units are carried while they fit; the room left is filled from the end
+    of the unit before them, so page-sized units still overlap.
+    """
+    if overlap_chars <= 0:
+        return []
+    length = 0
+    start = len(parts)
+    while start > 0:
+        separator, text = parts[start - 1]
+        if length + len(separator) + len(text) > overlap_chars:
+            break
+        length += len(separator) + len(text)
+        start -= 1
+    if start == 0:
+        return parts
+    separator, text = parts[start - 1]
+    tail = tail_text(text, overlap_chars - length - len(separator))
+    return [(separator, tail)] + parts[start:] if tail else parts[start:]
+
+def tail_text(text: str, max_chars: int) -> str:
+    """The end of text within max_chars, starting at a sentence if one fits, else at a word"""
+    if max_chars <= 0:
+        return ""
+    start = len(text) - max_chars
+    if start <= 0:
+        return text
+    # Search from the character before the window, so a sentence starting right at its edge is kept
+    boundary = SENTENCE_BREAK.search(text, start - 1) or WHITESPACE.search(text, start - 1)
+    return text[boundary.end():] if boundary else ""
@@ -0,0 +1,27 @@
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+
+class RouteLimiter:
+    """Caps concurrent requests on a route; waiters give up with 503 after queue_timeout seconds"""
+
+    def __init__(self, name: str, limit: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    @asynccontextmanager
+    async def slot(self):
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail=f"Too many concurrent {self.name} requests, please retry")
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
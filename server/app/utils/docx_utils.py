@@ -1,6 +1,11 @@
 from docx import Document
-import io
+from app.utils.file_utils import as_file_source
 
-def extract_text_from_docx(content: bytes) -> str:
-    doc = Document(io.BytesIO(content))
-    return "\n".join([p.text for p in doc.paragraphs])
\ No newline at end of file
+def iter_text_from_docx(source):
+    """Yield the text of each paragraph in turn"""
+    doc = Document(as_file_source(source))
+    for p in doc.paragraphs:
+        yield p.text
+
+def extract_text_from_docx(source) -> str:
+    return "\n".join(iter_text_from_docx(source))
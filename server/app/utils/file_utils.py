@@ -0,0 +1,31 @@
+import io
+import os
+import mmap
+import hashlib
+
+def as_file_source(source):
+    """Parsers accept either raw bytes or the path of a file on disk"""
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return source
+
+def read_text(source) -> str:
+    """Decode UTF-8 text; files on disk are decoded straight from a memory map"""
+    if isinstance(source, (bytes, bytearray)):
+        return source.decode("utf-8")
+    with open(source, "rb") as f:
+        # Empty files cannot be memory-mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return str(mapped, "utf-8")
+
+def digest_source(source) -> str:
+    """SHA-256 hex digest of raw bytes or of a file on disk"""
+    if isinstance(source, (bytes, bytearray)):
+        return hashlib.sha256(source).hexdigest()
+    digest = hashlib.sha256()
+    with open(source, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,94 @@
+# app/utils/json_utils.py
+
+import json
+
+_decoder = json.JSONDecoder()
+SEPARATORS = " \t\r\n,"
+
+class JSONArrayParser:
+    """Incrementally extract the items of a JSON array from model output
+
+    feed() takes the response in fragments and returns the items completed by
+    each one, so cards can be emitted while a reply is still streaming. Each item
+    is decoded once, in a single pass. Text before the array is skipped. That
+    includes markdown fences, a preamble, or a wrapping object such as
+    {"items": [...]}. A trailing item cut off by the output token limit is
+    dropped, and every complete item before it is kept.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._started = False
+        self.finished = False
+
+    @property
+    def started(self) -> bool:
+        """True once the opening bracket of the array has been seen"""
+        return self._started
+
+    @property
+    def truncated(self) -> bool:
+        """True if the array was opened but never closed"""
+        return self._started and not self.finished
+
+    def feed(self, text: str) -> list:
+        self._buffer += text
+        return self._parse(final=False)
+
+    def close(self) -> list:
+        """Parse what is left, skipping malformed items rather than waiting for more text"""
+        return self._parse(final=True)
+
+    def _parse(self, final: bool) -> list:
+        if self.finished:
+            return []
+        buffer = self._buffer
+        if not self._started:
+            start = buffer.find("[")
+            if start < 0:
+                return []
+            self._started = True
+            buffer = buffer[start + 1:]
+
+        items = []
+        position = 0
+        length = len(buffer)
+        while True:
+            while position < length and buffer[position] in SEPARATORS:
+                position += 1
+            if position >= length:
+                break
+            if buffer[position] == "]":
+                self.finished = True
+                position += 1
+                break
+            try:
+                item, end = _decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not final:
+                    # Most likely an item that is still arriving
+                    break
+                # Malformed or cut off: resume at the next object, if any
+                next_object = buffer.find("{", position + 1)
+                if next_object < 0:
+                    break
+                position = next_object
+                continue
+            if not final and end >= length and not isinstance(item, (dict, list, str)):
+                # A number or literal at the end of a fragment may still be growing ("1" of "12")
+                break
+            items.append(item)
+            position = end
+
+        # Keep only the unparsed tail, so long streams are not rescanned
+        self._buffer = buffer[position:]
+        return items
+
+def parse_json_array(text: str) -> tuple:
+    """Return (items, truncated) for the first JSON array in text; raises ValueError if there is none"""
+    parser = JSONArrayParser()
+    items = parser.feed(text)
+    items += parser.close()
+    if not parser.started:
+        raise ValueError("No JSON array found")
+    return items, parser.truncated
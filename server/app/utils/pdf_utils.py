@@ -1,9 +1,41 @@
+import itertools
 import pdfplumber
-import io
-
-def extract_text_from_pdf(content: bytes) -> str:
-    text = ""
-    with pdfplumber.open(io.BytesIO(content)) as pdf:
-        for page in pdf.pages:
-            text += page.extract_text() or ""
-    return text
\ No newline at end of file
+from pdfplumber.page import Page
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdftypes import resolve1
+from app.utils.file_utils import as_file_source
+
+def count_pdf_pages(source) -> int:
+    pdf = pdfplumber.open(as_file_source(source))
+    try:
+        # Read the count from the page tree instead of loading every page
+        return int(resolve1(pdf.doc.catalog["Pages"])["Count"])
+    except Exception:
+        return sum(1 for _ in PDFPage.create_pages(pdf.doc))
+    finally:
+        _release_pdf(pdf)
+
+def iter_text_from_pdf(source, start_page: int = 0, end_page: int = None):
+    """Yield the text of each page in turn, releasing page objects as we go
+
+    Pages are loaded lazily rather than through pdf.pages, which builds every page
+    up front, so stopping early or reading a page range only touches those pages.
+    """
+    pdf = pdfplumber.open(as_file_source(source))
+    try:
+        pdf_pages = itertools.islice(PDFPage.create_pages(pdf.doc), start_page, end_page)
+        for page_number, page_obj in enumerate(pdf_pages, start=start_page + 1):
+            page = Page(pdf, page_obj, page_number=page_number)
+            text = page.extract_text() or ""
+            page.close()
+            yield text
+    finally:
+        _release_pdf(pdf)
+
+def _release_pdf(pdf) -> None:
+    # PDF.close() loads every page just to close it, so only release the caches and file
+    pdf.flush_cache()
+    pdf.stream.close()
+
+def extract_text_from_pdf(source) -> str:
+    return "\n".join(iter_text_from_pdf(source))
@@ -1,11 +1,11 @@
 from pptx import Presentation
-import io
+from app.utils.file_utils import as_file_source
 
-def extract_text_from_pptx(content: bytes) -> str:
-    prs = Presentation(io.BytesIO(content))
-    text = ""
+def iter_text_from_pptx(source):
+    """Yield the text of each slide in turn, one line per text-bearing shape"""
+    prs = Presentation(as_file_source(source))
     for slide in prs.slides:
-        for shape in slide.shapes:
-            if hasattr(shape, "text"):
-                text += shape.text + "\n"
-    return text
\ No newline at end of file
+        yield "\n".join(shape.text for shape in slide.shapes if hasattr(shape, "text"))
+
+def extract_text_from_pptx(source) -> str:
+    return "\n".join(iter_text_from_pptx(source))
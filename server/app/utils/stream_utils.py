@@ -0,0 +1,38 @@
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+async def stream_text_response(chunks, error_detail: str) -> StreamingResponse:
+    """Stream text fragments as a plain-text response
+
+    The first fragment is awaited before the response starts, so failures that happen
+    before any output (limits, model errors) still surface as HTTP errors.
+    """
+    try:
+        first_chunk = await chunks.__anext__()
+    except StopAsyncIteration:
+        first_chunk = ""
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"{error_detail}: {str(e)}")
+
+    async def body():
+        yield first_chunk
+        try:
+            async for chunk in chunks:
+                yield chunk
+        except Exception as e:
+            print(f"Stream interrupted: {e}")
+            yield "\n\n[Response interrupted. Please try again.]"
+
+    return StreamingResponse(body(), media_type="text/plain; charset=utf-8")
+
+async def limited_stream(limiter, chunks):
+    """Hold a route slot for the lifetime of a streamed response"""
+    async with limiter.slot():
+        async for chunk in chunks:
+            yield chunk
+
+async def cached_stream(result: dict):
+    """Stream a stored explanation in one piece"""
+    yield result["explanation"]
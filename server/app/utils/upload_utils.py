@@ -0,0 +1,52 @@
+import os
+import hashlib
+import tempfile
+import aiofiles
+from fastapi import UploadFile, HTTPException
+
+# Uploads are copied to disk in fixed-size blocks so memory per upload stays bounded
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+
+class SpooledUpload:
+    """An upload written to a temporary file, with its size and content hash"""
+
+    def __init__(self, path: str, size: int, sha256: str):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+    def cleanup(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+async def spool_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> SpooledUpload:
+    """Stream an upload to a temporary file, hashing it on the way; rejects files over max_bytes"""
+    suffix = os.path.splitext(file.filename or "")[1]
+    fd, path = tempfile.mkstemp(prefix="upload-", suffix=suffix, dir=UPLOAD_SPOOL_DIR)
+    os.close(fd)
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(path, "wb") as out:
+            while True:
+                block = await file.read(UPLOAD_CHUNK_SIZE)
+                if not block:
+                    break
+                size += len(block)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File is too large (limit is {max_bytes // (1024 * 1024)} MB)"
+                    )
+                digest.update(block)
+                await out.write(block)
+    except BaseException:
+        os.remove(path)
+        raise
+
+    return SpooledUpload(path, size, digest.hexdigest())
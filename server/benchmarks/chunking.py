@@ -0,0 +1,102 @@
+"""Micro-benchmark for the shared chunker on multi-megabyte inputs.
+
+Times chunking_utils.chunk_segments against the character-based splitter the
+services used before, on synthetic documents made of page-sized segments.
+Time per megabyte should stay flat as the input grows.
+
+    python -m benchmarks.chunking --sizes 1 4 16
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.chunking_utils import chunk_segments
+
+WORDS = ("cell membrane protein energy transport gradient enzyme reaction "
+         "molecule structure function system process theory model").split()
+
+def make_segments(megabytes: float, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    target = int(megabytes * 1024 * 1024)
+    segments = []
+    size = 0
+    while size < target:
+        paragraphs = []
+        for _ in range(rng.randint(2, 6)):
+            sentences = [" ".join(rng.choices(WORDS, k=rng.randint(6, 24))).capitalize() + "."
+                         for _ in range(rng.randint(2, 8))]
+            paragraphs.append(" ".join(sentences))
+        segment = "\n\n".join(paragraphs)
+        segments.append(segment)
+        size += len(segment)
+    return segments
+
+def legacy_split(text: str, chunk_size: int) -> list:
+    """The previous paragraph-then-sentence splitter, kept here as the baseline"""
+    if len(text) <= chunk_size:
+        return [text]
+    paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
+    chunks = []
+    current_chunk = ""
+    for para in paragraphs:
+        if len(current_chunk) + len(para) + 2 > chunk_size and current_chunk:
+            chunks.append(current_chunk.strip())
+            current_chunk = para + "\n\n"
+        else:
+            current_chunk += para + "\n\n"
+    if current_chunk.strip():
+        chunks.append(current_chunk.strip())
+    final_chunks = []
+    for chunk in chunks:
+        if len(chunk) > chunk_size * 1.3:
+            sentences = [s.strip() + '.' for s in chunk.split('.') if s.strip()]
+            current_chunk = ""
+            for sentence in sentences:
+                if len(current_chunk) + len(sentence) + 1 > chunk_size and current_chunk:
+                    final_chunks.append(current_chunk.strip())
+                    current_chunk = sentence + " "
+                else:
+                    current_chunk += sentence + " "
+            if current_chunk.strip():
+                final_chunks.append(current_chunk.strip())
+        else:
+            final_chunks.append(chunk)
+    return final_chunks
+
+def timed(fn, repeat: int) -> tuple:
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16], help="Input sizes in megabytes")
+    parser.add_argument("--tokens", type=int, default=4000, help="Chunk size in tokens")
+    parser.add_argument("--overlap", type=int, default=200, help="Overlap in tokens")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'MB':>6} {'impl':>10} {'seconds':>9} {'s/MB':>7} {'chunks':>7}")
+    for megabytes in args.sizes:
+        segments = make_segments(megabytes)
+        text = "\n\n".join(segments)
+        runs = [
+            ("legacy", lambda: legacy_split(text, args.tokens * 4)),
+            ("shared", lambda: chunk_segments(segments, args.tokens)),
+            ("overlap", lambda: chunk_segments(segments, args.tokens, overlap_tokens=args.overlap)),
+        ]
+        for name, fn in runs:
+            seconds, chunks = timed(fn, args.repeat)
+            print(f"{megabytes:>6.1f} {name:>10} {seconds:>9.3f} {seconds / megabytes:>7.3f} {len(chunks):>7}")
+
+if __name__ == "__main__":
+    main()
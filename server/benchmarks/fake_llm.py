@@ -0,0 +1,272 @@
+"""Offline stand-in for the Gemini and Cohere APIs, for benchmarks.
+
+FakeLLM simulates latency (fixed, uniform, exponential or lognormal around a
+mean), server errors and 429s at configurable rates, and answers with canned
+output shaped like the real prompts expect: a JSON array of flashcards for
+chunk prompts, a JSON array of {"card", "explanation"} objects for batch
+explanation prompts and plain text otherwise.
+
+FakeGeminiModel stands in for genai.GenerativeModel, including models bound
+to a context cache, and FakeCohereClient for cohere.AsyncClient; install()
+puts them behind the app's providers. With a prefill cost set, each call also
+takes time in proportion to its uncached prompt tokens.
+"""
+
+import os
+import re
+import json
+import time
+import random
+import asyncio
+
+DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+WORD_PATTERN = re.compile(r"[A-Za-z]{4,}")
+TARGET_PATTERN = re.compile(r"\bcreate (?:exactly )?(\d+)", re.IGNORECASE)
+BATCH_CARD_PATTERN = re.compile(r"^Card (\d+)$", re.MULTILINE)
+
+class FakeAPIError(Exception):
+    """Carries a status code the way the client libraries' errors do"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code} {message}")
+        self.code = code
+        self.status_code = code
+
+class FakeLLM:
+    """Latency, failure and output model shared by the fake clients"""
+
+    def __init__(self, latency: float = 0.5, distribution: str = "lognormal", sigma: float = 0.5,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, seed: int = 0,
+                 prefill_seconds_per_1k: float = 0.0):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.latency = latency
+        self.distribution = distribution
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.prefill_seconds_per_1k = prefill_seconds_per_1k
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def sample_latency(self) -> float:
+        """Seconds for one call; every distribution has the configured mean"""
+        if self.distribution == "fixed":
+            return self.latency
+        if self.distribution == "uniform":
+            return self.rng.uniform(0.5 * self.latency, 1.5 * self.latency)
+        if self.distribution == "exponential":
+            return self.rng.expovariate(1 / self.latency) if self.latency else 0.0
+        return self.latency * self.rng.lognormvariate(-self.sigma ** 2 / 2, self.sigma)
+
+    def maybe_fail(self) -> None:
+        draw = self.rng.random()
+        if draw < self.rate_limit_rate:
+            self.errors += 1
+            raise FakeAPIError(429, "Resource has been exhausted")
+        if draw < self.rate_limit_rate + self.error_rate:
+            self.errors += 1
+            raise FakeAPIError(503, "The service is currently unavailable")
+
+    def reply(self, prompt: str) -> str:
+        """Canned output matching what the prompt asks for"""
+        words = WORD_PATTERN.findall(prompt[-4000:]) or ["concept"]
+        batch_cards = BATCH_CARD_PATTERN.findall(prompt)
+        if batch_cards:
+            return json.dumps([
+                {"card": int(card), "explanation": self.sentence(words, 40)}
+                for card in batch_cards
+            ])
+        target = TARGET_PATTERN.search(prompt)
+        if target and "JSON" in prompt:
+            return json.dumps([
+                {
+                    "question": f"What is the role of {self.sentence(words, 4)}?",
+                    "answer": self.sentence(words, 20),
+                    "difficulty": self.rng.choice(("easy", "medium", "hard")),
+                    "category": "definition"
+                }
+                for _ in range(int(target.group(1)))
+            ])
+        return self.sentence(words, 120)
+
+    def sentence(self, words: list, length: int) -> str:
+        return " ".join(self.rng.choice(words) for _ in range(length))
+
+    def start_call(self, prompt: str, cached_tokens: int) -> float:
+        """Count a call and return its simulated latency"""
+        self.calls += 1
+        prompt_tokens = count_tokens(prompt)
+        self.prompt_tokens += prompt_tokens
+        self.cached_tokens += cached_tokens
+        return self.sample_latency() + self.prefill_seconds_per_1k * prompt_tokens / 1000
+
+    async def call(self, prompt: str, cached_prefix: str = "", cached_tokens: int = 0) -> str:
+        await asyncio.sleep(self.start_call(prompt, cached_tokens))
+        self.maybe_fail()
+        return self.reply(cached_prefix + prompt)
+
+    def call_sync(self, prompt: str) -> str:
+        time.sleep(self.start_call(prompt, 0))
+        self.maybe_fail()
+        return self.reply(prompt)
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "errors": self.errors, "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens}
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+class FakeUsage:
+    def __init__(self, prompt: str, text: str, cached_tokens: int = 0):
+        self.cached_content_token_count = cached_tokens
+        self.prompt_token_count = count_tokens(prompt) + cached_tokens
+        self.candidates_token_count = count_tokens(text)
+        self.total_token_count = self.prompt_token_count + self.candidates_token_count
+
+class FakeGeminiResponse:
+    def __init__(self, prompt: str, text: str, cached_tokens: int = 0):
+        self.text = text
+        self.usage_metadata = FakeUsage(prompt, text, cached_tokens)
+
+class FakeGeminiStream:
+    """Async iterable of response chunks, like generate_content_async(stream=True)"""
+
+    def __init__(self, text: str, delay: float):
+        self.parts = re.findall(r"\S+\s*", text)
+        self.delay = delay
+
+    async def __aiter__(self):
+        for part in self.parts:
+            await asyncio.sleep(self.delay)
+            yield FakeGeminiResponse("", part)
+
+class FakeTokenCount:
+    def __init__(self, total_tokens: int):
+        self.total_tokens = total_tokens
+
+class FakeCachedContent:
+    """Stands in for genai.caching.CachedContent"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.deleted = False
+
+    def delete(self) -> None:
+        self.deleted = True
+
+class FakeGeminiModel:
+    """Stands in for genai.GenerativeModel; cached_prefix is the context a cache-bound model was created from"""
+
+    def __init__(self, llm: FakeLLM, model_name: str = "models/fake-gemini", cached_prefix: str = "",
+                 cached_tokens: int = 0):
+        self.llm = llm
+        self.model_name = model_name
+        self.cached_prefix = cached_prefix
+        self.cached_tokens = cached_tokens
+
+    def generate_content(self, prompt: str, **kwargs) -> FakeGeminiResponse:
+        return FakeGeminiResponse(prompt, self.llm.call_sync(prompt))
+
+    async def generate_content_async(self, prompt: str, stream: bool = False, **kwargs):
+        text = await self.llm.call(prompt, self.cached_prefix, self.cached_tokens)
+        if stream:
+            # Time to first token is the sampled latency; the rest trickles out quickly
+            return FakeGeminiStream(text, delay=0.002)
+        return FakeGeminiResponse(prompt, text, self.cached_tokens)
+
+    async def count_tokens_async(self, text: str, **kwargs) -> FakeTokenCount:
+        return FakeTokenCount(count_tokens(text))
+
+    async def create_cache(self, context) -> dict:
+        """Replaces GeminiProvider._create_cache; the handle has the same shape"""
+        prefix = context.instructions + context.text
+        model = FakeGeminiModel(self.llm, self.model_name, prefix, count_tokens(prefix))
+        return {"cached_content": FakeCachedContent(f"cachedContents/{context.key[:16]}"), "model": model}
+
+class FakeBilledUnits:
+    def __init__(self, message: str, text: str):
+        self.input_tokens = count_tokens(message)
+        self.output_tokens = count_tokens(text)
+
+class FakeCohereMeta:
+    def __init__(self, message: str, text: str):
+        self.billed_units = FakeBilledUnits(message, text)
+
+class FakeCohereResponse:
+    def __init__(self, message: str, text: str):
+        self.text = text
+        self.meta = FakeCohereMeta(message, text)
+
+class FakeCohereEvent:
+    def __init__(self, text: str):
+        self.event_type = "text-generation"
+        self.text = text
+
+class FakeCohereClient:
+    """Stands in for cohere.AsyncClient"""
+
+    def __init__(self, llm: FakeLLM):
+        self.llm = llm
+
+    async def chat(self, message: str, model: str = None, **kwargs) -> FakeCohereResponse:
+        return FakeCohereResponse(message, await self.llm.call(message))
+
+    async def chat_stream(self, message: str, model: str = None, **kwargs):
+        text = await self.llm.call(message)
+        for part in re.findall(r"\S+\s*", text):
+            await asyncio.sleep(0.002)
+            yield FakeCohereEvent(part)
+
+def install(llm: FakeLLM, providers: tuple = ("gemini",)) -> None:
+    """Route every model call in the app to llm through the given providers"""
+    from app.services import gemini_service
+
+    routed = []
+    for name in providers:
+        if name == "gemini":
+            fake_model = FakeGeminiModel(llm)
+            # The provider's model is also used for token counting
+            gemini_service.gemini_provider.model = fake_model
+            gemini_service.gemini_provider._create_cache = fake_model.create_cache
+            routed.append(gemini_service.gemini_provider)
+        elif name == "cohere":
+            os.environ.setdefault("COHERE_API_KEY", "benchmark")
+            from app.services import cohere_service
+            cohere_service.cohere_provider.client = FakeCohereClient(llm)
+            routed.append(cohere_service.cohere_provider)
+        else:
+            raise ValueError(f"Unknown provider: {name}")
+    gemini_service.llm_router.providers[:] = routed
+
+def add_arguments(parser) -> None:
+    """Command-line options for the fake model, shared by the benchmarks"""
+    group = parser.add_argument_group("fake model")
+    group.add_argument("--latency", type=float, default=0.5, help="Mean simulated model latency in seconds")
+    group.add_argument("--distribution", choices=DISTRIBUTIONS, default="lognormal")
+    group.add_argument("--sigma", type=float, default=0.5, help="Spread of the lognormal distribution")
+    group.add_argument("--error-rate", type=float, default=0.0, help="Share of calls failing with a 503")
+    group.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of calls failing with a 429")
+    group.add_argument("--prefill", type=float, default=0.0,
+                       help="Extra seconds per 1000 uncached prompt tokens, so cached contexts save time")
+    group.add_argument("--providers", nargs="+", choices=("gemini", "cohere"), default=["gemini"])
+    group.add_argument("--seed", type=int, default=0)
+
+def from_args(args) -> FakeLLM:
+    """Build and install a fake model from add_arguments options"""
+    llm = FakeLLM(
+        latency=args.latency,
+        distribution=args.distribution,
+        sigma=args.sigma,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+        prefill_seconds_per_1k=args.prefill
+    )
+    install(llm, tuple(args.providers))
+    return llm
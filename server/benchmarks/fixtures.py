@@ -0,0 +1,118 @@
+"""Generated PDF, DOCX and PPTX uploads for the benchmarks.
+
+Every seed produces different text, so repeated uploads miss the document
+and chunk caches the way distinct real lectures would. The PDF writer emits
+plain Helvetica text pages and needs no extra dependency.
+"""
+
+import io
+import random
+from docx import Document
+from pptx import Presentation
+from pptx.util import Inches
+
+FORMATS = ("pdf", "docx", "pptx")
+
+SYLLABLES = ("ba ce di fo gu ha ke li mo nu pa re si to vu la me ni po ru "
+             "tra ste pli gno cro bla fen dor mis tal ver qui zan").split()
+
+def make_vocabulary(rng: random.Random, size: int = 1500) -> list:
+    return ["".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(size)]
+
+def make_paragraphs(count: int, seed: int) -> list:
+    """Lecture-like paragraphs of 3-7 sentences over a per-seed vocabulary"""
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng)
+    paragraphs = []
+    for _ in range(count):
+        sentences = [" ".join(rng.choices(vocabulary, k=rng.randint(8, 20))).capitalize() + "."
+                     for _ in range(rng.randint(3, 7))]
+        paragraphs.append(" ".join(sentences))
+    return paragraphs
+
+def wrap(text: str, width: int) -> list:
+    lines = []
+    current = ""
+    for word in text.split():
+        if current and len(current) + len(word) + 1 > width:
+            lines.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        lines.append(current)
+    return lines
+
+def make_pdf(pages: int, seed: int = 0) -> bytes:
+    """A text PDF with about 55 lines of 90 characters per page"""
+    lines_per_page = 55
+    lines = []
+    for paragraph in make_paragraphs(pages * 8, seed):
+        lines.extend(wrap(paragraph, 90))
+        lines.append("")
+
+    page_streams = []
+    for page in range(pages):
+        page_lines = lines[page * lines_per_page:(page + 1) * lines_per_page]
+        text = " '".join(f"({line})" for line in page_lines)
+        page_streams.append(f"BT /F1 10 Tf 50 800 Td 13 TL '{text} ' ET".encode("latin-1"))
+
+    # Objects: 1 catalog, 2 page tree, 3 font, then a page and a content stream per page
+    page_ids = [4 + 2 * page for page in range(pages)]
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{pid} 0 R' for pid in page_ids)}] /Count {pages} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for pid, stream in zip(page_ids, page_streams):
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {pid + 1} 0 R >>".encode())
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+
+    output = io.BytesIO()
+    output.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(output.tell())
+        output.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+    xref = output.tell()
+    output.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        output.write(f"{offset:010d} 00000 n \n".encode())
+    output.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return output.getvalue()
+
+def make_docx(pages: int, seed: int = 0) -> bytes:
+    """A Word document with a heading and eight paragraphs per page"""
+    document = Document()
+    for page, paragraph in enumerate(make_paragraphs(pages * 8, seed)):
+        if page % 8 == 0:
+            document.add_heading(f"Section {page // 8 + 1}", level=1)
+        document.add_paragraph(paragraph)
+    output = io.BytesIO()
+    document.save(output)
+    return output.getvalue()
+
+def make_pptx(slides: int, seed: int = 0) -> bytes:
+    """A presentation with a title and three bullet paragraphs per slide"""
+    presentation = Presentation()
+    layout = presentation.slide_layouts[1]
+    paragraphs = make_paragraphs(slides * 3, seed)
+    for slide_index in range(slides):
+        slide = presentation.slides.add_slide(layout)
+        slide.shapes.title.text = f"Slide {slide_index + 1}"
+        body = slide.placeholders[1].text_frame
+        body.text = paragraphs[slide_index * 3]
+        for paragraph in paragraphs[slide_index * 3 + 1:slide_index * 3 + 3]:
+            body.add_paragraph().text = paragraph
+        slide.shapes.add_textbox(Inches(0.5), Inches(7), Inches(9), Inches(0.5)).text_frame.text = f"Page {slide_index + 1}"
+    output = io.BytesIO()
+    presentation.save(output)
+    return output.getvalue()
+
+def make_fixture(file_format: str, pages: int, seed: int = 0) -> tuple:
+    """Return (filename, content) for a generated upload"""
+    builders = {"pdf": make_pdf, "docx": make_docx, "pptx": make_pptx}
+    if file_format not in builders:
+        raise ValueError(f"Unknown fixture format: {file_format}")
+    return f"lecture-{seed}.{file_format}", builders[file_format](pages, seed)
@@ -0,0 +1,59 @@
+"""Load test for the /explanations routes.
+
+Replaces the model with the fixed-latency fake from benchmarks.fake_llm and drives the app in-process
+at increasing client concurrency. Throughput should grow with the number of
+clients (up to GEMINI_MAX_CONCURRENCY) instead of staying flat, which is what a
+blocked event loop looks like.
+
+    python -m benchmarks.load_explanations --latency 0.2 --requests-per-client 5
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API", "benchmark")
+
+import httpx
+from app.main import app
+from benchmarks import fake_llm
+
+async def run_level(client: httpx.AsyncClient, route: str, clients: int, requests_per_client: int) -> float:
+    async def worker(client_index: int):
+        for request_index in range(requests_per_client):
+            # Distinct questions, so the explanation cache never answers for the model
+            payload = {
+                "question": f"What is osmosis? ({clients}-{client_index}-{request_index})",
+                "current_answer": "Diffusion of water across a membrane."
+            }
+            response = await client.post(route, json=payload)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(client_index) for client_index in range(clients)])
+    elapsed = time.perf_counter() - start
+    return clients * requests_per_client / elapsed
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated model latency in seconds")
+    parser.add_argument("--requests-per-client", type=int, default=5)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--route", default="/explanations/simplified-explanation")
+    args = parser.parse_args()
+
+    fake_llm.install(fake_llm.FakeLLM(latency=args.latency, distribution="fixed"))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        print(f"{'clients':>8} {'req/s':>10} {'speedup':>8}")
+        baseline = None
+        for clients in args.clients:
+            throughput = await run_level(client, args.route, clients, args.requests_per_client)
+            baseline = baseline or throughput
+            print(f"{clients:>8} {throughput:>10.1f} {throughput / baseline:>7.1f}x")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,241 @@
+"""End-to-end throughput benchmark for flashcard generation and explanations.
+
+Drives the app in-process against the offline fake model (benchmarks.fake_llm)
+with concurrent uploads of generated PDF, DOCX and PPTX files, then concurrent
+explanation requests that reference the uploaded documents by document_id.
+For each phase it reports request throughput,
+p50/p95/p99 latency and peak RSS of the API process and the parse workers,
+plus latency percentiles of the pipeline stages inside it. Every upload has
+different text, so the caches do not hide any work.
+
+    python -m benchmarks.pipeline --uploads 16 --concurrency 4 --pages 20 --latency 0.5
+    python -m benchmarks.pipeline --error-rate 0.05 --rate-limit-rate 0.05 --output results.json
+    GEMINI_CONTEXT_CACHE_MIN_TOKENS=1024 python -m benchmarks.pipeline --prefill 0.05
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+from collections import defaultdict
+from functools import wraps
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API", "benchmark")
+
+import httpx
+from app.main import app
+from app.services import gemini_service, parse_pool
+from benchmarks import fake_llm
+from benchmarks.fixtures import FORMATS, make_fixture
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+class StageTimes:
+    """Durations of the instrumented pipeline stages, collected per phase"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def reset(self) -> dict:
+        samples, self.samples = self.samples, defaultdict(list)
+        return samples
+
+    def wrap_async(self, stage: str, fn):
+        @wraps(fn)
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                self.samples[stage].append(time.perf_counter() - start)
+        return timed
+
+    def wrap_until_first(self, stage: str, fn):
+        """Time an async generator from the call until its first item"""
+        @wraps(fn)
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            first = True
+            async for item in fn(*args, **kwargs):
+                if first:
+                    self.samples[stage].append(time.perf_counter() - start)
+                    first = False
+                yield item
+        return timed
+
+    def wrap(self, stage: str, fn):
+        @wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.samples[stage].append(time.perf_counter() - start)
+        return timed
+
+def instrument(stages: StageTimes) -> None:
+    """Time the stages of gemini_service by wrapping the module functions it calls"""
+    gemini_service.ChunkPlan.items = stages.wrap_until_first("parse to first request", gemini_service.ChunkPlan.items)
+    gemini_service.generate_content = stages.wrap_async("model call (incl. queue)", gemini_service.generate_content)
+    gemini_service.parse_chunk_response = stages.wrap("json parse", gemini_service.parse_chunk_response)
+    gemini_service.remove_duplicate_flashcards = stages.wrap("dedup", gemini_service.remove_duplicate_flashcards)
+
+def process_ids() -> list:
+    """The API process followed by the parse worker processes"""
+    executor = parse_pool._executor
+    workers = list(getattr(executor, "_processes", None) or {}) if executor is not None else []
+    return [os.getpid()] + workers
+
+def peak_rss_mb(pid: int):
+    """High-water RSS of a process (VmHWM), or None where /proc is unavailable"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if pid == os.getpid():
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS, and never resets
+        scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    return None
+
+def reset_peak_rss() -> None:
+    """Restart the high-water marks so each phase reports its own peak (Linux only)"""
+    for pid in process_ids():
+        try:
+            with open(f"/proc/{pid}/clear_refs", "w") as clear_refs:
+                clear_refs.write("5")
+        except OSError:
+            pass
+
+def phase_memory() -> dict:
+    peaks = [peak_rss_mb(pid) for pid in process_ids()]
+    workers = [peak for peak in peaks[1:] if peak is not None]
+    return {"api_rss_mb": peaks[0], "worker_rss_mb": max(workers) if workers else None}
+
+async def run_requests(make_request, total: int, concurrency: int) -> tuple:
+    """Send total requests from concurrency clients, returning (latencies, failures, seconds)"""
+    latencies = []
+    failures = 0
+    next_index = iter(range(total))
+
+    async def client():
+        nonlocal failures
+        for index in next_index:
+            start = time.perf_counter()
+            response = await make_request(index)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    return latencies, failures, time.perf_counter() - start
+
+async def run_phase(name: str, make_request, args, stages: StageTimes) -> dict:
+    stages.reset()
+    reset_peak_rss()
+    latencies, failures, seconds = await run_requests(make_request, args.uploads, args.concurrency)
+    result = {
+        "phase": name,
+        "requests": len(latencies),
+        "failures": failures,
+        "throughput": len(latencies) / seconds,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        **phase_memory(),
+        "stages": {
+            stage: {
+                "count": len(samples),
+                "p50": percentile(samples, 0.50),
+                "p95": percentile(samples, 0.95),
+                "p99": percentile(samples, 0.99)
+            }
+            for stage, samples in stages.reset().items()
+        }
+    }
+    print_phase(result)
+    return result
+
+def format_mb(value) -> str:
+    return f"{value:.0f}" if value is not None else "n/a"
+
+def print_phase(result: dict) -> None:
+    print(f"\n{result['phase']}: {result['requests']} requests, {result['failures']} failed, "
+          f"{result['throughput']:.2f} req/s, peak RSS {format_mb(result['api_rss_mb'])} MB "
+          f"(parse workers {format_mb(result['worker_rss_mb'])} MB)")
+    print(f"  {'stage':<26} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = [("request", {"count": result["requests"], **{key: result[key] for key in ("p50", "p95", "p99")}})]
+    rows += list(result["stages"].items())
+    for stage, times in rows:
+        print(f"  {stage:<26} {times['count']:>6} {times['p50'] * 1000:>9.1f} "
+              f"{times['p95'] * 1000:>9.1f} {times['p99'] * 1000:>9.1f}")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--uploads", type=int, default=12, help="Requests per phase")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent clients")
+    parser.add_argument("--pages", type=int, default=20, help="Pages (or slides) per generated document")
+    parser.add_argument("--route", default="/explanations/simplified-explanation",
+                        help="Route for the explanation phase; empty to skip it")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    fake_llm.add_arguments(parser)
+    args = parser.parse_args()
+
+    llm = fake_llm.from_args(args)
+    stages = StageTimes()
+    instrument(stages)
+
+    print(f"Generating {args.uploads} x {len(args.formats)} fixtures of {args.pages} pages...")
+    fixtures = {
+        file_format: [make_fixture(file_format, args.pages, seed) for seed in range(args.uploads)]
+        for file_format in args.formats
+    }
+
+    results = []
+    document_ids = []
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            for file_format, uploads in fixtures.items():
+                async def upload(index, uploads=uploads):
+                    filename, content = uploads[index]
+                    response = await client.post("/flashcards/generate-flashcards", files={"file": (filename, content)})
+                    if response.status_code == 200:
+                        document_ids.append(response.json()["document_id"])
+                    return response
+
+                results.append(await run_phase(f"upload {file_format}", upload, args, stages))
+
+            if args.route:
+                async def explain(index):
+                    # Distinct questions, so the explanation cache never answers for the model
+                    payload = {"question": f"What is osmosis? ({index})", "current_answer": "Diffusion of water."}
+                    if document_ids:
+                        payload["document_id"] = document_ids[index % len(document_ids)]
+                    return await client.post(args.route, json=payload)
+
+                results.append(await run_phase(f"explain {args.route}", explain, args, stages))
+    finally:
+        parse_pool.shutdown_parse_pool()
+
+    fake_stats = llm.stats()
+    print(f"\nFake model: {fake_stats['calls']} calls, {fake_stats['errors']} injected errors, "
+          f"{fake_stats['prompt_tokens']} prompt tokens sent, {fake_stats['cached_tokens']} served from context caches")
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({"arguments": vars(args), "phases": results, "model": fake_stats}, output, indent=2)
+        print(f"Wrote {args.output}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
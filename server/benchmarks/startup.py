@@ -0,0 +1,151 @@
+"""Cold-start benchmark: how long a new worker process takes to become ready.
+
+Each run starts a fresh interpreter that imports app.main, runs the FastAPI
+lifespan startup, serves a first request and shuts down, timing each phase
+and recording the resident memory once ready. It then times the clients the
+app creates lazily on first use (Gemini model, Cohere client, MongoClient),
+which a worker pays for on its first model call or query unless warm-up is
+on. Results are the median and worst of --runs runs.
+
+    python -m benchmarks.startup --runs 10
+    python -m benchmarks.startup --warm-up --output startup.json
+
+--warm-up sets WARM_UP_ON_STARTUP=true with the offline fake model standing in
+for Gemini, so startup includes starting a parse worker and pinging MongoDB at
+MONGODB_URI (bounded by --warm-up-timeout) but needs no API keys.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PHASES = ("import", "startup", "first_request", "shutdown", "ready", "gemini_model", "cohere_client", "mongo_client")
+# Client libraries the API process should not need to import before serving
+CLIENT_MODULES = ("google.generativeai", "cohere", "pymongo")
+
+def rss_mb():
+    """Resident memory of this process, or None where /proc is unavailable"""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+async def measure_child(warm_up: bool) -> dict:
+    """One cold start, run in a fresh interpreter"""
+    sys.path.insert(0, SERVER_DIR)
+    os.environ.setdefault("GEMINI_API", "benchmark")
+    # Only used to construct the client; the router does not route to Cohere unless LLM_PROVIDERS says so
+    os.environ.setdefault("COHERE_API_KEY", "benchmark")
+    times = {}
+
+    start = time.perf_counter()
+    from app.main import app
+    times["import"] = time.perf_counter() - start
+    eager_modules = [module for module in CLIENT_MODULES if module in sys.modules]
+
+    if warm_up:
+        from benchmarks import fake_llm
+        fake_llm.install(fake_llm.FakeLLM(latency=0.0))
+
+    import httpx
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        start = time.perf_counter()
+        lifespan = app.router.lifespan_context(app)
+        await lifespan.__aenter__()
+        times["startup"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        response = await client.get("/")
+        times["first_request"] = time.perf_counter() - start
+        if response.status_code != 200:
+            raise RuntimeError(f"First request failed with {response.status_code}")
+        times["ready"] = times["import"] + times["startup"] + times["first_request"]
+        rss = rss_mb()
+
+        start = time.perf_counter()
+        await lifespan.__aexit__(None, None, None)
+        times["shutdown"] = time.perf_counter() - start
+
+    # Deferred to first use by the app; constructing them makes no network calls
+    from app.db import get_mongo_client, close_mongo_client
+    from app.services.gemini_service import get_gemini_model
+    from app.services.cohere_service import create_cohere_client
+    times["gemini_model"] = timed(get_gemini_model)
+    times["cohere_client"] = timed(create_cohere_client)
+    times["mongo_client"] = timed(get_mongo_client)
+    close_mongo_client()
+
+    return {"seconds": times, "rss_mb": rss, "eager_modules": eager_modules}
+
+def run_child(args) -> dict:
+    env = dict(os.environ, WARM_UP_ON_STARTUP="true" if args.warm_up else "false",
+               WARM_UP_TIMEOUT_SECONDS=str(args.warm_up_timeout))
+    command = [sys.executable, "-m", "benchmarks.startup", "--child"] + (["--warm-up"] if args.warm_up else [])
+    result = subprocess.run(command, cwd=SERVER_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Benchmark child failed:\n{result.stderr}")
+    # The app prints to stdout too; the measurement is the last line
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def summarize(runs: list) -> dict:
+    summary = {}
+    for phase in PHASES:
+        samples = sorted(run["seconds"][phase] for run in runs)
+        summary[phase] = {"median": samples[len(samples) // 2], "max": samples[-1]}
+    rss = sorted(run["rss_mb"] for run in runs if run["rss_mb"] is not None)
+    summary["rss_mb"] = rss[len(rss) // 2] if rss else None
+    summary["eager_modules"] = sorted({module for run in runs for module in run["eager_modules"]})
+    return summary
+
+def print_summary(summary: dict, runs: int, warm_up: bool) -> None:
+    print(f"\nCold start over {runs} runs (warm-up {'on' if warm_up else 'off'}):")
+    print(f"  {'phase':<16} {'median ms':>10} {'max ms':>10}")
+    for phase in PHASES:
+        if phase == "gemini_model":
+            print("  deferred to first use:")
+        print(f"  {phase:<16} {summary[phase]['median'] * 1000:>10.1f} {summary[phase]['max'] * 1000:>10.1f}")
+    if summary["rss_mb"] is not None:
+        print(f"  RSS when ready: {summary['rss_mb']:.0f} MB")
+    print(f"  client libraries imported by app.main: {', '.join(summary['eager_modules']) or 'none'}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warm-up", action="store_true", help="Warm clients and a parse worker during startup")
+    parser.add_argument("--warm-up-timeout", type=float, default=2.0, help="WARM_UP_TIMEOUT_SECONDS for the runs")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(measure_child(args.warm_up))))
+        return
+
+    runs = []
+    for index in range(args.runs):
+        runs.append(run_child(args))
+        print(f"run {index + 1}: ready in {runs[-1]['seconds']['ready'] * 1000:.0f} ms")
+    summary = summarize(runs)
+    print_summary(summary, len(runs), args.warm_up)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({"arguments": vars(args), "summary": summary, "runs": runs}, output, indent=2)
+        print(f"Wrote {args.output}")
+
+if __name__ == "__main__":
+    main()
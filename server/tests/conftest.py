@@ -0,0 +1,12 @@
+# tests/conftest.py
+
+import os
+import sys
+
+# Settings are read when the services are imported, so fix them before any test imports the app:
+# no real API key, and job state and caches kept in memory instead of MongoDB
+os.environ.setdefault("GEMINI_API", "test")
+os.environ["JOB_STORE_BACKEND"] = "memory"
+os.environ["FLASHCARD_CACHE_BACKEND"] = "memory"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
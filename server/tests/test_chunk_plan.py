@@ -0,0 +1,92 @@
+# tests/test_chunk_plan.py
+
+import asyncio
+import pytest
+from app.services import gemini_service
+from app.services.gemini_service import ChunkPlan
+
+@pytest.fixture(autouse=True)
+def fixed_token_ratio(monkeypatch):
+    """Skip the token counting call; plans use the default four characters per token"""
+    async def estimate(sample):
+        return 4.0
+    monkeypatch.setattr(gemini_service, "estimate_chars_per_token", estimate)
+
+def make_pages(count: int, chars: int) -> list:
+    return [(f"Page {index}. " + "word " * chars)[:chars - 1] + "." for index in range(count)]
+
+def run_plan(plan: ChunkPlan, pages: list, consumed: list = None) -> list:
+    async def segments():
+        for page in pages:
+            if consumed is not None:
+                consumed.append(page)
+            yield page
+
+    async def collect():
+        items = []
+        async for item in plan.items(segments()):
+            items.append((item, len(consumed) if consumed is not None else None))
+        return items
+
+    return asyncio.run(collect())
+
+def test_every_segment_is_packed():
+    pages = make_pages(40, 1000)
+    plan = ChunkPlan(token_budget=1000, max_requests=100, overlap_tokens=0)
+    plan.expect_segments(len(pages))
+    items = [item for item, _ in run_plan(plan, pages)]
+
+    assert [index for index, _, _ in items] == list(range(len(items)))
+    text = "\n\n".join(chunk for _, chunk, _ in items)
+    for page in pages:
+        assert page.strip() in text
+    assert plan.finished
+    assert plan.chunks_total == len(items) == len(plan.chunks)
+
+def test_request_budget_grows_to_stay_within_max_requests():
+    pages = make_pages(100, 1000)    # About 25,000 tokens
+    plan = ChunkPlan(token_budget=1000, max_requests=5, overlap_tokens=0)
+    plan.expect_segments(len(pages))
+    items = run_plan(plan, pages)
+
+    assert plan.request_tokens == 5000
+    assert len(items) <= plan.max_requests + 1
+    assert all(len(chunk) <= plan.request_tokens * 4 for (_, chunk, _), _ in items)
+
+def test_budget_is_capped_by_max_input_tokens():
+    pages = make_pages(100, 1000)
+    plan = ChunkPlan(token_budget=1000, max_requests=2, overlap_tokens=0, max_input_tokens=2000)
+    plan.expect_segments(len(pages))
+    items = run_plan(plan, pages)
+
+    assert plan.request_tokens == 2000
+    # Every segment is still sent, in more requests than max_requests
+    assert len(items) > plan.max_requests
+
+def test_first_chunks_are_yielded_while_pages_are_still_arriving():
+    pages = make_pages(60, 1000)
+    plan = ChunkPlan(token_budget=1000, max_requests=100, overlap_tokens=0)
+    plan.expect_segments(len(pages))
+    consumed = []
+    items = run_plan(plan, pages, consumed)
+
+    _, consumed_at_first_chunk = items[0]
+    assert consumed_at_first_chunk < len(pages)
+
+def test_documents_of_unknown_length_are_planned_once_complete():
+    pages = make_pages(20, 1000)
+    plan = ChunkPlan(token_budget=1000, max_requests=100, overlap_tokens=0)
+    consumed = []
+    items = run_plan(plan, pages, consumed)
+
+    assert all(consumed_at == len(pages) for _, consumed_at in items)
+    assert plan.chunks_total == len(items) > 1
+
+def test_single_chunk_document_gets_the_small_text_target():
+    plan = ChunkPlan(token_budget=1000, max_requests=100, overlap_tokens=0)
+    plan.expect_segments(1)
+    items = run_plan(plan, ["A short note about photosynthesis."])
+
+    (index, chunk, target), _ = items[0]
+    assert len(items) == 1 and index == 0
+    assert target == gemini_service.SMALL_TEXT_FLASHCARDS
@@ -0,0 +1,34 @@
+# tests/test_chunk_reply_parser.py
+
+import json
+import pytest
+from app.services.gemini_service import ChunkReplyParser
+
+def test_cards_are_passed_on_while_the_reply_streams():
+    cards = [{"question": f"Question {index}?", "answer": f"Answer {index}"} for index in range(4)]
+    text = json.dumps(cards)
+    batches = []
+    parser = ChunkReplyParser(0, batches.append)
+
+    for start in range(0, len(text), 10):
+        parser.feed(text[start:start + 10])
+        if start == 0:
+            assert batches == []
+    assert [card["question"] for batch in batches for card in batch] == [card["question"] for card in cards]
+    assert len(batches) > 1
+
+    assert [card["question"] for card in parser.close()] == [card["question"] for card in cards]
+
+def test_invalid_items_are_dropped():
+    batches = []
+    parser = ChunkReplyParser(0, batches.append)
+    parser.feed('[{"question": "What is osmosis?", "answer": "Diffusion of water"}, '
+                '{"question": "What is diffusion?"}, {"question": "Why?", "answer": "Because"}, "not a card"]')
+    assert [card["question"] for card in parser.close()] == ["What is osmosis?"]
+    assert len(batches) == 1
+
+def test_reply_without_items_raises():
+    parser = ChunkReplyParser(2, lambda flashcards: None)
+    parser.feed("I could not find anything to ask about.")
+    with pytest.raises(ValueError, match="chunk 3"):
+        parser.close()
@@ -0,0 +1,75 @@
+# tests/test_chunking_utils.py
+
+from app.utils.chunking_utils import ChunkPacker, chunk_segments, chunk_text, tail_text
+
+def sentences(count: int, prefix: str = "Sentence") -> str:
+    return " ".join(f"{prefix} {index} covers one idea." for index in range(count))
+
+def test_segments_that_fit_are_kept_whole():
+    segments = ["First page.", "Second page.", "Third page."]
+    assert chunk_segments(segments, max_tokens=100) == ["First page.\n\nSecond page.\n\nThird page."]
+
+def test_blank_segments_are_skipped():
+    assert chunk_segments(["", "  \n ", "Only text."], max_tokens=100) == ["Only text."]
+    assert chunk_segments([], max_tokens=100) == []
+
+def test_chunks_respect_the_budget_and_keep_all_text():
+    segments = [sentences(30, f"Page {page}") for page in range(10)]
+    chunks = chunk_segments(segments, max_tokens=200)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 800 for chunk in chunks)
+    joined = " ".join(" ".join(chunks).split())
+    for segment in segments:
+        for sentence in segment.split(". "):
+            assert sentence.rstrip(".") in joined
+
+def test_oversized_segment_is_split_on_sentences():
+    chunks = chunk_text(sentences(100), max_tokens=50)
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert all(chunk.endswith(".") for chunk in chunks)
+
+def test_text_without_breaks_is_split_on_whitespace():
+    text = " ".join(["token"] * 1000)
+    chunks = chunk_text(text, max_tokens=25)
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert sum(chunk.count("token") for chunk in chunks) == 1000
+
+def test_overlap_carries_the_end_of_the_previous_chunk():
+    segments = [sentences(40, f"Page {page}") for page in range(6)]
+    chunks = chunk_segments(segments, max_tokens=300, overlap_tokens=40)
+
+    assert len(chunks) > 1
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert len(chunk) <= 1200
+        # Each chunk opens with whole sentences taken from the end of the one before
+        opening = chunk.split(". ")[0]
+        assert opening in previous
+        assert previous.index(opening) > len(previous) // 2
+
+def test_page_sized_units_still_overlap():
+    # Every page nearly fills a chunk on its own, so the overlap must come from inside the page
+    segments = [sentences(19, f"Page {page}") for page in range(5)]
+    chunks = chunk_segments(segments, max_tokens=150, overlap_tokens=20)
+
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert len(chunk) <= 600
+        assert chunk.split(". ")[0] in previous
+
+def test_packer_matches_chunk_segments():
+    segments = [sentences(25, f"Page {page}") for page in range(8)]
+    packer = ChunkPacker(max_tokens=250, overlap_tokens=30)
+    chunks = []
+    for segment in segments:
+        chunks.extend(packer.add(segment))
+    chunks.extend(packer.finish())
+
+    assert chunks == chunk_segments(segments, max_tokens=250, overlap_tokens=30)
+    assert packer.finish() == []
+
+def test_tail_text_cuts_at_sentence_then_word():
+    text = "One idea here. Another idea follows. Last one"
+    assert tail_text(text, 30) == "Another idea follows. Last one"
+    assert tail_text("alpha beta gamma delta", 12) == "gamma delta"
+    assert tail_text("unbroken" * 10, 12) == ""
+    assert tail_text(text, 0) == ""
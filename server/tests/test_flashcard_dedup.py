@@ -0,0 +1,62 @@
+# tests/test_flashcard_dedup.py
+
+import random
+from app.services.flashcard_dedup import (
+    DEDUP_NUM_PERM, FlashcardDeduplicator, card_shingles, choose_bands, jaccard, minhash_signature,
+    remove_duplicate_flashcards
+)
+
+def card(question: str, answer: str) -> dict:
+    return {"question": question, "answer": answer}
+
+def test_reworded_duplicates_are_removed_in_order():
+    cards = [
+        card("What is photosynthesis?", "The process plants use to turn light, water and CO2 into glucose."),
+        card("What does the mitochondria do?", "It produces ATP through cellular respiration."),
+        card("What is photosynthesis", "The process plants use to turn light, water and CO2 into glucose"),
+        card("What is Photosynthesis?", "the process plants use to turn light, water and CO2 into glucose!"),
+    ]
+    assert remove_duplicate_flashcards(cards) == cards[:2]
+
+def test_distinct_cards_on_one_topic_are_kept():
+    cards = [
+        card("What does the cell membrane regulate?", "Which substances enter and leave the cell."),
+        card("Where is genetic material stored in eukaryotes?", "Inside the nucleus."),
+        card("Which organelle produces ATP?", "The mitochondrion, through cellular respiration."),
+        card("What do ribosomes build?", "Proteins, from amino acids."),
+    ]
+    assert remove_duplicate_flashcards(cards) == cards
+
+def test_threshold_decides_near_duplicates():
+    first = card("What year did World War II end?", "World War II ended in 1945 with the surrender of Japan.")
+    second = card("When did World War II end?", "It ended in 1945 after Japan surrendered.")
+    similarity = jaccard(card_shingles(first), card_shingles(second))
+
+    assert remove_duplicate_flashcards([first, second], threshold=similarity / 2) == [first]
+    assert remove_duplicate_flashcards([first, second], threshold=min(1.0, similarity * 2)) == [first, second]
+
+def test_cards_without_word_shingles_only_match_identical_cards():
+    deduplicator = FlashcardDeduplicator()
+    assert deduplicator.add(card("?", "+"))
+    assert deduplicator.add(card("?", "-"))
+    assert deduplicator.add(card("The", "A"))
+    assert not deduplicator.add(card(" ? ", "+"))
+
+def test_signatures_are_full_and_stable():
+    shingles = card_shingles(card("Define entropy", "A measure of disorder"))
+    signature = minhash_signature(shingles)
+    assert len(signature) == DEDUP_NUM_PERM
+    assert None not in signature
+    assert signature == minhash_signature(frozenset(shingles))
+
+def test_band_split_uses_every_permutation():
+    bands, rows = choose_bands(0.45)
+    assert bands * rows <= DEDUP_NUM_PERM
+    assert bands > 1 and rows > 1
+
+def test_large_decks_keep_every_distinct_card():
+    rng = random.Random(7)
+    vocabulary = [f"word{index}" for index in range(5000)]
+    cards = [card(" ".join(rng.sample(vocabulary, 8)), " ".join(rng.sample(vocabulary, 12))) for _ in range(500)]
+    kept = remove_duplicate_flashcards(cards + cards)
+    assert kept == cards
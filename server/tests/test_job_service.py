@@ -0,0 +1,126 @@
+# tests/test_job_service.py
+
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from app.services import job_service
+from app.services.job_service import LOST_JOB_ERROR, MemoryJobStore
+
+@pytest.fixture
+def store(monkeypatch):
+    store = MemoryJobStore()
+    monkeypatch.setattr(job_service, "job_store", store)
+    monkeypatch.setattr(job_service, "_held_jobs", set())
+    return store
+
+def make_job(job_id: str, status: str = "running", lease_age: float = 0) -> dict:
+    renewed = datetime.utcnow() - timedelta(seconds=lease_age)
+    return {
+        "_id": job_id,
+        "status": status,
+        "filename": "notes.pdf",
+        "chunks_done": 0,
+        "chunks_total": None,
+        "count": 0,
+        "chunk_cache_hits": 0,
+        "cached": False,
+        "document_id": None,
+        "flashcards": [],
+        "error": None,
+        "created_at": renewed,
+        "updated_at": renewed,
+        "heartbeat_at": renewed
+    }
+
+def test_job_with_a_lapsed_lease_is_failed_on_read(store):
+    expired = job_service.JOB_LEASE_SECONDS + 5
+
+    async def run():
+        await store.create(make_job("lost", lease_age=expired))
+        await store.create(make_job("alive"))
+        await store.create(make_job("finished", status="done", lease_age=expired))
+        return [await job_service.get_job(job_id) for job_id in ("lost", "alive", "finished")]
+
+    lost, alive, finished = asyncio.run(run())
+    assert (lost["status"], lost["error"]) == ("failed", LOST_JOB_ERROR)
+    assert alive["status"] == "running"
+    assert (finished["status"], finished["error"]) == ("done", None)
+
+def test_renewed_lease_keeps_a_job_alive(store):
+    async def run():
+        await store.create(make_job("job", lease_age=job_service.JOB_LEASE_SECONDS - 1))
+        await store.renew_leases(["job"], datetime.utcnow())
+        return await store.fail_stale(job_service.lease_cutoff(), LOST_JOB_ERROR), await job_service.get_job("job")
+
+    failed, job = asyncio.run(run())
+    assert failed == 0
+    assert job["status"] == "running"
+
+def test_heartbeat_takes_over_jobs_of_a_stopped_process(store, monkeypatch):
+    monkeypatch.setattr(job_service, "JOB_HEARTBEAT_SECONDS", 0.01)
+    expired = job_service.JOB_LEASE_SECONDS + 5
+
+    async def run():
+        await store.create(make_job("orphaned", status="queued", lease_age=expired))
+        await store.create(make_job("held", lease_age=job_service.JOB_LEASE_SECONDS - 1))
+        job_service._held_jobs.add("held")
+
+        heartbeat = asyncio.create_task(job_service.job_heartbeat())
+        await asyncio.sleep(0.05)
+        heartbeat.cancel()
+        await asyncio.gather(heartbeat, return_exceptions=True)
+        return await store.get("orphaned"), await store.get("held")
+
+    orphaned, held = asyncio.run(run())
+    assert (orphaned["status"], orphaned["error"]) == ("failed", LOST_JOB_ERROR)
+    # The held job's lease was renewed, so other processes will not fail it
+    assert held["status"] == "running"
+    assert datetime.utcnow() - job_service.lease_time(held) < timedelta(seconds=1)
+
+def test_watch_ends_with_the_failure_of_a_lost_job(store):
+    async def run():
+        await store.create(make_job("lost", lease_age=job_service.JOB_LEASE_SECONDS + 5))
+        return [summary async for summary in job_service.watch_job("lost")]
+
+    summaries = asyncio.run(run())
+    assert summaries[-1]["status"] == "failed"
+    assert summaries[-1]["error"] == LOST_JOB_ERROR
+
+def test_run_job_persists_progress_and_releases_its_lease(store, monkeypatch):
+    events = [
+        {"type": "start", "cached": False},
+        {"type": "flashcards", "flashcards": [{"question": "Q1", "answer": "A1"}]},
+        {"type": "progress", "chunks_done": 1, "chunks_total": 2},
+        {"type": "flashcards", "flashcards": [{"question": "Q2", "answer": "A2"}]},
+        {"type": "progress", "chunks_done": 2, "chunks_total": 2},
+        {"type": "done", "count": 2, "chunk_cache_hits": 1},
+    ]
+
+    async def fake_stream(path, filename, sha256):
+        for event in events:
+            yield event
+
+    class Upload:
+        path = "/tmp/notes.pdf"
+        sha256 = "digest"
+        cleaned = False
+
+        def cleanup(self):
+            self.cleaned = True
+
+    monkeypatch.setattr(job_service, "stream_flashcards_from_file", fake_stream)
+    monkeypatch.setattr(job_service, "schedule_explanation_precompute", lambda flashcards, document_id: None)
+    upload = Upload()
+
+    async def run():
+        await store.create(make_job("job", status="queued"))
+        job_service._held_jobs.add("job")
+        await job_service.run_job("job", upload, "notes.pdf")
+        return await store.get("job")
+
+    job = asyncio.run(run())
+    assert job["status"] == "done"
+    assert (job["chunks_done"], job["chunks_total"], job["count"], job["chunk_cache_hits"]) == (2, 2, 2, 1)
+    assert [card["question"] for card in job["flashcards"]] == ["Q1", "Q2"]
+    assert upload.cleaned
+    assert "job" not in job_service._held_jobs
@@ -0,0 +1,72 @@
+# tests/test_json_utils.py
+
+import json
+import pytest
+from app.utils.json_utils import JSONArrayParser, parse_json_array
+
+CARDS = [{"question": f"Question {index}?", "answer": f"Answer [{index}], with \"quotes\""} for index in range(5)]
+
+def feed_in_pieces(text: str, size: int) -> list:
+    parser = JSONArrayParser()
+    items = []
+    for start in range(0, len(text), size):
+        items += parser.feed(text[start:start + size])
+    return items + parser.close()
+
+def test_plain_array():
+    assert parse_json_array(json.dumps(CARDS)) == (CARDS, False)
+
+def test_fences_preamble_and_wrapping_object_are_skipped():
+    text = "Here are your cards:\n```json\n{\"items\": " + json.dumps(CARDS, indent=2) + "}\n```"
+    assert parse_json_array(text) == (CARDS, False)
+
+def test_truncated_reply_keeps_complete_items():
+    text = json.dumps(CARDS)
+    cut = text[:text.index('"Question 3?"') + 5]
+    items, truncated = parse_json_array(cut)
+    assert items == CARDS[:3]
+    assert truncated
+
+def test_malformed_item_is_skipped():
+    text = '[{"question": "Q1", "answer": "A1"}, {"question": "Q2" "answer": }, {"question": "Q3", "answer": "A3"}]'
+    items, _ = parse_json_array(text)
+    assert items == [{"question": "Q1", "answer": "A1"}, {"question": "Q3", "answer": "A3"}]
+
+def test_missing_array_raises():
+    with pytest.raises(ValueError):
+        parse_json_array("Sorry, I cannot help with that.")
+    assert parse_json_array("[]") == ([], False)
+
+@pytest.mark.parametrize("size", [1, 2, 7, 64])
+def test_fragments_give_the_same_items_as_the_whole_text(size):
+    text = "```json\n" + json.dumps(CARDS, indent=2) + "\n```"
+    assert feed_in_pieces(text, size) == CARDS
+
+def test_items_are_returned_as_soon_as_they_are_complete():
+    parser = JSONArrayParser()
+    text = json.dumps(CARDS)
+    first_end = text.index("}") + 1
+
+    assert parser.feed(text[:first_end - 1]) == []
+    assert parser.started
+    assert parser.feed(text[first_end - 1:first_end]) == CARDS[:1]
+    assert parser.feed(text[first_end:]) == CARDS[1:]
+    assert parser.finished and not parser.truncated
+    assert parser.feed("trailing text [1, 2]") == []
+
+def test_scalar_at_the_end_of_a_fragment_waits_for_its_delimiter():
+    parser = JSONArrayParser()
+    assert parser.feed("[1") == []
+    assert parser.feed("2, 3") == [12]
+    assert parser.feed("]") == [3]
+
+    parser = JSONArrayParser()
+    assert parser.feed("[tr") == []
+    assert parser.feed("ue, nul") == [True]
+    assert parser.close() == []
+    assert parser.truncated
+
+def test_close_accepts_a_final_scalar():
+    parser = JSONArrayParser()
+    assert parser.feed("[1, 2") == [1]
+    assert parser.close() == [2]
@@ -0,0 +1,162 @@
+# tests/test_rate_limiter.py
+
+import asyncio
+from types import SimpleNamespace
+import pytest
+from app.services import rate_limiter
+from app.services.rate_limiter import (
+    PRIORITY_BACKGROUND, PRIORITY_BULK, PRIORITY_INTERACTIVE, AdaptiveLimiter, TokenBucket, is_overload_error
+)
+
+class APIError(Exception):
+    def __init__(self, code: int):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+def test_waiters_are_admitted_in_priority_order():
+    limiter = AdaptiveLimiter("test", max_concurrency=1)
+    admitted = []
+
+    async def call(name: str, priority: int):
+        async with limiter.slot(priority):
+            admitted.append(name)
+            await asyncio.sleep(0)
+
+    async def run():
+        async with limiter.slot():
+            tasks = [
+                asyncio.create_task(call("background", PRIORITY_BACKGROUND)),
+                asyncio.create_task(call("bulk 1", PRIORITY_BULK)),
+                asyncio.create_task(call("interactive", PRIORITY_INTERACTIVE)),
+                asyncio.create_task(call("bulk 2", PRIORITY_BULK)),
+            ]
+            await asyncio.sleep(0)
+            assert limiter.waiting == 4 and limiter.busy()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert admitted == ["interactive", "bulk 1", "bulk 2", "background"]
+    assert limiter.in_flight == 0
+
+def test_concurrency_never_exceeds_the_limit():
+    limiter = AdaptiveLimiter("test", max_concurrency=3)
+    running = 0
+    peak = 0
+
+    async def call():
+        nonlocal running, peak
+        async with limiter.slot(PRIORITY_BULK):
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.001)
+            running -= 1
+
+    async def run():
+        await asyncio.gather(*(call() for _ in range(20)))
+
+    asyncio.run(run())
+    assert peak == 3
+
+def test_rate_limit_errors_halve_concurrency_once_per_burst(monkeypatch):
+    now = [1000.0]
+    # Replaces the module's clock only; the event loop keeps the real one
+    monkeypatch.setattr(rate_limiter, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    limiter = AdaptiveLimiter("test", max_concurrency=8, min_concurrency=2)
+
+    async def failing_call(code: int):
+        with pytest.raises(APIError):
+            async with limiter.slot():
+                raise APIError(code)
+
+    async def run():
+        await failing_call(429)
+        assert limiter.concurrency == 4
+        # Errors from the same burst arrive within the cooldown and do not back off again
+        await failing_call(429)
+        assert limiter.concurrency == 4
+
+        now[0] += rate_limiter.BACKOFF_COOLDOWN_SECONDS
+        await failing_call(429)
+        assert limiter.concurrency == 2
+        now[0] += rate_limiter.BACKOFF_COOLDOWN_SECONDS
+        await failing_call(429)
+        assert limiter.concurrency == 2    # Floored at min_concurrency
+
+        # Other errors leave the limit alone
+        now[0] += rate_limiter.BACKOFF_COOLDOWN_SECONDS
+        await failing_call(400)
+        assert limiter.concurrency == 2
+
+    asyncio.run(run())
+    assert limiter.overloads == 4
+    assert limiter.in_flight == 0
+
+def test_successes_grow_concurrency_back_to_the_maximum():
+    limiter = AdaptiveLimiter("test", max_concurrency=4)
+    limiter.limit = 1.0
+
+    async def run():
+        for _ in range(20):
+            async with limiter.slot():
+                pass
+
+    asyncio.run(run())
+    assert limiter.concurrency == 4
+
+def test_cancelled_waiter_does_not_take_a_slot():
+    limiter = AdaptiveLimiter("test", max_concurrency=1)
+    admitted = []
+
+    async def call(name: str):
+        async with limiter.slot():
+            admitted.append(name)
+
+    async def run():
+        async with limiter.slot():
+            cancelled = asyncio.create_task(call("cancelled"))
+            waiting = asyncio.create_task(call("waiting"))
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            await asyncio.gather(cancelled, return_exceptions=True)
+            assert limiter.waiting == 1
+        await waiting
+
+    asyncio.run(run())
+    assert admitted == ["waiting"]
+    assert limiter.in_flight == 0
+
+def test_cancelling_a_call_in_flight_releases_its_slot():
+    limiter = AdaptiveLimiter("test", max_concurrency=1)
+    started = None
+
+    async def slow_call():
+        async with limiter.slot():
+            started.set()
+            await asyncio.sleep(10)
+
+    async def run():
+        nonlocal started
+        started = asyncio.Event()
+        task = asyncio.create_task(slow_call())
+        await started.wait()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert limiter.in_flight == 0
+        async with limiter.slot():
+            pass
+
+    asyncio.run(asyncio.wait_for(run(), timeout=5))
+    assert limiter.concurrency == 1 and limiter.overloads == 0
+
+def test_token_bucket_delays_calls_over_the_budget():
+    bucket = TokenBucket(per_minute=600)
+    assert bucket.wait_time(600) == 0
+    bucket.take(600)
+    assert bucket.wait_time(60) == pytest.approx(6, rel=0.05)
+    assert TokenBucket(per_minute=0).wait_time(10 ** 9) == 0
+
+def test_overload_errors():
+    assert is_overload_error(APIError(429))
+    assert is_overload_error(asyncio.TimeoutError())
+    assert not is_overload_error(APIError(500))
+    assert not is_overload_error(ValueError("bad JSON"))
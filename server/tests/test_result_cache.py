@@ -0,0 +1,48 @@
+# tests/test_result_cache.py
+
+import asyncio
+from app.services import result_cache
+from app.services.result_cache import MemoryCache, make_cache_key
+
+def test_cache_key_depends_on_content_and_params():
+    key = make_cache_key(b"lecture notes", model="gemini", pipeline_version=1)
+    assert key == make_cache_key(b"lecture notes", pipeline_version=1, model="gemini")
+    assert key != make_cache_key(b"lecture notes!", model="gemini", pipeline_version=1)
+    assert key != make_cache_key(b"lecture notes", model="gemini", pipeline_version=2)
+
+def test_least_recently_used_entry_is_evicted():
+    cache = MemoryCache(max_entries=2, ttl_seconds=0)
+    cache.set_nowait("a", 1)
+    cache.set_nowait("b", 2)
+    assert cache.get_nowait("a") == 1   # "b" is now the least recently used
+    cache.set_nowait("c", 3)
+
+    assert cache.get_nowait("b") is None
+    assert cache.get_nowait("a") == 1
+    assert cache.get_nowait("c") == 3
+    assert cache.stats()["entries"] == 2
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, "monotonic", lambda: now[0])
+    cache = MemoryCache(max_entries=10, ttl_seconds=60)
+    cache.set_nowait("key", "value")
+
+    now[0] += 59
+    assert cache.get_nowait("key") == "value"
+    now[0] += 2
+    assert cache.get_nowait("key") is None
+    assert cache.stats()["entries"] == 0
+
+def test_async_interface_counts_hits_and_misses():
+    cache = MemoryCache(max_entries=10, ttl_seconds=0)
+
+    async def run():
+        assert await cache.get("key") is None
+        await cache.set("key", {"flashcards": []})
+        assert await cache.get("key") == {"flashcards": []}
+
+    asyncio.run(run())
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["sets"]) == (1, 1, 1)
+    assert stats["hit_ratio"] == 0.5
@@ -0,0 +1,134 @@
+# tests/test_retry_policy.py
+
+import asyncio
+import pytest
+from app.services import retry_policy
+from app.services.retry_policy import (
+    LatencyTracker, backoff_delay, call_chunk_with_retries, call_with_retries, hedged_call, is_retryable_error
+)
+
+class APIError(Exception):
+    def __init__(self, code: int):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+def scripted(*outcomes):
+    """A call that returns or raises the given outcomes in turn, recording how often it ran"""
+    calls = []
+
+    async def call():
+        outcome = outcomes[len(calls)]
+        calls.append(outcome)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    return call, calls
+
+def test_retryable_errors_are_retried_until_success():
+    call, calls = scripted(APIError(503), APIError(429), "cards")
+    assert asyncio.run(call_with_retries(call, attempts=3, base_delay=0, max_delay=0)) == "cards"
+    assert len(calls) == 3
+
+def test_other_errors_are_raised_at_once():
+    call, calls = scripted(APIError(400), "cards")
+    with pytest.raises(APIError):
+        asyncio.run(call_with_retries(call, attempts=3, base_delay=0, max_delay=0))
+    assert len(calls) == 1
+
+def test_last_error_is_raised_when_attempts_run_out():
+    call, calls = scripted(APIError(503), APIError(502), APIError(500), "cards")
+    with pytest.raises(APIError, match="500"):
+        asyncio.run(call_with_retries(call, attempts=3, base_delay=0, max_delay=0))
+    assert len(calls) == 3
+
+def test_chunk_retries_include_unparseable_replies(monkeypatch):
+    monkeypatch.setattr(retry_policy, "RETRY_BASE_DELAY_SECONDS", 0)
+    monkeypatch.setattr(retry_policy, "CHUNK_MAX_ATTEMPTS", 2)
+    call, calls = scripted(ValueError("No JSON array found"), "cards")
+    assert asyncio.run(call_chunk_with_retries(call, "Chunk 1")) == "cards"
+    assert len(calls) == 2
+
+def test_backoff_is_jittered_and_capped():
+    delays = [backoff_delay(attempt, 0.5, 8) for attempt in range(10) for _ in range(20)]
+    assert all(0 <= delay <= 8 for delay in delays)
+    assert len(set(delays)) > 1
+    assert max(backoff_delay(0, 0.5, 8) for _ in range(50)) <= 0.5
+
+def test_is_retryable_error():
+    assert is_retryable_error(APIError(503))
+    assert is_retryable_error(ConnectionError())
+    assert is_retryable_error(asyncio.TimeoutError())
+    assert not is_retryable_error(APIError(404))
+    assert not is_retryable_error(ValueError())
+
+def test_slow_call_is_hedged_and_the_straggler_cancelled():
+    started = []
+    cancelled = []
+
+    async def call():
+        attempt = len(started)
+        started.append(attempt)
+        try:
+            await asyncio.sleep(10 if attempt == 0 else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(attempt)
+            raise
+        return f"attempt {attempt}"
+
+    async def run():
+        result = await hedged_call(call, hedge_after=0.02)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(asyncio.wait_for(run(), timeout=5)) == "attempt 1"
+    assert started == [0, 1]
+    assert cancelled == [0]
+
+def test_fast_call_is_not_hedged():
+    call, calls = scripted("cards")
+    assert asyncio.run(hedged_call(call, hedge_after=1)) == "cards"
+    assert len(calls) == 1
+
+def test_hedging_can_be_declined():
+    started = []
+
+    async def call():
+        started.append(None)
+        await asyncio.sleep(0.05)
+        return "cards"
+
+    assert asyncio.run(hedged_call(call, hedge_after=0.01, can_hedge=lambda: False)) == "cards"
+    assert len(started) == 1
+
+def test_hedged_failure_waits_for_the_other_request():
+    started = []
+
+    async def call():
+        attempt = len(started)
+        started.append(attempt)
+        if attempt == 0:
+            await asyncio.sleep(0.03)
+            raise APIError(503)
+        await asyncio.sleep(0.05)
+        return "cards"
+
+    assert asyncio.run(hedged_call(call, hedge_after=0.01)) == "cards"
+
+def test_hedged_call_raises_when_both_requests_fail():
+    async def call():
+        await asyncio.sleep(0.02)
+        raise APIError(503)
+
+    with pytest.raises(APIError):
+        asyncio.run(hedged_call(call, hedge_after=0.01))
+
+def test_latency_percentile_needs_enough_samples():
+    tracker = LatencyTracker(window=100, min_samples=10)
+    for seconds in range(9):
+        tracker.record(seconds)
+    assert tracker.percentile(0.95) is None
+
+    tracker.record(9)
+    assert tracker.percentile(0.5) == 5
+    assert tracker.percentile(0.95) == 9